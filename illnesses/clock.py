@@ -0,0 +1,107 @@
+"""
+Year aware clock for long running processes.
+
+The current year is read once, then compared against the cached timestamp of
+the start of next year on each use, rather than calling date.today() per
+call. On crossing the year boundary, functions registered with
+on_rollover() are called with the new year, so tables and validators
+precomputed for the current year are rebuilt without restarting the process.
+"""
+import threading
+import time
+
+from typing import (Callable,
+                    List,
+                    Optional,
+                    )
+
+
+def year_of(timestamp: float) -> int:
+    """
+    Local calendar year of a timestamp, as datetime.date.today().year.
+
+    :param timestamp: float, seconds since the epoch.
+    :return: int
+    """
+    return time.localtime(timestamp).tm_year
+
+
+def start_of_year(year: int) -> float:
+    """
+    Timestamp of local midnight, January 1st of year.
+
+    :param year: int
+    :return: float, seconds since the epoch.
+    """
+    return time.mktime((year, 1, 1, 0, 0, 0, 0, 0, -1))
+
+
+class YearClock(object):
+    """
+    Current year, checked cheaply against the start of next year on access.
+
+    Attributes:
+    ----------
+    year : int
+        Current year, rolling over at local midnight on January 1st.
+    """
+
+    def __init__(self, time_function: Callable[[], float] = time.time):
+        """
+        :param time_function: callable returning seconds since the epoch,
+            defaults to time.time.
+        """
+        self._time = time_function
+        # Reentrant, as callbacks rebuilding tables read year.
+        self._lock = threading.RLock()
+        self._rollover_callbacks: List[Callable[[int], None]] = []
+        self._rolling_over_to: Optional[int] = None
+        self._year = year_of(time_function())
+        self._next_year_start = start_of_year(self._year + 1)
+
+    @property
+    def year(self) -> int:
+        if self._time() >= self._next_year_start:
+            return self.refresh()
+        return self._year
+
+    def on_rollover(self, callback: Callable[[int], None]) -> Callable[[int], None]:
+        """
+        Register callback(year) to be called when the year changes, in
+        order of registration. Usable as a decorator.
+
+        :param callback: callable taking the new year.
+        :return: callback
+        """
+        self._rollover_callbacks.append(callback)
+        return callback
+
+    def refresh(self) -> int:
+        """
+        Re-read the time, calling rollover callbacks if the year has changed.
+
+        Callbacks run under a lock, so other threads reading year wait for
+        the rebuild to complete, while callbacks themselves read the new
+        year. The new year is only published once every callback has
+        completed, so a callback raising is retried on next access.
+
+        :return: int, the current year.
+        """
+        with self._lock:
+            if self._rolling_over_to is not None:
+                return self._rolling_over_to  # Read by a callback.
+            year = year_of(self._time())
+            if year != self._year:
+                self._rolling_over_to = year
+                try:
+                    for callback in self._rollover_callbacks:
+                        callback(year)
+                finally:
+                    self._rolling_over_to = None
+                self._year = year
+            self._next_year_start = start_of_year(year + 1)
+        return self._year
+
+
+# Shared by illnesses and the web app.
+clock = YearClock()
@@ -0,0 +1,83 @@
+"""
+Cohort level immunity from aggregated census cells.
+
+Public health data often arrives as counts of people per (birth year,
+shots, previous illness) cell rather than per person rows. Each cell is
+evaluated once with the illness immunity_batch() functions, weighted by its
+count, rather than expanding cells into individual people.
+
+eg 1200 people born 1985 with 2 doses, 300 born 1985 with none:
+
+    cohort_immunity(counts=[1200, 300],
+                    birth_years=[1985, 1985],
+                    on_time_mumps_vaccinations=[2, 0],
+                    illnesses=['mumps'])
+"""
+from typing import (Dict,
+                    Iterable,
+                    Optional,
+                    Union,
+                    )
+
+import numpy as np
+import numpy.typing as npt
+
+from .registry import illness_registry
+
+
+def cohort_immunity(counts: npt.ArrayLike,
+                    birth_years: npt.ArrayLike,
+                    illnesses: Optional[Iterable[str]] = None,
+                    **cell_columns: Optional[npt.ArrayLike],
+                    ) -> Dict[str, Dict[str, Union[int, float, None]]]:
+    """
+    Takes counts of people in cells of birth year, shots and previous
+    illness, and provides the expected number of immune people, and their
+    mean probability of immunity, for each illness.
+
+    Cell columns are passed as keyword arguments named as the illness
+    immunity() arguments, eg on_time_mumps_vaccinations, mumps_illness. A
+    column not supplied is treated as no shots/no previous illness, as in
+    immunity_batch().
+
+    ValueError will be deliberately raised on improper data.
+
+    :param counts: array_like of int, number of people in each cell.
+    :param birth_years: array_like of int
+    :param illnesses: names of illnesses to evaluate, default all.
+    :param cell_columns: array_like, immunity() argument values for each cell.
+    :raises: ValueError On improper valued data.
+    :return: Dict {illness: {'population': int,
+                             'expected_immune': float,
+                             'mean_probability_of_immunity': float or None for no population}}
+    """
+    illness_names = list(illness_registry) if illnesses is None else list(illnesses)
+    unknown = set(illness_names) - set(illness_registry)
+    if unknown:
+        raise ValueError(f'Unknown illnesses: {", ".join(sorted(unknown))}.')
+    known_columns = {column for name in illness_names
+                     for column in (illness_registry[name].vaccinations, illness_registry[name].illness)}
+    unexpected = set(cell_columns) - known_columns
+    if unexpected:
+        raise ValueError(f'Unexpected cell columns: {", ".join(sorted(unexpected))}.')
+
+    counts = np.asarray(counts)
+    birth_years = np.asarray(birth_years)
+    if counts.shape != birth_years.shape or (counts.size and (counts.dtype.kind not in 'iu'
+                                                               or (counts < 0).any())):
+        raise ValueError('Counts must be a non-negative integer for each cell.')
+    population = int(counts.sum())
+
+    results: Dict[str, Dict[str, Union[int, float, None]]] = {}
+    for name in illness_names:
+        illness = illness_registry[name]
+        probabilities = illness.module.immunity_batch(birth_years,
+                                                      cell_columns.get(illness.vaccinations),
+                                                      cell_columns.get(illness.illness),
+                                                      )[f'probability_of_{name}_immunity']
+        expected_immune = float(np.dot(counts, probabilities))
+        results[name] = {'population': population,
+                         'expected_immune': expected_immune,
+                         'mean_probability_of_immunity': expected_immune / population if population else None,
+                         }
+    return results
@@ -1,24 +1,299 @@
-import datetime
+import math
 
-from typing import Union
+from typing import (Any,
+                    Callable,
+                    Dict,
+                    List,
+                    Optional,
+                    Tuple,
+                    Union,
+                    )
 
-current_year: int = datetime.date.today().year  # Returns 4 digit year.
+import numpy as np
+import numpy.typing as npt
 
+from .clock import clock
 
-def validate_birth_year(birth_year: int) -> Union[int, ValueError]:
+current_year: int = clock.year  # 4 digit year, updated by clock on rollover.
+min_birth_year: int = 1000  # Earliest 4 digit year.
+max_projection_years: int = 100  # Latest as of year, years after the current year.
+
+# Largest combined key evaluate_unique() will rank with a dense lookup array rather than by sorting.
+max_dense_keys = 1 << 24
+
+# Vaccination counts above 2 share a result for every illness, so decision tables clamp them to 3.
+max_table_vaccinations = 3
+
+
+@clock.on_rollover
+def update_current_year(year: int) -> None:
+    """
+    Update current_year on the clock rolling over, ahead of illness modules
+    rebuilding their tables, which depend on it.
+
+    :param year: int, the new year.
+    :return: None
+    """
+    global current_year
+    current_year = year
+
+
+def validate_birth_year(birth_year: int, as_of_year: Optional[int] = None) -> Union[int, ValueError]:
     """
     Validate birth_year supplied to illness functions.
 
     Accepts a four digit positive integer (eg 1000+) up to the current year,
-    inferring equivalent floats eg 1980.0 accepted as 1980.
+    or up to as_of_year where given, inferring equivalent floats eg 1980.0
+    accepted as 1980.
 
     # Future possibility to also accept a datetime object, str and return valid
     integer for illness function consumption.
 
     :param birth_year: int
+    :param as_of_year: int or None, year immunity is evaluated as of,
+        already validated, see validate_as_of_year().
     :raises ValueError: Where supplied argument is not valid.
     :return: int
     """
-    if not isinstance(birth_year, int) or not 999 < birth_year <= current_year:
-        raise ValueError(f'Birth year must be a 4 digit integer less than {current_year}.')
+    year = clock.year if as_of_year is None else as_of_year
+    if not isinstance(birth_year, int) or not min_birth_year <= birth_year <= year:
+        raise ValueError(f'Birth year must be a 4 digit integer less than {year}.')
     return birth_year
+
+
+def validate_as_of_year(as_of_year: int) -> int:
+    """
+    Validate as_of_year supplied to illness functions, the year immunity is
+    evaluated as of, eg for projecting waning immunity into future years.
+
+    Accepts a four digit positive integer (eg 1000+) up to
+    max_projection_years after the current year.
+
+    :param as_of_year: int
+    :raises ValueError: Where supplied argument is not valid.
+    :return: int
+    """
+    max_as_of_year = clock.year + max_projection_years
+    if type(as_of_year) is not int or not min_birth_year <= as_of_year <= max_as_of_year:
+        raise ValueError(f'As of year must be a 4 digit integer up to {max_as_of_year}.')
+    return as_of_year
+
+
+def decision_index(birth_year: Any, vaccinations: Any, illness: Any) -> Optional[int]:
+    """
+    Index of a person's result in a decision table built by
+    compile_decision_table().
+
+    Only inputs immunity() accepts without validation are indexed: an int
+    birth year in range, falsey or positive int vaccinations. Anything else,
+    eg strings, floats or negative vaccinations, returns None, to be
+    evaluated, and validated, in full.
+
+    :param birth_year: int
+    :param vaccinations: int or None
+    :param illness: bool
+    :return: int or None
+    """
+    if type(birth_year) is not int or not min_birth_year <= birth_year <= clock.year:
+        return None
+    if not vaccinations:
+        vaccinations = 0
+    elif type(vaccinations) is not int or vaccinations < 0:
+        return None
+    elif vaccinations > max_table_vaccinations:
+        vaccinations = max_table_vaccinations
+    return ((birth_year - min_birth_year) * (max_table_vaccinations + 1) + vaccinations) * 2 + bool(illness)
+
+
+def compile_decision_table(evaluate_immunity: Callable[[int, int, bool], Tuple[float, List[str]]],
+                           ) -> List[Tuple[float, Tuple[str, ...]]]:
+    """
+    Enumerate every valid (birth year, vaccinations, illness) input of an
+    illness into a flat table of (probability, content templates), indexed
+    by decision_index().
+
+    Valid inputs are then answered by a single list lookup, instead of
+    re-running validation and the illness' decision logic for each person.
+
+    :param evaluate_immunity: eg mumps.evaluate_immunity
+    :return: List of (float, Tuple[str, ...])
+    """
+    table = []
+    for birth_year in range(min_birth_year, current_year + 1):
+        for vaccinations in range(max_table_vaccinations + 1):
+            for illness in (False, True):
+                probability, templates = evaluate_immunity(birth_year, vaccinations, illness)
+                table.append((probability, tuple(templates)))
+    return table
+
+
+def validate_birth_years(birth_years: npt.ArrayLike, as_of_years: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Validate an array of birth years supplied to illness batch functions.
+
+    Array equivalent of validate_birth_year: every element must be a four
+    digit integer up to the current year, or up to the corresponding
+    as_of_years element where given, and the array must have an integer
+    dtype.
+
+    Birth years are broadcast against as_of_years, eg a column of birth years
+    against a row of as of years for a (birth year x as of year) grid.
+
+    :param birth_years: array_like of int
+    :param as_of_years: np.ndarray of int or None, already validated, see
+        validate_as_of_years().
+    :raises ValueError: Where any supplied birth year is not valid.
+    :return: np.ndarray of int
+    """
+    year = clock.year
+    birth_years = np.asarray(birth_years)
+    if as_of_years is not None:
+        birth_years = np.broadcast_to(birth_years, np.broadcast_shapes(birth_years.shape, as_of_years.shape))
+    if birth_years.size and (birth_years.dtype.kind not in 'iu'
+                             or ((birth_years < min_birth_year)
+                                 | (birth_years > (year if as_of_years is None else as_of_years))).any()):
+        raise ValueError(f'Birth year must be a 4 digit integer less than '
+                         f'{year if as_of_years is None else "as of year"}.')
+    return birth_years.astype(np.int64, copy=False)
+
+
+def validate_as_of_years(as_of_years: Optional[npt.ArrayLike]) -> Optional[np.ndarray]:
+    """
+    Validate an array of as of years supplied to illness batch functions.
+
+    Array equivalent of validate_as_of_year. None, for the current year, is
+    returned as None.
+
+    :param as_of_years: array_like of int, or None
+    :raises ValueError: Where any supplied as of year is not valid.
+    :return: np.ndarray of int, or None
+    """
+    if as_of_years is None:
+        return None
+    max_as_of_year = clock.year + max_projection_years
+    as_of_years = np.asarray(as_of_years)
+    if as_of_years.size and (as_of_years.dtype.kind not in 'iu'
+                             or ((as_of_years < min_birth_year) | (as_of_years > max_as_of_year)).any()):
+        raise ValueError(f'As of year must be a 4 digit integer up to {max_as_of_year}.')
+    return as_of_years.astype(np.int64, copy=False)
+
+
+def validate_vaccinations(vaccinations: Optional[npt.ArrayLike],
+                          applicable: np.ndarray,
+                          message: str) -> np.ndarray:
+    """
+    Validate an array of vaccination counts supplied to illness batch functions.
+
+    Mirrors the scalar immunity functions, which only validate vaccinations
+    when they are used to determine the result: counts on rows where
+    applicable is True must be integers (or integer equivalent floats eg 2.0)
+    greater than or equal to zero. None is treated as no vaccinations.
+
+    :param vaccinations: array_like of int, or None
+    :param applicable: np.ndarray of bool, rows where vaccinations are used.
+    :param message: str, error message on validation failure.
+    :raises ValueError: Where any applicable vaccination count is not valid.
+    :return: np.ndarray of int, 0 on rows where not applicable.
+    """
+    if vaccinations is None:
+        return np.zeros(applicable.shape, dtype=np.int64)
+    vaccinations = np.broadcast_to(np.asarray(vaccinations), applicable.shape)
+    if vaccinations.dtype.kind not in 'biuf':
+        raise ValueError(message)
+    vaccinations = np.where(applicable, vaccinations, 0)
+    if vaccinations.dtype.kind == 'f' and not (np.isfinite(vaccinations)
+                                               & (vaccinations == np.floor(vaccinations))).all():
+        raise ValueError(message)
+    if (vaccinations < 0).any():
+        raise ValueError(message)
+    return vaccinations.astype(np.int64)
+
+
+def illness_flags(flags: Optional[npt.ArrayLike], shape: tuple) -> np.ndarray:
+    """
+    Convert previous illness flags supplied to illness batch functions into a
+    boolean array of the given shape. None is treated as no previous illness.
+
+    :param flags: array_like of bool, or None
+    :param shape: tuple, shape of the birth years array.
+    :return: np.ndarray of bool
+    """
+    if flags is None:
+        return np.zeros(shape, dtype=bool)
+    return np.broadcast_to(np.asarray(flags, dtype=bool), shape)
+
+
+def evaluate_unique(batch_function: Callable[..., Dict[str, np.ndarray]],
+                    *columns: Optional[npt.ArrayLike],
+                    ) -> Dict[str, np.ndarray]:
+    """
+    Evaluate an illness batch function once per unique combination of input
+    values, scattering the results back to every row.
+
+    Rosters typically hold a few thousand distinct (birth year, shots,
+    illness) combinations across millions of rows. Each column is reduced to
+    integer codes - for integer/bool columns simply the offset from the
+    column minimum - which are combined into a single key per row. Where the
+    key space is small enough, unique keys are found by marking a dense
+    array, avoiding a sort, otherwise via np.unique.
+
+    None columns are passed to batch_function as None.
+
+    :param batch_function: eg measles.immunity_batch
+    :param columns: array_like or None, batch_function's positional arguments.
+    :raises: ValueError As raised by batch_function on improper valued data.
+    :return: Dict of np.ndarray, as returned by batch_function.
+    """
+    present = [index for index, column in enumerate(columns) if column is not None]
+    arrays = np.broadcast_arrays(*[np.asarray(columns[index]) for index in present])
+    if not arrays or not arrays[0].size:
+        return batch_function(*columns)
+
+    codes: List[np.ndarray] = []
+    # Per column, unique values for columns coded by np.unique, otherwise None and the minimum.
+    unique_values: List[Optional[np.ndarray]] = []
+    minimums: List[int] = []
+    for array in arrays:
+        if array.dtype.kind in 'biu':
+            minimums.append(int(array.min()))
+            codes.append(array.astype(np.int64) - minimums[-1])
+            unique_values.append(None)
+        else:
+            try:
+                column_values, column_codes = np.unique(array, return_inverse=True)
+            except TypeError:  # Unorderable values, eg None among ints, for batch_function to reject.
+                return batch_function(*columns)
+            codes.append(column_codes.reshape(array.shape))
+            unique_values.append(column_values)
+            minimums.append(0)
+
+    ranges = [int(code.max()) + 1 for code in codes]
+    key_space = math.prod(ranges)
+    if key_space > np.iinfo(np.int64).max:
+        # Eg widely spread invalid values, combined key would overflow.
+        return batch_function(*columns)
+    key = np.zeros(arrays[0].shape, dtype=np.int64)
+    for code, code_range in zip(codes, ranges):
+        key = key * code_range + code
+
+    if key_space <= max(max_dense_keys, key.size):
+        marked = np.zeros(key_space, dtype=bool)
+        marked[key] = True
+        unique_keys = np.flatnonzero(marked)
+        position = np.empty(key_space, dtype=np.intp)
+        position[unique_keys] = np.arange(len(unique_keys))
+        inverse = position[key]
+    else:
+        unique_keys, inverse = np.unique(key, return_inverse=True)
+        inverse = inverse.reshape(key.shape)
+
+    unique_columns: List[Optional[npt.ArrayLike]] = list(columns)
+    remaining = unique_keys
+    for index, array, code_range, values, minimum in reversed(list(zip(present, arrays, ranges,
+                                                                       unique_values, minimums))):
+        code = remaining % code_range
+        unique_columns[index] = (code + minimum).astype(array.dtype) if values is None else values[code]
+        remaining = remaining // code_range
+
+    results = batch_function(*unique_columns)
+    return {name: result[inverse] for name, result in results.items()}
@@ -0,0 +1,177 @@
+"""
+Lookup table exporter - materializes every valid input of each illness.
+
+Writes the probability and content templates of every (birth year, doses,
+illness) input each illness' decision table holds, to an indexed SQLite
+table and/or CSV file, so other tools can join records against exactly the
+numbers immunity() returns:
+
+    python -m illnesses.export --sqlite immunity_lookup.sqlite --csv immunity_lookup.csv
+
+Rows are:
+    illness, birth_year, doses, had_illness, probability, content_templates,
+    model_version, as_of_year
+
+doses runs from 0 to max_table_vaccinations, which stands for that many or
+more doses, so joins should use MIN(doses, 3). had_illness is 0 or 1.
+Content templates are joined with '|', as by illnesses.score.
+
+Results depend on the illness models and the year, so each row is stamped
+with model_version, a hash of the illnesses package source, and as_of_year.
+The SQLite file also holds these in an export_metadata table.
+"""
+import argparse
+import csv
+import hashlib
+import sqlite3
+import sys
+
+from pathlib import Path
+from typing import (Iterable,
+                    Iterator,
+                    List,
+                    Optional,
+                    Tuple,
+                    Union,
+                    )
+
+from illnesses.clock import clock
+from illnesses.common_helpers import (max_table_vaccinations,
+                                      min_birth_year,
+                                      )
+from illnesses.registry import (IllnessEntry,
+                                illness_registry,
+                                )
+
+fieldnames = ['illness', 'birth_year', 'doses', 'had_illness', 'probability', 'content_templates',
+              'model_version', 'as_of_year']
+
+
+def model_version() -> str:
+    """
+    Hash of the illnesses package source, changing with any illness model.
+
+    :return: str, hex digest.
+    """
+    digest = hashlib.sha256()
+    package = Path(__file__).parent
+    for path in sorted(package.glob('*.py')):
+        digest.update(path.name.encode('utf-8'))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def lookup_rows(illnesses: Iterable[IllnessEntry],
+                version: str,
+                ) -> Iterator[Tuple[str, int, int, int, float, str, str, int]]:
+    """
+    Every valid input of each illness, with its result, in the order of
+    the illness' decision table.
+
+    :param illnesses: Iterable of IllnessEntry, eg illness_registry.values()
+    :param version: str, model_version() to stamp rows with.
+    :return: Iterator of Tuple, see fieldnames.
+    """
+    for illness in illnesses:
+        # Read once, so rows are consistent should the year roll over.
+        decision_table = illness.module.decision_table
+        as_of_year = min_birth_year + len(decision_table) // ((max_table_vaccinations + 1) * 2) - 1
+        rows = iter(decision_table)
+        for birth_year in range(min_birth_year, as_of_year + 1):
+            for doses in range(max_table_vaccinations + 1):
+                for had_illness in (0, 1):
+                    probability, templates = next(rows)
+                    yield (illness.name, birth_year, doses, had_illness, probability, '|'.join(templates),
+                           version, as_of_year)
+
+
+def export_sqlite(path: Union[str, Path], illnesses: Iterable[IllnessEntry], version: str) -> int:
+    """
+    Write lookup rows to the immunity_lookup table of a SQLite database,
+    replacing any previous export, with a primary key on
+    (illness, birth_year, doses, had_illness) for joins.
+
+    :param path: str or Path, SQLite database file.
+    :param illnesses: Iterable of IllnessEntry
+    :param version: str, model_version()
+    :return: int, number of rows written.
+    """
+    connection = sqlite3.connect(path)
+    try:
+        with connection:
+            connection.execute('DROP TABLE IF EXISTS immunity_lookup')
+            connection.execute('CREATE TABLE immunity_lookup ('
+                               'illness TEXT NOT NULL, '
+                               'birth_year INTEGER NOT NULL, '
+                               'doses INTEGER NOT NULL, '
+                               'had_illness INTEGER NOT NULL, '
+                               'probability REAL NOT NULL, '
+                               'content_templates TEXT NOT NULL, '
+                               'model_version TEXT NOT NULL, '
+                               'as_of_year INTEGER NOT NULL, '
+                               'PRIMARY KEY (illness, birth_year, doses, had_illness)) WITHOUT ROWID')
+            cursor = connection.executemany(f'INSERT INTO immunity_lookup VALUES ({", ".join("?" * len(fieldnames))})',
+                                            lookup_rows(illnesses, version))
+            rows = cursor.rowcount
+            connection.execute('CREATE TABLE IF NOT EXISTS export_metadata (key TEXT PRIMARY KEY, value TEXT)')
+            connection.executemany('INSERT OR REPLACE INTO export_metadata VALUES (?, ?)',
+                                   [('model_version', version),
+                                    ('as_of_year', str(clock.year)),
+                                    ('max_table_vaccinations', str(max_table_vaccinations)),
+                                    ])
+    finally:
+        connection.close()
+    return rows
+
+
+def export_csv(path: Union[str, Path], illnesses: Iterable[IllnessEntry], version: str) -> int:
+    """
+    Write lookup rows to a CSV file, with a header row.
+
+    :param path: str or Path, '-' for stdout.
+    :param illnesses: Iterable of IllnessEntry
+    :param version: str, model_version()
+    :return: int, number of rows written.
+    """
+    rows = 0
+    stream = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+    try:
+        writer = csv.writer(stream)
+        writer.writerow(fieldnames)
+        for row in lookup_rows(illnesses, version):
+            writer.writerow(row)
+            rows += 1
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+    return rows
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='python -m illnesses.export',
+                                     description='Export every valid input of each illness, with its result.')
+    parser.add_argument('--sqlite', help='SQLite database file to write the immunity_lookup table to.')
+    parser.add_argument('--csv', help='CSV file to write, - for stdout.')
+    parser.add_argument('--illness', action='append', choices=list(illness_registry), dest='illnesses',
+                        help='Illness to export, may be repeated, default all illnesses.')
+    args = parser.parse_args(argv)
+    if not args.sqlite and not args.csv:
+        parser.error('at least one of --sqlite or --csv is required')
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    illnesses = [illness_registry[name] for name in (args.illnesses or illness_registry)]
+    version = model_version()
+    if args.sqlite:
+        rows = export_sqlite(args.sqlite, illnesses, version)
+        print(f'Wrote {rows} rows to {args.sqlite}, model version {version[:12]}.', file=sys.stderr)
+    if args.csv:
+        rows = export_csv(args.csv, illnesses, version)
+        print(f'Wrote {rows} rows to {args.csv}, model version {version[:12]}.', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
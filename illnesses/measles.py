@@ -1,8 +1,22 @@
 from typing import (Optional, Dict,
                     List,
+                    Tuple,
                     Union)
 
-from .common_helpers import validate_birth_year
+import numpy as np
+import numpy.typing as npt
+
+from .clock import clock
+from .common_helpers import (compile_decision_table,
+                             decision_index,
+                             evaluate_unique,
+                             illness_flags,
+                             validate_as_of_year,
+                             validate_as_of_years,
+                             validate_birth_year,
+                             validate_birth_years,
+                             validate_vaccinations,
+                             )
 
 """
 CDC Presumptive evidence of immunity: https://www.cdc.gov/vaccines/pubs/surv-manual/chpt07-measles.html
@@ -93,10 +107,122 @@ shots_under_6_immunity = {
     2: 0.97,
 }
 
+# Content templates returned by immunity(), indexed by immunity_batch() template code.
+content_templates_by_code: Tuple[Tuple[str, ...], ...] = (
+    ('no_immunisations',),
+    ('previous_illness',),
+    ('pre_1957_message',),
+    ('has_immunisations',),
+    ('has_immunisations', 'greater_than_two_shots_before_age_six_message'),
+)
+(no_immunisations_code,
+ previous_illness_code,
+ pre_1957_code,
+ has_immunisations_code,
+ greater_than_two_shots_code) = range(len(content_templates_by_code))
+
+# Probability/template code by on time vaccinations, with > 2 vaccinations clamped to 3.
+_probability_by_vaccinations = np.array([shots_under_6_immunity[0],
+                                         shots_under_6_immunity[1],
+                                         shots_under_6_immunity[2],
+                                         shots_under_6_immunity[2],
+                                         ])
+_template_code_by_vaccinations = np.array([no_immunisations_code,
+                                           has_immunisations_code,
+                                           has_immunisations_code,
+                                           greater_than_two_shots_code,
+                                           ], dtype=np.uint8)
+
+
+def post_1957_immunity(birth_year: int,
+                       on_time_measles_vaccinations: Optional[int] = None) -> Tuple[float, List[str]]:
+    """
+    Takes year of birth and number of shots before age 6, and provides an
+    estimated probability of being immune to measles if exposed, and content
+    templates, for a person born 1957 or later with no previous illness.
+
+    birth_year must already be validated, see immunity().
+
+    :param birth_year: int
+    :param on_time_measles_vaccinations: int or None
+    :raises: ValueError On improper valued on_time_measles_vaccinations.
+    :return: Tuple (float, List[str])
+    """
+    # Set defaults:
+    probability, templates = shots_under_6_immunity[0], ['no_immunisations']
+
+    if on_time_measles_vaccinations:
+        if not (int(on_time_measles_vaccinations) > 0  # Must be > 0
+                # Must be integer.
+                and (isinstance(on_time_measles_vaccinations, int)
+                     # Or float equiv to int eg 2.0 = 2
+                     or int(on_time_measles_vaccinations) == on_time_measles_vaccinations)):
+            raise ValueError('Measles vaccinations must be a positive integer.')  # Or zero.
+
+        if on_time_measles_vaccinations <= 2:
+            probability, templates = shots_under_6_immunity[on_time_measles_vaccinations], ['has_immunisations']
+        if on_time_measles_vaccinations > 2:
+            probability, templates = shots_under_6_immunity[2], ['has_immunisations',
+                                                                 'greater_than_two_shots_before_age_six_message']
+
+    return probability, templates
+
+
+def evaluate_immunity(birth_year: int,
+                      on_time_measles_vaccinations: Optional[int] = None,
+                      measles_illness: bool = False,
+                      as_of_year: Optional[int] = None) -> Tuple[float, List[str]]:
+    """
+    Decision logic of immunity(), returning the probability and content
+    templates as a tuple. Used to compile decision_table, and by immunity()
+    for inputs the table does not cover.
+
+    :param birth_year: int
+    :param on_time_measles_vaccinations: int or None
+    :param measles_illness: bool
+    :param as_of_year: int or None, year to evaluate immunity as of, default current year.
+    :raises: ValueError On improper valued data.
+    :return: Tuple (float, List[str])
+    """
+    if as_of_year is not None:
+        validate_as_of_year(as_of_year)
+    # Enforce integer 4 digit birth year up to current year, or as of year.
+    validate_birth_year(birth_year, as_of_year)
+
+    if measles_illness:
+        # Presume immunity from infection similar to pre-1957 immunity,
+        # since pre-1957 immunity is presumed based on exposure/infection.
+        probability, templates = conferred_immunity, ['previous_illness']
+
+    elif birth_year < 1957:
+        probability, templates = conferred_immunity, ['pre_1957_message']
+
+    else:
+        probability, templates = post_1957_immunity(birth_year, on_time_measles_vaccinations)
+
+    return probability, templates
+
+
+# Every valid input's result, indexed by decision_index(), see compile_decision_table().
+decision_table = compile_decision_table(evaluate_immunity)
+
+
+@clock.on_rollover
+def rebuild_year_tables(year: int) -> None:
+    """
+    Rebuild decision_table on the clock rolling over to a new year.
+
+    :param year: int, the new year.
+    :return: None
+    """
+    global decision_table
+    decision_table = compile_decision_table(evaluate_immunity)
+
 
 def immunity(birth_year: int,
              on_time_measles_vaccinations: Optional[int] = None,
-             measles_illness: bool = False) -> Dict[str, Union[float, List[str]]]:
+             measles_illness: bool = False,
+             as_of_year: Optional[int] = None) -> Dict[str, Union[float, List[str]]]:
     """
     Takes year of birth, number of shots before age 6, previous illness and
     provides an estimated probability of being immune to measles if exposed.
@@ -108,6 +234,10 @@ def immunity(birth_year: int,
     on_time_measles_vaccinations not required -  not supplied or falsey value
         such as None, False, ''
 
+    as_of_year not required - None evaluates immunity as of the current year,
+        otherwise as of the given year, eg for projections, birth_year being
+        valid up to as_of_year.
+
     ValueError will be deliberately raised on improper data.
 
 
@@ -129,37 +259,81 @@ def immunity(birth_year: int,
     :param birth_year: int
     :param on_time_measles_vaccinations: int or None
     :param measles_illness: bool
+    :param as_of_year: int or None, year to evaluate immunity as of, default current year.
     :raises: ValueError On improper valued data.
     :return: Dict {'probability_of_measles_immunity': float, 'content_templates': List(str)}
     """
-    # Set defaults:
-    probability, templates = shots_under_6_immunity[0], ['no_immunisations']
+    index = decision_index(birth_year, on_time_measles_vaccinations, measles_illness) if as_of_year is None else None
+    if index is None or index >= len(decision_table):
+        # Inputs needing validation, outside the decision table eg mid rollover, or as of another year.
+        probability, templates = evaluate_immunity(birth_year, on_time_measles_vaccinations, measles_illness,
+                                                   as_of_year)
+    else:
+        probability, templates = decision_table[index][0], list(decision_table[index][1])
 
-    # Enforce integer 4 digit birth year up to current year.
-    validate_birth_year(birth_year)
+    return {'probability_of_measles_immunity': probability, 'content_templates': templates}
 
-    if measles_illness:
-        # Presume immunity from infection similar to pre-1957 immunity,
-        # since pre-1957 immunity is presumed based on exposure/infection.
-        probability, templates = conferred_immunity, ['previous_illness']
 
-    elif birth_year < 1957:
-        probability, templates = conferred_immunity, ['pre_1957_message']
+def immunity_batch(birth_years: npt.ArrayLike,
+                   on_time_measles_vaccinations: Optional[npt.ArrayLike] = None,
+                   measles_illness: Optional[npt.ArrayLike] = None,
+                   as_of_years: Optional[npt.ArrayLike] = None,
+                   deduplicate: bool = False,
+                   ) -> Dict[str, np.ndarray]:
+    """
+    Vectorised immunity() for arrays of people, eg a school roster.
 
-    elif on_time_measles_vaccinations:
-        if not (int(on_time_measles_vaccinations) > 0  # Must be > 0
-                # Must be integer.
-                and (isinstance(on_time_measles_vaccinations, int)
-                     # Or float equiv to int eg 2.0 = 2
-                     or int(on_time_measles_vaccinations) == on_time_measles_vaccinations)):
-            raise ValueError('Measles vaccinations must be a positive integer.')  # Or zero.
+    Takes arrays of birth years, number of shots before age 6 and previous
+    illness, and provides an array of estimated probabilities of being
+    immune to measles if exposed, with the same semantics as immunity().
 
-        if on_time_measles_vaccinations <= 2:
-            probability, templates = shots_under_6_immunity[on_time_measles_vaccinations], ['has_immunisations']
-        if on_time_measles_vaccinations > 2:
-            probability, templates = shots_under_6_immunity[2], ['has_immunisations',
-                                                                 'greater_than_two_shots_before_age_six_message']
+    Content templates are returned as an array of integer codes, the
+    templates for each code being content_templates_by_code[code].
 
-    return {'probability_of_measles_immunity': probability, 'content_templates': templates}
+    With deduplicate=True each unique combination of inputs is evaluated
+    once, and the results scattered back to every row, which is faster for
+    rosters with many people sharing the same inputs.
+
+    on_time_measles_vaccinations and measles_illness not required - None
+        is treated as no shots/no previous illness. Scalars are broadcast.
+
+    as_of_years not required - None evaluates immunity as of the current
+        year. Broadcast against birth_years, eg birth_years[:, np.newaxis]
+        with a 1-D as_of_years gives a (birth year x as of year) grid in one
+        call, for projections.
+
+    ValueError will be deliberately raised if any row has improper data.
+
+    :param birth_years: array_like of int
+    :param on_time_measles_vaccinations: array_like of int or None
+    :param measles_illness: array_like of bool or None
+    :param as_of_years: array_like of int or None, years to evaluate immunity as of.
+    :param deduplicate: bool, evaluate each unique combination of inputs once.
+    :raises: ValueError On improper valued data.
+    :return: Dict {'probability_of_measles_immunity': np.ndarray(float),
+                   'content_template_codes': np.ndarray(np.uint8)}
+    """
+    if deduplicate:
+        return evaluate_unique(immunity_batch, birth_years, on_time_measles_vaccinations, measles_illness, as_of_years)
+
+    as_of_years = validate_as_of_years(as_of_years)
+    birth_years = validate_birth_years(birth_years, as_of_years)
+    measles_illness = illness_flags(measles_illness, birth_years.shape)
+    pre_1957 = ~measles_illness & (birth_years < 1957)
+    vaccinations = validate_vaccinations(on_time_measles_vaccinations,
+                                         applicable=~(measles_illness | pre_1957),
+                                         message='Measles vaccinations must be a positive integer.')
+    vaccinations = np.minimum(vaccinations, 3)
+
+    probability = np.where(measles_illness | pre_1957,
+                           conferred_immunity,
+                           _probability_by_vaccinations[vaccinations])
+    template_codes = np.where(measles_illness,
+                              np.uint8(previous_illness_code),
+                              np.where(pre_1957,
+                                       np.uint8(pre_1957_code),
+                                       _template_code_by_vaccinations[vaccinations]))
+
+    return {'probability_of_measles_immunity': probability, 'content_template_codes': template_codes}
 
 # need case where shots after age 6
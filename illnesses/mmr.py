@@ -0,0 +1,113 @@
+"""
+Combined measles, mumps and rubella (MMR) immunity evaluator.
+
+Evaluating each illness' immunity() separately re-validates the birth year
+and re-applies the shared born before 1957 presumption for every illness.
+immunity() here answers valid inputs from each illness' decision_table,
+otherwise validates a person once, applies the shared rules once, then
+dispatches to each illness' post_1957_immunity() only where needed.
+"""
+from typing import (Dict,
+                    List,
+                    Optional,
+                    Union,
+                    )
+
+from . import (measles,
+               mumps,
+               rubella,
+               )
+from .common_helpers import (decision_index,
+                             validate_as_of_year,
+                             validate_birth_year,
+                             )
+
+
+def immunity(birth_year: int,
+             on_time_measles_vaccinations: Optional[int] = None,
+             measles_illness: bool = False,
+             on_time_mumps_vaccinations: Optional[int] = None,
+             mumps_illness: bool = False,
+             rubella_vaccinations: Optional[int] = None,
+             rubella_illness: bool = False,
+             as_of_year: Optional[int] = None,
+             ) -> Dict[str, Dict[str, Union[float, List[str]]]]:
+    """
+    Takes year of birth, shots and previous illness for measles, mumps and
+    rubella, and provides the result of each illness' immunity() for the
+    person.
+
+    Shots not required -  not supplied or falsey value such as None, False, ''
+
+    as_of_year not required - None evaluates immunity as of the current year.
+
+    ValueError will be deliberately raised on improper data.
+
+    :param birth_year: int
+    :param on_time_measles_vaccinations: int or None
+    :param measles_illness: bool
+    :param on_time_mumps_vaccinations: int or None
+    :param mumps_illness: bool
+    :param rubella_vaccinations: int or None
+    :param rubella_illness: bool
+    :param as_of_year: int or None, year to evaluate immunity as of, default current year.
+    :raises: ValueError On improper valued data.
+    :return: Dict {'measles': measles.immunity() result,
+                   'mumps': mumps.immunity() result,
+                   'rubella': rubella.immunity() result}
+    """
+    measles_index = decision_index(birth_year, on_time_measles_vaccinations, measles_illness)
+    mumps_index = decision_index(birth_year, on_time_mumps_vaccinations, mumps_illness)
+    rubella_index = decision_index(birth_year, rubella_vaccinations, rubella_illness)
+    if (as_of_year is None
+            and measles_index is not None and measles_index < len(measles.decision_table)
+            and mumps_index is not None and mumps_index < len(mumps.decision_table)
+            and rubella_index is not None and rubella_index < len(rubella.decision_table)):
+        measles_result = measles.decision_table[measles_index]
+        mumps_result = mumps.decision_table[mumps_index]
+        rubella_result = rubella.decision_table[rubella_index]
+        return {'measles': {'probability_of_measles_immunity': measles_result[0],
+                            'content_templates': list(measles_result[1])},
+                'mumps': {'probability_of_mumps_immunity': mumps_result[0],
+                          'content_templates': list(mumps_result[1])},
+                'rubella': {'probability_of_rubella_immunity': rubella_result[0],
+                            'content_templates': list(rubella_result[1])},
+                }
+
+    if as_of_year is not None:
+        validate_as_of_year(as_of_year)
+    # Enforce integer 4 digit birth year up to current year, or as of year.
+    validate_birth_year(birth_year, as_of_year)
+
+    if birth_year < 1957:
+        # Presumed immunity from exposure/infection, whether or not illness was recorded.
+        return {'measles': {'probability_of_measles_immunity': measles.conferred_immunity,
+                            'content_templates': ['previous_illness' if measles_illness else 'pre_1957_message']},
+                'mumps': {'probability_of_mumps_immunity': mumps.conferred_immunity,
+                          'content_templates': ['previous_illness' if mumps_illness else 'pre_1957_message']},
+                'rubella': {'probability_of_rubella_immunity': rubella.conferred_immunity,
+                            'content_templates': ['previous_illness' if rubella_illness else 'pre_1957_message']},
+                }
+
+    if measles_illness:
+        measles_probability, measles_templates = measles.conferred_immunity, ['previous_illness']
+    else:
+        measles_probability, measles_templates = measles.post_1957_immunity(birth_year,
+                                                                            on_time_measles_vaccinations)
+    if mumps_illness:
+        mumps_probability, mumps_templates = mumps.conferred_immunity, ['previous_illness']
+    else:
+        mumps_probability, mumps_templates = mumps.post_1957_immunity(birth_year, on_time_mumps_vaccinations,
+                                                                      as_of_year)
+    if rubella_illness:
+        rubella_probability, rubella_templates = rubella.conferred_immunity, ['previous_illness']
+    else:
+        rubella_probability, rubella_templates = rubella.post_1957_immunity(birth_year, rubella_vaccinations)
+
+    return {'measles': {'probability_of_measles_immunity': measles_probability,
+                        'content_templates': measles_templates},
+            'mumps': {'probability_of_mumps_immunity': mumps_probability,
+                      'content_templates': mumps_templates},
+            'rubella': {'probability_of_rubella_immunity': rubella_probability,
+                        'content_templates': rubella_templates},
+            }
@@ -1,10 +1,25 @@
 from math import e
 from typing import (Optional, Dict,
                     List,
+                    Tuple,
                     Union)
 
-from .common_helpers import (current_year,
+import numpy as np
+import numpy.typing as npt
+
+from .clock import clock
+from .common_helpers import (compile_decision_table,
+                             decision_index,
+                             evaluate_unique,
+                             current_year,
+                             illness_flags,
+                             max_projection_years,
+                             min_birth_year,
+                             validate_as_of_year,
+                             validate_as_of_years,
                              validate_birth_year,
+                             validate_birth_years,
+                             validate_vaccinations,
                              )
 
 """
@@ -83,38 +98,205 @@ one_dose_waning_imm_exp_coeff = -0.0309279447
 two_dose_init_immunity = 0.9945023402
 two_dose_waning_imm_exp_coeff = -0.03239090802
 
-
-def one_dose_immunity(birth_year: int) -> float:
+# Content templates returned by immunity(), indexed by immunity_batch() template code.
+content_templates_by_code: Tuple[Tuple[str, ...], ...] = (
+    ('no_immunisations',),
+    ('previous_illness',),
+    ('pre_1957_message',),
+    ('has_immunisations', 'waning_warning'),
+    ('has_immunisations', 'waning_warning', 'greater_than_two_shots_before_age_six_message'),
+)
+(no_immunisations_code,
+ previous_illness_code,
+ pre_1957_code,
+ has_immunisations_code,
+ greater_than_two_shots_code) = range(len(content_templates_by_code))
+
+
+def waning_immunity(init_immunity: float, waning_imm_exp_coeff: float, age: int) -> float:
     """
-    Returns a probability of immunity given one dose of mumps vaccine.
+    Returns a probability of immunity at a given age, from the initial
+    immunity and the exponential waning coefficient of a dosage regime.
 
-    :param birth_year: int
+    Immunity is presumed to wane from age six, the end of on time shots.
+
+    :param init_immunity: float
+    :param waning_imm_exp_coeff: float
+    :param age: int
     :return:  float 0<=x<=1
     """
-    years_after_age_six = (current_year - birth_year) - 6
+    years_after_age_six = age - 6
     if years_after_age_six < 0:
         years_after_age_six = 0
     # http://www.xuru.org/rt/ExpR.asp
-    return one_dose_init_immunity * (e ** (one_dose_waning_imm_exp_coeff * years_after_age_six))
+    return init_immunity * (e ** (waning_imm_exp_coeff * years_after_age_six))
+
+
+def immunity_by_age(init_immunity: float,
+                    waning_imm_exp_coeff: float,
+                    projection_years: int = 0) -> List[float]:
+    """
+    Returns probabilities of immunity indexed by age (current_year -
+    birth_year), for every valid birth year, and optionally for ages up to
+    projection_years later.
+
+    :param init_immunity: float
+    :param waning_imm_exp_coeff: float
+    :param projection_years: int, years after the current year to cover.
+    :return: List[float]
+    """
+    return [waning_immunity(init_immunity, waning_imm_exp_coeff, age)
+            for age in range(current_year + projection_years - min_birth_year + 1)]
+
+
+one_dose_immunity_by_age = immunity_by_age(one_dose_init_immunity, one_dose_waning_imm_exp_coeff)
+two_dose_immunity_by_age = immunity_by_age(two_dose_init_immunity, two_dose_waning_imm_exp_coeff)
+# Array copies for immunity_batch(), covering every (birth year, as of year) age.
+# Immunity depends only on age (as_of_year - birth_year), so indexing by age
+# broadcast over birth years and as of years looks up the full 2-D grid.
+_one_dose_immunity_by_age = np.array(immunity_by_age(one_dose_init_immunity, one_dose_waning_imm_exp_coeff,
+                                                     max_projection_years))
+_two_dose_immunity_by_age = np.array(immunity_by_age(two_dose_init_immunity, two_dose_waning_imm_exp_coeff,
+                                                     max_projection_years))
+
+
+def one_dose_immunity(birth_year: int, as_of_year: Optional[int] = None) -> float:
+    """
+    Returns a probability of immunity given one dose of mumps vaccine.
+
+    :param birth_year: int
+    :param as_of_year: int or None, default current year.
+    :return:  float 0<=x<=1
+    """
+    age = (current_year if as_of_year is None else as_of_year) - birth_year
+    # Table only indexed by int ages, eg not a float birth year's.
+    if isinstance(age, (int, np.integer)) and 0 <= age < len(one_dose_immunity_by_age):
+        return one_dose_immunity_by_age[age]
+    return waning_immunity(one_dose_init_immunity, one_dose_waning_imm_exp_coeff, age)
 
 
-def two_dose_immunity(birth_year: int) -> float:
+def two_dose_immunity(birth_year: int, as_of_year: Optional[int] = None) -> float:
     """
     Returns a probability of immunity given two doses of mumps vaccine.
 
     :param birth_year: int
+    :param as_of_year: int or None, default current year.
     :return:  float 0<=x<=1
     """
-    years_after_age_six = (current_year - birth_year) - 6
-    if years_after_age_six < 0:
-        years_after_age_six = 0
-    # http://www.xuru.org/rt/ExpR.asp
-    return two_dose_init_immunity * (e ** (two_dose_waning_imm_exp_coeff * years_after_age_six))
+    age = (current_year if as_of_year is None else as_of_year) - birth_year
+    # Table only indexed by int ages, eg not a float birth year's.
+    if isinstance(age, (int, np.integer)) and 0 <= age < len(two_dose_immunity_by_age):
+        return two_dose_immunity_by_age[age]
+    return waning_immunity(two_dose_init_immunity, two_dose_waning_imm_exp_coeff, age)
+
+
+def post_1957_immunity(birth_year: int,
+                       on_time_mumps_vaccinations: Optional[int] = None,
+                       as_of_year: Optional[int] = None) -> Tuple[float, List[str]]:
+    """
+    Takes year of birth and number of shots before age 6, and provides an
+    estimated probability of being immune to mumps if exposed, and content
+    templates, for a person born 1957 or later with no previous illness.
+
+    birth_year and as_of_year must already be validated, see immunity().
+
+    :param birth_year: int
+    :param on_time_mumps_vaccinations: int or None
+    :param as_of_year: int or None, year to evaluate immunity as of, default current year.
+    :raises: ValueError On improper valued on_time_mumps_vaccinations.
+    :return: Tuple (float, List[str])
+    """
+    # Set defaults:
+    probability, templates = natural_immunity, ['no_immunisations']
+
+    if on_time_mumps_vaccinations:
+        if not (int(on_time_mumps_vaccinations) > 0  # Must be > 0
+                # Must be integer.
+                and (isinstance(on_time_mumps_vaccinations, int)
+                     # Or float equiv to int eg 2.0 = 2
+                     or int(on_time_mumps_vaccinations) == on_time_mumps_vaccinations)):
+            raise ValueError('Mumps vaccinations must be a positive integer.')  # Or zero.
+
+        if on_time_mumps_vaccinations == 1:
+            probability, templates = one_dose_immunity(birth_year, as_of_year), ['has_immunisations',
+                                                                                 'waning_warning',
+                                                                                 ]
+        if on_time_mumps_vaccinations == 2:
+            probability, templates = two_dose_immunity(birth_year, as_of_year), ['has_immunisations',
+                                                                                 'waning_warning',
+                                                                                 ]
+        if on_time_mumps_vaccinations > 2:
+            probability, templates = two_dose_immunity(birth_year, as_of_year), [
+                'has_immunisations',
+                'waning_warning',
+                'greater_than_two_shots_before_age_six_message',
+            ]
+
+    return probability, templates
+
+
+def evaluate_immunity(birth_year: int,
+                      on_time_mumps_vaccinations: Optional[int] = None,
+                      mumps_illness: bool = False,
+                      as_of_year: Optional[int] = None) -> Tuple[float, List[str]]:
+    """
+    Decision logic of immunity(), returning the probability and content
+    templates as a tuple. Used to compile decision_table, and by immunity()
+    for inputs the table does not cover.
+
+    :param birth_year: int
+    :param on_time_mumps_vaccinations: int or None
+    :param mumps_illness: bool
+    :param as_of_year: int or None, year to evaluate immunity as of, default current year.
+    :raises: ValueError On improper valued data.
+    :return: Tuple (float, List[str])
+    """
+    if as_of_year is not None:
+        validate_as_of_year(as_of_year)
+    # Enforce integer 4 digit birth year up to current year, or as of year.
+    validate_birth_year(birth_year, as_of_year)
+
+    if mumps_illness:
+        probability, templates = conferred_immunity, ['previous_illness']
+
+    elif birth_year < 1957:
+        probability, templates = conferred_immunity, ['pre_1957_message',
+                                                      ]
+    else:
+        probability, templates = post_1957_immunity(birth_year, on_time_mumps_vaccinations, as_of_year)
+
+    return probability, templates
+
+
+# Every valid input's result, indexed by decision_index(), see compile_decision_table().
+decision_table = compile_decision_table(evaluate_immunity)
+
+
+@clock.on_rollover
+def rebuild_year_tables(year: int) -> None:
+    """
+    Rebuild tables of immunity by age, and decision_table, on the clock
+    rolling over to a new year, as ages, and so waning immunity, change.
+
+    :param year: int, the new year.
+    :return: None
+    """
+    global current_year, one_dose_immunity_by_age, two_dose_immunity_by_age
+    global _one_dose_immunity_by_age, _two_dose_immunity_by_age, decision_table
+    current_year = year
+    one_dose_immunity_by_age = immunity_by_age(one_dose_init_immunity, one_dose_waning_imm_exp_coeff)
+    two_dose_immunity_by_age = immunity_by_age(two_dose_init_immunity, two_dose_waning_imm_exp_coeff)
+    _one_dose_immunity_by_age = np.array(immunity_by_age(one_dose_init_immunity, one_dose_waning_imm_exp_coeff,
+                                                         max_projection_years))
+    _two_dose_immunity_by_age = np.array(immunity_by_age(two_dose_init_immunity, two_dose_waning_imm_exp_coeff,
+                                                         max_projection_years))
+    decision_table = compile_decision_table(evaluate_immunity)
 
 
 def immunity(birth_year: int,
              on_time_mumps_vaccinations: Optional[int] = None,
-             mumps_illness: bool = False) -> Dict[str, Union[float, List[str]]]:
+             mumps_illness: bool = False,
+             as_of_year: Optional[int] = None) -> Dict[str, Union[float, List[str]]]:
     """
     Takes year of birth, number of shots before age 6, previous illness, and
     provides an estimated probability of being immune to mumps if exposed.
@@ -126,6 +308,10 @@ def immunity(birth_year: int,
     on_time_mumps_vaccinations not required -  not supplied or falsey value
         such as None, False, ''
 
+    as_of_year not required - None evaluates immunity as of the current year,
+        otherwise as of the given year, eg for projections, birth_year being
+        valid up to as_of_year.
+
     ValueError will be deliberately raised on improper data.
 
     templates:  'pre_1957_message': CDC explanation of assumed immunity due to
@@ -149,42 +335,94 @@ def immunity(birth_year: int,
     :param birth_year: int
     :param on_time_mumps_vaccinations: int or None
     :param mumps_illness: bool
+    :param as_of_year: int or None, year to evaluate immunity as of, default current year.
     :raises: ValueError On improper valued data.
     :return: Dict {'probability_of_mumps_immunity': float, 'content_templates': List[str]}
     """
-    # Set defaults:
-    probability, templates = natural_immunity, ['no_immunisations']
+    index = decision_index(birth_year, on_time_mumps_vaccinations, mumps_illness) if as_of_year is None else None
+    if index is None or index >= len(decision_table):
+        # Inputs needing validation, outside the decision table eg mid rollover, or as of another year.
+        probability, templates = evaluate_immunity(birth_year, on_time_mumps_vaccinations, mumps_illness, as_of_year)
+    else:
+        probability, templates = decision_table[index][0], list(decision_table[index][1])
 
-    # Enforce integer 4 digit birth year up to current year.
-    validate_birth_year(birth_year)
+    return {'probability_of_mumps_immunity': probability, 'content_templates': templates}
 
-    if mumps_illness:
-        probability, templates = conferred_immunity, ['previous_illness']
 
-    elif birth_year < 1957:
-        probability, templates = conferred_immunity, ['pre_1957_message',
-                                                      ]
-    elif on_time_mumps_vaccinations:
-        if not (int(on_time_mumps_vaccinations) > 0  # Must be > 0
-                # Must be integer.
-                and (isinstance(on_time_mumps_vaccinations, int)
-                     # Or float equiv to int eg 2.0 = 2
-                     or int(on_time_mumps_vaccinations) == on_time_mumps_vaccinations)):
-            raise ValueError('Mumps vaccinations must be a positive integer.')  # Or zero.
+def immunity_batch(birth_years: npt.ArrayLike,
+                   on_time_mumps_vaccinations: Optional[npt.ArrayLike] = None,
+                   mumps_illness: Optional[npt.ArrayLike] = None,
+                   as_of_years: Optional[npt.ArrayLike] = None,
+                   deduplicate: bool = False,
+                   ) -> Dict[str, np.ndarray]:
+    """
+    Vectorised immunity() for arrays of people, eg a school roster.
 
-        if on_time_mumps_vaccinations == 1:
-            probability, templates = one_dose_immunity(birth_year), ['has_immunisations',
-                                                                     'waning_warning',
-                                                                     ]
-        if on_time_mumps_vaccinations == 2:
-            probability, templates = two_dose_immunity(birth_year), ['has_immunisations',
-                                                                     'waning_warning',
-                                                                     ]
-        if on_time_mumps_vaccinations > 2:
-            probability, templates = two_dose_immunity(birth_year), ['has_immunisations',
-                                                                     'waning_warning',
-                                                                     'greater_than_two_shots_before_age_six_message',
-                                                                     ]
-    return {'probability_of_mumps_immunity': probability, 'content_templates': templates}
+    Takes arrays of birth years, number of shots before age 6 and previous
+    illness, and provides an array of estimated probabilities of being
+    immune to mumps if exposed, with the same semantics as immunity().
+
+    Content templates are returned as an array of integer codes, the
+    templates for each code being content_templates_by_code[code].
+
+    With deduplicate=True each unique combination of inputs is evaluated
+    once, and the results scattered back to every row, which is faster for
+    rosters with many people sharing the same inputs.
+
+    on_time_mumps_vaccinations and mumps_illness not required - None is
+        treated as no shots/no previous illness. Scalars are broadcast.
+
+    as_of_years not required - None evaluates immunity as of the current
+        year. Broadcast against birth_years, eg birth_years[:, np.newaxis]
+        with a 1-D as_of_years gives a (birth year x as of year) grid in one
+        call, for projections.
+
+    ValueError will be deliberately raised if any row has improper data.
+
+    :param birth_years: array_like of int
+    :param on_time_mumps_vaccinations: array_like of int or None
+    :param mumps_illness: array_like of bool or None
+    :param as_of_years: array_like of int or None, years to evaluate immunity as of.
+    :param deduplicate: bool, evaluate each unique combination of inputs once.
+    :raises: ValueError On improper valued data.
+    :return: Dict {'probability_of_mumps_immunity': np.ndarray(float),
+                   'content_template_codes': np.ndarray(np.uint8)}
+    """
+    if deduplicate:
+        return evaluate_unique(immunity_batch, birth_years, on_time_mumps_vaccinations, mumps_illness, as_of_years)
+
+    as_of_years = validate_as_of_years(as_of_years)
+    birth_years = validate_birth_years(birth_years, as_of_years)
+    mumps_illness = illness_flags(mumps_illness, birth_years.shape)
+    pre_1957 = ~mumps_illness & (birth_years < 1957)
+    vaccinations = validate_vaccinations(on_time_mumps_vaccinations,
+                                         applicable=~(mumps_illness | pre_1957),
+                                         message='Mumps vaccinations must be a positive integer.')
+
+    ages = (current_year if as_of_years is None else as_of_years) - birth_years
+    probability = np.select(
+        [mumps_illness | pre_1957,
+         vaccinations == 1,
+         vaccinations >= 2,
+         ],
+        [conferred_immunity,
+         _one_dose_immunity_by_age[ages],
+         _two_dose_immunity_by_age[ages],
+         ],
+        default=natural_immunity)
+    template_codes = np.select(
+        [mumps_illness,
+         pre_1957,
+         vaccinations > 2,
+         vaccinations > 0,
+         ],
+        [previous_illness_code,
+         pre_1957_code,
+         greater_than_two_shots_code,
+         has_immunisations_code,
+         ],
+        default=no_immunisations_code).astype(np.uint8)
+
+    return {'probability_of_mumps_immunity': probability, 'content_template_codes': template_codes}
 
 # need case where shots after age 6
@@ -0,0 +1,235 @@
+"""
+Compact binary person record format.
+
+Fixed width 8 byte records holding the immunity() arguments for each
+illness, so rosters can be converted from CSV once, then read zero copy via
+numpy.memmap and scored with the illness immunity_batch() functions on
+every subsequent run, without re-parsing text:
+
+    python -m illnesses.records roster.csv roster.pirec
+    python -m illnesses.score roster.pirec -o scored.csv
+
+File layout:
+    header: file_header, 8 bytes
+    records: person_record_dtype, 8 bytes each, little endian
+
+Vaccination counts above max_vaccinations are stored as max_vaccinations,
+which has the same meaning to every immunity function. The vaccinations
+field holds a marker for an illness' data that cannot be stored:
+invalid_vaccinations for vaccinations that aren't a positive integer, scored
+as immunity() scores them, ie 'Unknown' only where vaccinations are used, and
+invalid_illness for an unrecognised illness value, scored 'Unknown'. Other
+illnesses are scored as usual.
+
+Only immunity() arguments are stored, not other columns such as ids.
+Records are kept in CSV row order, rows without a valid birth year being
+stored as invalid_record, which every illness scores 'Unknown', so the nth
+record is always the nth CSV row. illnesses.score adds each record's index as
+a 'record' field, to join scores back to the roster.
+"""
+import argparse
+import csv
+import sys
+
+from pathlib import Path
+from typing import (Any,
+                    Callable,
+                    Dict,
+                    List,
+                    Optional,
+                    Union,
+                    )
+
+import numpy as np
+
+from .registry import illness_registry
+
+file_header = b'PIREC\x00\x00\x02'  # Magic, version 2.
+
+# Vaccinations field markers for illness data that cannot be stored.
+invalid_vaccinations = np.iinfo(np.uint8).max
+invalid_illness = invalid_vaccinations - 1
+max_vaccinations = invalid_illness - 1
+
+true_strings = ('true', 't', 'yes', 'y', '1')
+false_strings = ('false', 'f', 'no', 'n', '0', '')
+
+
+def parse_number(value: Any) -> Any:
+    """
+    Convert a CSV string to an int (or float where not integral), leaving
+    other values unchanged. Empty strings become None.
+
+    Unparseable strings are returned as is, to be rejected by immunity().
+
+    :param value: str or value from JSON
+    :return: int, float, None or original value
+    """
+    if not isinstance(value, str):
+        return value
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def parse_bool(value: Any) -> bool:
+    """
+    Convert a CSV string such as 'True', 'yes' or '0' to a bool, leaving
+    other values to their truthiness.
+
+    :param value: str or value from JSON
+    :raises ValueError: On unrecognised string.
+    :return: bool
+    """
+    if not isinstance(value, str):
+        return bool(value)
+    if value.strip().lower() in true_strings:
+        return True
+    if value.strip().lower() in false_strings:
+        return False
+    raise ValueError(f'Unrecognised illness value {value!r}.')
+
+
+person_record_dtype = np.dtype([
+    ('birth_year', '<u2'),
+    *[(illness.vaccinations, 'u1') for illness in illness_registry.values()],
+    *[(illness.illness, '?') for illness in illness_registry.values()],
+])
+
+
+# Stored for rows without a valid birth year, birth year 0 being rejected by every illness.
+invalid_record = (0, *[0] * len(illness_registry), *[False] * len(illness_registry))
+
+
+def csv_row_to_record(row: Dict[str, Any], errors: Optional[List[ValueError]] = None) -> tuple:
+    """
+    Convert a CSV person record to a person_record_dtype tuple.
+
+    An illness' improper vaccinations or illness value is stored as
+    invalid_vaccinations or invalid_illness, see module docstring, rather
+    than failing the row.
+
+    :param row: dict, CSV row using immunity() argument names as columns.
+    :param errors: list, appended with a ValueError for each illness stored
+        as invalid, default None.
+    :raises ValueError: Where birth year is not an integer that fits the
+        record format.
+    :return: tuple
+    """
+    birth_year = parse_number(row.get('birth_year'))
+    if not isinstance(birth_year, int) or not 0 <= birth_year <= np.iinfo(np.uint16).max:
+        raise ValueError(f'Birth year {row.get("birth_year")!r} is not a 4 digit integer.')
+    vaccination_values: List[int] = []
+    illness_values: List[bool] = []
+    for illness in illness_registry.values():
+        vaccinations = parse_number(row.get(illness.vaccinations)) or 0
+        if isinstance(vaccinations, float) and vaccinations.is_integer():
+            vaccinations = int(vaccinations)
+        try:
+            illness_values.append(parse_bool(row.get(illness.illness)))
+        except ValueError as error:
+            illness_values.append(False)
+            vaccination_values.append(invalid_illness)
+            if errors is not None:
+                errors.append(error)
+            continue
+        if not isinstance(vaccinations, int) or vaccinations < 0:
+            vaccination_values.append(invalid_vaccinations)
+            if errors is not None:
+                errors.append(ValueError(f'{illness.vaccinations} {row.get(illness.vaccinations)!r} '
+                                         f'must be a positive integer.'))
+            continue
+        vaccination_values.append(min(vaccinations, max_vaccinations))
+    return (birth_year, *vaccination_values, *illness_values)
+
+
+def convert_csv(csv_path: Union[str, Path],
+                record_path: Union[str, Path],
+                chunk_size: int = 100_000,
+                on_invalid: Optional[Callable[[int, ValueError], None]] = None,
+                ) -> int:
+    """
+    Convert a CSV roster to the binary person record format, streaming in
+    chunks so memory use does not grow with the roster.
+
+    Rows without a valid birth year are stored as invalid_record, and an
+    illness' improper data as invalid_vaccinations or invalid_illness,
+    keeping records in row order, rather than failing the conversion.
+
+    :param csv_path: str or Path
+    :param record_path: str or Path
+    :param chunk_size: int, number of records converted at a time.
+    :param on_invalid: callable taking the line number and error of each
+        row or illness stored as invalid, default None.
+    :return: int, number of records written.
+    """
+    written = 0
+    with open(csv_path, newline='', encoding='utf-8') as csv_file, open(record_path, 'wb') as record_file:
+        record_file.write(file_header)
+        chunk: List[tuple] = []
+        reader = csv.DictReader(csv_file)
+        for row in reader:
+            errors: List[ValueError] = []
+            try:
+                chunk.append(csv_row_to_record(row, errors))
+            except ValueError as error:
+                chunk.append(invalid_record)
+                errors.append(error)
+            if on_invalid is not None:
+                for row_error in errors:
+                    on_invalid(reader.line_num, row_error)
+            if len(chunk) == chunk_size:
+                np.array(chunk, dtype=person_record_dtype).tofile(record_file)
+                written, chunk = written + len(chunk), []
+        np.array(chunk, dtype=person_record_dtype).tofile(record_file)
+        written += len(chunk)
+    return written
+
+
+def read_person_records(record_path: Union[str, Path]) -> np.ndarray:
+    """
+    Memory map a binary person record file, read only.
+
+    :param record_path: str or Path
+    :raises ValueError: Where file is not a person record file of this version.
+    :return: np.memmap of person_record_dtype (np.ndarray for an empty file)
+    """
+    with open(record_path, 'rb') as record_file:
+        if record_file.read(len(file_header)) != file_header:
+            raise ValueError(f'{record_path} is not a version {file_header[-1]} person record file.')
+    if Path(record_path).stat().st_size == len(file_header):
+        return np.zeros(0, dtype=person_record_dtype)  # mmap cannot map an empty region.
+    return np.memmap(record_path, dtype=person_record_dtype, mode='r', offset=len(file_header))
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='python -m illnesses.records',
+                                     description='Convert a CSV roster to binary person records.')
+    parser.add_argument('csv_path', help='CSV file of person records.')
+    parser.add_argument('record_path', help='Binary person record file to write.')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    invalid = set()
+
+    def report_invalid(line: int, error: ValueError) -> None:
+        invalid.add(line)
+        print(f'{args.csv_path}: Line {line}: {error} Stored as invalid.', file=sys.stderr)
+
+    written = convert_csv(args.csv_path, args.record_path, on_invalid=report_invalid)
+    print(f'Wrote {written} records ({len(invalid)} with invalid data) to {args.record_path}.', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,39 @@
+"""
+Registry of illness modules and the names of their immunity() arguments.
+
+Allows tools outside the web app (eg the roster scorer) to evaluate every
+illness from a flat person record such as:
+    {'birth_year': 1985,
+     'on_time_measles_vaccinations': 2, 'measles_illness': False,
+     'on_time_mumps_vaccinations': 2, 'mumps_illness': False,
+     'rubella_vaccinations': 1, 'rubella_illness': False}
+
+"""
+from types import ModuleType
+from typing import (Dict,
+                    NamedTuple,
+                    )
+
+from . import (measles,
+               mumps,
+               rubella,
+               )
+
+
+class IllnessEntry(NamedTuple):
+    """
+    Illness module, and the names of its vaccinations and previous illness
+    arguments to immunity()/immunity_batch().
+    """
+    name: str
+    module: ModuleType
+    vaccinations: str
+    illness: str
+
+
+illness_registry: Dict[str, IllnessEntry] = {
+    entry.name: entry for entry in (
+        IllnessEntry('measles', measles, 'on_time_measles_vaccinations', 'measles_illness'),
+        IllnessEntry('mumps', mumps, 'on_time_mumps_vaccinations', 'mumps_illness'),
+        IllnessEntry('rubella', rubella, 'rubella_vaccinations', 'rubella_illness'),
+    )}
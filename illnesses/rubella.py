@@ -1,6 +1,19 @@
-from typing import Optional, Dict, Union, List
+from typing import Optional, Dict, Union, List, Tuple
 
-from .common_helpers import validate_birth_year
+import numpy as np
+import numpy.typing as npt
+
+from .clock import clock
+from .common_helpers import (compile_decision_table,
+                             decision_index,
+                             evaluate_unique,
+                             illness_flags,
+                             validate_as_of_year,
+                             validate_as_of_years,
+                             validate_birth_year,
+                             validate_birth_years,
+                             validate_vaccinations,
+                             )
 
 """
 https://www.cdc.gov/rubella/vaccination.html
@@ -64,10 +77,103 @@ natural_immunity = 0.10
 unvaccinated_immunity = natural_immunity
 vaccinated_immunity = 0.97
 
+# Content templates returned by immunity(), indexed by immunity_batch() template code.
+content_templates_by_code: Tuple[Tuple[str, ...], ...] = (
+    ('no_immunisations',),
+    ('previous_illness',),
+    ('pre_1957_message',),
+    ('has_immunisations',),
+)
+(no_immunisations_code,
+ previous_illness_code,
+ pre_1957_code,
+ has_immunisations_code) = range(len(content_templates_by_code))
+
+
+def post_1957_immunity(birth_year: int,
+                       rubella_vaccinations: Optional[int] = None) -> Tuple[float, List[str]]:
+    """
+    Takes year of birth and number of shots, and provides an estimated
+    probability of being immune to rubella if exposed, and content
+    templates, for a person born 1957 or later with no previous illness.
+
+    birth_year must already be validated, see immunity().
+
+    :param birth_year: int
+    :param rubella_vaccinations: int or None
+    :raises: ValueError On improper valued rubella_vaccinations.
+    :return: Tuple (float, List[str])
+    """
+    # Set defaults:
+    probability, templates = unvaccinated_immunity, ['no_immunisations']
+
+    if rubella_vaccinations:
+        if not (int(rubella_vaccinations) > 0  # Must be > 0
+                # Must be integer.
+                and (isinstance(rubella_vaccinations, int)
+                     # Or float equiv to int eg 2.0 = 2
+                     or int(rubella_vaccinations) == rubella_vaccinations)):
+            raise ValueError('rubella vaccinations must be a positive integer.')  # Or zero.
+
+        # No increased likelihood of immunity for subsequent immunisations.
+        probability, templates = vaccinated_immunity, ['has_immunisations']
+
+    return probability, templates
+
+
+def evaluate_immunity(birth_year: int,
+                      rubella_vaccinations: Optional[int] = None,
+                      rubella_illness: bool = False,
+                      as_of_year: Optional[int] = None) -> Tuple[float, List[str]]:
+    """
+    Decision logic of immunity(), returning the probability and content
+    templates as a tuple. Used to compile decision_table, and by immunity()
+    for inputs the table does not cover.
+
+    :param birth_year: int
+    :param rubella_vaccinations: int or None
+    :param rubella_illness: bool
+    :param as_of_year: int or None, year to evaluate immunity as of, default current year.
+    :raises: ValueError On improper valued data.
+    :return: Tuple (float, List[str])
+    """
+    if as_of_year is not None:
+        validate_as_of_year(as_of_year)
+    # Enforce integer 4 digit birth year up to current year, or as of year.
+    validate_birth_year(birth_year, as_of_year)
+
+    if rubella_illness:
+        probability, templates = conferred_immunity, ['previous_illness']
+
+    elif birth_year < 1957:
+        probability, templates = conferred_immunity, ['pre_1957_message']
+
+    else:
+        probability, templates = post_1957_immunity(birth_year, rubella_vaccinations)
+
+    return probability, templates
+
+
+# Every valid input's result, indexed by decision_index(), see compile_decision_table().
+decision_table = compile_decision_table(evaluate_immunity)
+
+
+@clock.on_rollover
+def rebuild_year_tables(year: int) -> None:
+    """
+    Rebuild decision_table on the clock rolling over to a new year.
+
+    :param year: int, the new year.
+    :return: None
+    """
+    global decision_table
+    decision_table = compile_decision_table(evaluate_immunity)
+
 
 def immunity(birth_year: int,
              rubella_vaccinations: Optional[int] = None,
-             rubella_illness: bool = False) -> Dict[str, Union[float, List[str]]]:
+             rubella_illness: bool = False,
+             as_of_year: Optional[int] = None) -> Dict[str, Union[float, List[str]]]:
     """
     Takes year of birth, number of shots before age 6, and provides an
     estimated probability of being immune to rubella if exposed.
@@ -79,6 +185,10 @@ def immunity(birth_year: int,
     rubella_vaccinations not required -  not supplied or falsey value
         such as None, False, ''
 
+    as_of_year not required - None evaluates immunity as of the current year,
+        otherwise as of the given year, eg for projections, birth_year being
+        valid up to as_of_year.
+
     ValueError will be deliberately raised on improper data.
 
 
@@ -100,30 +210,83 @@ def immunity(birth_year: int,
     :param birth_year: int
     :param rubella_vaccinations: int or None
     :param rubella_illness: bool
+    :param as_of_year: int or None, year to evaluate immunity as of, default current year.
     :raises: ValueError On improper valued data.
     :return: Dict {'probability_of_rubella_immunity': float, 'content_templates': List(str)}
     """
-    # Set defaults:
-    probability, templates = unvaccinated_immunity, ['no_immunisations']
+    index = decision_index(birth_year, rubella_vaccinations, rubella_illness) if as_of_year is None else None
+    if index is None or index >= len(decision_table):
+        # Inputs needing validation, outside the decision table eg mid rollover, or as of another year.
+        probability, templates = evaluate_immunity(birth_year, rubella_vaccinations, rubella_illness, as_of_year)
+    else:
+        probability, templates = decision_table[index][0], list(decision_table[index][1])
 
-    # Enforce integer 4 digit birth year up to current year.
-    validate_birth_year(birth_year)
+    return {'probability_of_rubella_immunity': probability, 'content_templates': templates}
 
-    if rubella_illness:
-        probability, templates = conferred_immunity, ['previous_illness']
 
-    elif birth_year < 1957:
-        probability, templates = conferred_immunity, ['pre_1957_message']
+def immunity_batch(birth_years: npt.ArrayLike,
+                   rubella_vaccinations: Optional[npt.ArrayLike] = None,
+                   rubella_illness: Optional[npt.ArrayLike] = None,
+                   as_of_years: Optional[npt.ArrayLike] = None,
+                   deduplicate: bool = False,
+                   ) -> Dict[str, np.ndarray]:
+    """
+    Vectorised immunity() for arrays of people, eg a school roster.
 
-    elif rubella_vaccinations:
-        if not (int(rubella_vaccinations) > 0  # Must be > 0
-                # Must be integer.
-                and (isinstance(rubella_vaccinations, int)
-                     # Or float equiv to int eg 2.0 = 2
-                     or int(rubella_vaccinations) == rubella_vaccinations)):
-            raise ValueError('rubella vaccinations must be a positive integer.')  # Or zero.
+    Takes arrays of birth years, number of shots and previous illness, and
+    provides an array of estimated probabilities of being immune to rubella
+    if exposed, with the same semantics as immunity().
 
-        # No increased likelihood of immunity for subsequent immunisations.
-        probability, templates = vaccinated_immunity, ['has_immunisations']
+    Content templates are returned as an array of integer codes, the
+    templates for each code being content_templates_by_code[code].
 
-    return {'probability_of_rubella_immunity': probability, 'content_templates': templates}
+    With deduplicate=True each unique combination of inputs is evaluated
+    once, and the results scattered back to every row, which is faster for
+    rosters with many people sharing the same inputs.
+
+    rubella_vaccinations and rubella_illness not required - None is treated
+        as no shots/no previous illness. Scalars are broadcast.
+
+    as_of_years not required - None evaluates immunity as of the current
+        year. Broadcast against birth_years, eg birth_years[:, np.newaxis]
+        with a 1-D as_of_years gives a (birth year x as of year) grid in one
+        call, for projections.
+
+    ValueError will be deliberately raised if any row has improper data.
+
+    :param birth_years: array_like of int
+    :param rubella_vaccinations: array_like of int or None
+    :param rubella_illness: array_like of bool or None
+    :param as_of_years: array_like of int or None, years to evaluate immunity as of.
+    :param deduplicate: bool, evaluate each unique combination of inputs once.
+    :raises: ValueError On improper valued data.
+    :return: Dict {'probability_of_rubella_immunity': np.ndarray(float),
+                   'content_template_codes': np.ndarray(np.uint8)}
+    """
+    if deduplicate:
+        return evaluate_unique(immunity_batch, birth_years, rubella_vaccinations, rubella_illness, as_of_years)
+
+    as_of_years = validate_as_of_years(as_of_years)
+    birth_years = validate_birth_years(birth_years, as_of_years)
+    rubella_illness = illness_flags(rubella_illness, birth_years.shape)
+    pre_1957 = ~rubella_illness & (birth_years < 1957)
+    vaccinations = validate_vaccinations(rubella_vaccinations,
+                                         applicable=~(rubella_illness | pre_1957),
+                                         message='rubella vaccinations must be a positive integer.')
+    vaccinated = vaccinations > 0
+
+    probability = np.where(rubella_illness | pre_1957,
+                           conferred_immunity,
+                           np.where(vaccinated, vaccinated_immunity, unvaccinated_immunity))
+    template_codes = np.select(
+        [rubella_illness,
+         pre_1957,
+         vaccinated,
+         ],
+        [previous_illness_code,
+         pre_1957_code,
+         has_immunisations_code,
+         ],
+        default=no_immunisations_code).astype(np.uint8)
+
+    return {'probability_of_rubella_immunity': probability, 'content_template_codes': template_codes}
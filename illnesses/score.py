@@ -0,0 +1,403 @@
+"""
+Roster scorer - command line entry point scoring person records.
+
+Streams person records from CSV or JSON Lines, evaluates immunity for each
+configured illness, and writes each scored record as soon as it is read, so
+arbitrarily large registry extracts can be piped through in constant memory:
+
+    python -m illnesses.score roster.csv -o scored.csv
+    cat roster.jsonl | python -m illnesses.score --input-format jsonl > scored.jsonl
+
+Records use the immunity() argument names as fields/columns, eg:
+    birth_year,on_time_measles_vaccinations,measles_illness,...
+
+Any other fields are passed through to the output unchanged. Each illness
+adds f'probability_of_{illness}_immunity' and f'{illness}_content_templates'
+fields. As in the web app, a record whose data is rejected by an illness'
+immunity() is scored 'Unknown' with the 'immunity_results_error_message'
+template, rather than stopping the run. JSON Lines that aren't a JSON
+object are reported, and scored 'Unknown' as an empty record.
+
+Binary person record files (see illnesses.records) are scored in chunks
+with the illness immunity_batch() functions:
+
+    python -m illnesses.score roster.pirec -o scored.csv
+
+With --workers N text records are scored in chunks across N processes, output
+remaining in input order:
+
+    python -m illnesses.score registry_extract.csv -o scored.csv --workers 32
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+
+from collections import deque
+from contextlib import ExitStack
+from concurrent.futures import (Future,
+                                ProcessPoolExecutor,
+                                )
+from itertools import islice
+from typing import (Any,
+                    Callable,
+                    Deque,
+                    Dict,
+                    Iterable,
+                    Iterator,
+                    List,
+                    Optional,
+                    Sequence,
+                    TextIO,
+                    Tuple,
+                    )
+
+import numpy as np
+
+from .records import (invalid_illness,
+                      invalid_vaccinations,
+                      parse_bool,
+                      parse_number,
+                      read_person_records,
+                      )
+from .registry import (IllnessEntry,
+                       illness_registry,
+                       )
+
+formats = ('csv', 'jsonl')
+input_formats = (*formats, 'records')
+
+
+def illness_result(illness: IllnessEntry,
+                   birth_year: Any,
+                   vaccinations: Any,
+                   had_illness: Any,
+                   ) -> Tuple[Any, List[str]]:
+    """
+    Evaluate immunity to an illness, 'Unknown' with the
+    'immunity_results_error_message' template where immunity() rejects the data.
+
+    :param illness: IllnessEntry
+    :param birth_year: int, or value to be rejected.
+    :param vaccinations: int, None, or str to be parsed.
+    :param had_illness: bool, None, or str to be parsed.
+    :return: Tuple (probability or 'Unknown', content templates)
+    """
+    try:
+        result = illness.module.immunity(birth_year, parse_number(vaccinations), parse_bool(had_illness))
+    except (ValueError, TypeError, OverflowError):  # OverflowError on JSON Infinity.
+        return 'Unknown', ['immunity_results_error_message']
+    return result[f'probability_of_{illness.name}_immunity'], result['content_templates']
+
+
+def score_record(record: Dict[str, Any], illnesses: Iterable[IllnessEntry]) -> Dict[str, Any]:
+    """
+    Evaluate immunity to each illness for a person record.
+
+    :param record: dict of immunity() arguments, eg read from CSV/JSONL.
+    :param illnesses: IllnessEntry for each illness to evaluate.
+    :return: dict, record with results for each illness added.
+    """
+    scored = dict(record)
+    birth_year = parse_number(record.get('birth_year'))
+    for illness in illnesses:
+        (scored[f'probability_of_{illness.name}_immunity'],
+         scored[f'{illness.name}_content_templates']) = illness_result(illness,
+                                                                       birth_year,
+                                                                       record.get(illness.vaccinations),
+                                                                       record.get(illness.illness))
+    return scored
+
+
+def stored_illness_result(illness: IllnessEntry,
+                          birth_year: int,
+                          vaccinations: int,
+                          had_illness: bool,
+                          ) -> Tuple[Any, List[str]]:
+    """
+    illness_result() for a binary person record's illness data, including
+    invalid data markers, see illnesses.records.
+
+    :param illness: IllnessEntry
+    :param birth_year: int
+    :param vaccinations: int, count or marker.
+    :param had_illness: bool
+    :return: Tuple (probability or 'Unknown', content templates)
+    """
+    if vaccinations == invalid_illness:
+        return 'Unknown', ['immunity_results_error_message']
+    # Improper vaccinations, rejected by immunity() only where they're used.
+    return illness_result(illness, birth_year, -1 if vaccinations == invalid_vaccinations else vaccinations,
+                          had_illness)
+
+
+def score_person_records(records: np.ndarray,
+                         illnesses: Sequence[IllnessEntry],
+                         chunk_size: int = 100_000,
+                         ) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily score binary person records (see illnesses.records), evaluating
+    each chunk with the illness immunity_batch() functions.
+
+    Where an immunity_batch() function rejects a record in a chunk, that
+    illness is scored record by record for the chunk instead, so only
+    rejected records are scored 'Unknown'. Records holding an invalid data
+    marker for an illness are also scored record by record for it.
+
+    Each row has a 'record' field, the record's index in records, ie its
+    row in the converted CSV roster, for joining scores back to the roster.
+    Invalid data markers are output as None.
+
+    :param records: np.ndarray of person_record_dtype, eg np.memmap
+    :param illnesses: IllnessEntry for each illness to evaluate.
+    :param chunk_size: int, number of records scored at a time.
+    :return: iterator of dict
+    """
+    fields = records.dtype.names or ()
+    for start in range(0, len(records), chunk_size):
+        chunk = records[start:start + chunk_size]
+        rows = [{'record': index, **dict(zip(fields, values))}
+                for index, values in enumerate(chunk.tolist(), start)]
+        for illness in illnesses:
+            probability_field = f'probability_of_{illness.name}_immunity'
+            vaccinations = chunk[illness.vaccinations]
+            marked = vaccinations >= invalid_illness
+            try:
+                result = illness.module.immunity_batch(chunk['birth_year'],
+                                                       np.where(marked, 0, vaccinations),
+                                                       chunk[illness.illness],
+                                                       deduplicate=True)
+            except ValueError:
+                marked = np.ones(len(chunk), dtype=bool)
+            else:
+                content_templates_by_code = illness.module.content_templates_by_code
+                for row, probability, code in zip(rows,
+                                                  result[probability_field].tolist(),
+                                                  result['content_template_codes'].tolist()):
+                    row[probability_field] = probability
+                    row[f'{illness.name}_content_templates'] = list(content_templates_by_code[code])
+            for index in np.flatnonzero(marked).tolist():
+                row = rows[index]
+                row[probability_field], row[f'{illness.name}_content_templates'] = stored_illness_result(
+                    illness, row['birth_year'], row[illness.vaccinations], row[illness.illness])
+            for row in rows:
+                if row[illness.vaccinations] >= invalid_illness:
+                    row[illness.vaccinations] = None
+        yield from rows
+
+
+def read_records(stream: TextIO,
+                 input_format: str,
+                 on_invalid: Optional[Callable[[int, ValueError], None]] = None,
+                 ) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily read person records from a CSV or JSON Lines stream.
+
+    JSON Lines that aren't a JSON object are read as an empty record, so
+    are scored 'Unknown' in input order, rather than stopping the run.
+
+    :param stream: text stream
+    :param input_format: 'csv' or 'jsonl'
+    :param on_invalid: callable taking the line number and error of each
+        JSON line read as an empty record, default None.
+    :return: iterator of dict
+    """
+    if input_format == 'csv':
+        yield from csv.DictReader(stream)
+    else:
+        for line_number, line in enumerate(stream, 1):
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                    if not isinstance(record, dict):
+                        raise ValueError('Record is not a JSON object.')
+                except (ValueError, RecursionError) as error:  # RecursionError on deeply nested arrays/objects.
+                    if on_invalid is not None:
+                        on_invalid(line_number, ValueError(str(error)))
+                    record = {}
+                yield record
+
+
+def write_records(records: Iterable[Dict[str, Any]],
+                  stream: TextIO,
+                  output_format: str,
+                  fieldnames: Optional[List[str]] = None,
+                  header: bool = True,
+                  ) -> int:
+    """
+    Write scored records to a CSV or JSON Lines stream as they are produced.
+
+    For CSV, fieldnames are taken from the first record unless supplied, and
+    content template lists are joined with '|'.
+
+    :param records: iterable of dict
+    :param stream: text stream
+    :param output_format: 'csv' or 'jsonl'
+    :param fieldnames: list of str, CSV columns.
+    :param header: bool, write CSV header before the first record.
+    :return: int, number of records written.
+    """
+    written = 0
+    writer = None
+    for record in records:
+        if output_format == 'csv':
+            if writer is None:
+                writer = csv.DictWriter(stream, fieldnames=fieldnames or list(record), extrasaction='ignore')
+                if header:
+                    writer.writeheader()
+            writer.writerow({field: '|'.join(value) if isinstance(value, list) else value
+                             for field, value in record.items()})
+        else:
+            stream.write(json.dumps(record) + '\n')
+        written += 1
+    return written
+
+
+def score_chunk(records: List[Dict[str, Any]],
+                illness_names: Sequence[str],
+                output_format: str,
+                fieldnames: Optional[List[str]],
+                ) -> str:
+    """
+    Score a chunk of person records in a worker process, returning them
+    formatted for output, so that formatting is also spread across workers.
+
+    Illnesses are passed by name, as registry entries hold unpicklable modules.
+
+    :param records: list of dict
+    :param illness_names: names of illnesses to evaluate.
+    :param output_format: 'csv' or 'jsonl'
+    :param fieldnames: list of str, CSV columns.
+    :return: str, scored records in order, without CSV header.
+    """
+    illnesses = [illness_registry[name] for name in illness_names]
+    output = io.StringIO(newline='')
+    write_records((score_record(record, illnesses) for record in records),
+                  output, output_format, fieldnames, header=False)
+    return output.getvalue()
+
+
+def score_to_stream(records: Iterable[Dict[str, Any]],
+                    stream: TextIO,
+                    output_format: str,
+                    illnesses: Sequence[IllnessEntry],
+                    workers: int = 1,
+                    chunk_size: int = 1000,
+                    ) -> None:
+    """
+    Score person records, writing them to stream in input order, across a
+    pool of worker processes where workers > 1.
+
+    Records are read and submitted in chunks, with at most two chunks per
+    worker in flight, so memory use is bounded regardless of input size.
+
+    :param records: iterable of dict
+    :param stream: text stream
+    :param output_format: 'csv' or 'jsonl'
+    :param illnesses: IllnessEntry for each illness to evaluate.
+    :param workers: int, number of worker processes.
+    :param chunk_size: int, number of records scored per task.
+    :raises ValueError: If workers or chunk_size is less than 1.
+    :return: None
+    """
+    if workers < 1 or chunk_size < 1:
+        raise ValueError(f'workers and chunk_size must be at least 1, not {workers} and {chunk_size}.')
+    records = iter(records)
+    if workers == 1:
+        write_records((score_record(record, illnesses) for record in records), stream, output_format)
+        return
+
+    # Score first record here to fix CSV columns for all workers.
+    first_record = next(records, None)
+    if first_record is None:
+        return
+    first_scored = score_record(first_record, illnesses)
+    fieldnames = list(first_scored) if output_format == 'csv' else None
+    write_records([first_scored], stream, output_format, fieldnames)
+
+    illness_names = [illness.name for illness in illnesses]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: Deque[Future] = deque()
+        while True:
+            while len(pending) < 2 * workers:
+                chunk = list(islice(records, chunk_size))
+                if not chunk:
+                    break
+                pending.append(executor.submit(score_chunk, chunk, illness_names, output_format, fieldnames))
+            if not pending:
+                return
+            stream.write(pending.popleft().result())
+
+
+def infer_format(path: str, default: str = 'csv') -> str:
+    """
+    :param path: str, file path, '-' for stdin/stdout.
+    :param default: str, format for stdin/stdout or unrecognised extensions.
+    :return: 'csv', 'jsonl' or 'records'
+    """
+    if path.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if path.endswith('.csv'):
+        return 'csv'
+    if path.endswith('.pirec'):
+        return 'records'
+    return default
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='python -m illnesses.score',
+                                     description='Score person records for probable immunity.')
+    parser.add_argument('input', nargs='?', default='-',
+                        help='CSV, JSON Lines or binary person record file, default stdin.')
+    parser.add_argument('-o', '--output', default='-',
+                        help='File to write scored records to, default stdout.')
+    parser.add_argument('--input-format', choices=input_formats,
+                        help='Input format, inferred from file extension, default csv.')
+    parser.add_argument('--output-format', choices=formats,
+                        help='Output format, inferred from file extension, default input format.')
+    parser.add_argument('--illness', action='append', choices=list(illness_registry), dest='illnesses',
+                        help='Illness to score, may be repeated, default all illnesses.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of worker processes for CSV/JSON Lines input, default 1 (no process pool).')
+    parser.add_argument('--chunk-size', type=int, default=1000,
+                        help='Records per worker task, default 1000.')
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+    if args.chunk_size < 1:
+        parser.error('--chunk-size must be at least 1')
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    input_format = args.input_format or infer_format(args.input)
+    output_format = args.output_format or infer_format(args.output,
+                                                       default='csv' if input_format == 'records' else input_format)
+    illnesses = [illness_registry[name] for name in (args.illnesses or illness_registry)]
+
+    with ExitStack() as stack:
+        output_stream = (sys.stdout if args.output == '-'
+                         else stack.enter_context(open(args.output, 'w', newline='', encoding='utf-8')))
+        if input_format == 'records':
+            write_records(score_person_records(read_person_records(args.input), illnesses),
+                          output_stream, output_format)
+        else:
+            input_stream = (sys.stdin if args.input == '-'
+                            else stack.enter_context(open(args.input, newline='', encoding='utf-8')))
+
+            def report_invalid(line: int, error: ValueError) -> None:
+                print(f'{args.input}: Line {line}: {error} Scored Unknown.', file=sys.stderr)
+
+            score_to_stream(read_records(input_stream, input_format, on_invalid=report_invalid),
+                            output_stream,
+                            output_format,
+                            illnesses,
+                            workers=args.workers,
+                            chunk_size=args.chunk_size)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Illness immunity functions as SQLite user-defined functions.
+
+Registers, for each illness in the registry, scalar functions returning the
+probability of immunity, and the content templates as a JSON array:
+
+    measles_immunity(birth_year, doses, illness)
+    measles_templates(birth_year, doses, illness)
+
+and the aggregate expected_immune(probability), the expected number of
+immune people in a group, ie the sum of their probabilities. Records held in
+SQLite are then scored and summarized by one query, eg:
+
+    import sqlite3
+    from illnesses.sqlite_functions import register_functions
+
+    connection = sqlite3.connect('registry.sqlite')
+    register_functions(connection)
+    connection.execute('SELECT birth_year / 10 * 10 AS decade, COUNT(*), '
+                       'expected_immune(mumps_immunity(birth_year, mumps_doses, had_mumps)) '
+                       'FROM people GROUP BY decade')
+
+Valid inputs are answered from the illness' decision table. As in the web
+app, inputs immunity() rejects are scored NULL rather than stopping the
+query, and NULL doses or illness are treated as none.
+"""
+import json
+import sqlite3
+
+from types import ModuleType
+from typing import (Any,
+                    Callable,
+                    Iterable,
+                    Optional,
+                    Tuple,
+                    )
+
+from illnesses.common_helpers import decision_index
+from illnesses.registry import illness_registry
+
+
+def illness_result(module: ModuleType, birth_year: Any, doses: Any, illness: Any) -> Optional[Tuple[float, Any]]:
+    """
+    :param module: Illness module, eg illnesses.mumps
+    :param birth_year: int
+    :param doses: int or None
+    :param illness: bool, int or None
+    :return: Tuple (probability, content templates), or None if inputs are invalid.
+    """
+    decision_table = module.decision_table  # Rebuilt at year rollover.
+    index = decision_index(birth_year, doses, illness)
+    if index is not None and index < len(decision_table):
+        return decision_table[index]
+    try:
+        return module.evaluate_immunity(birth_year, doses, bool(illness))
+    except (ValueError, TypeError):
+        return None
+
+
+def probability_function(module: ModuleType) -> Callable[..., Optional[float]]:
+    def probability(birth_year: Any, doses: Any = None, illness: Any = None) -> Optional[float]:
+        result = illness_result(module, birth_year, doses, illness)
+        return result[0] if result is not None else None
+    return probability
+
+
+def templates_function(module: ModuleType) -> Callable[..., Optional[str]]:
+    def templates(birth_year: Any, doses: Any = None, illness: Any = None) -> Optional[str]:
+        result = illness_result(module, birth_year, doses, illness)
+        return json.dumps(list(result[1])) if result is not None else None
+    return templates
+
+
+class ExpectedImmune(object):
+    """
+    SQLite aggregate summing probabilities of immunity, ie the expected
+    number of immune people, ignoring NULLs.
+    """
+
+    def __init__(self) -> None:
+        self.expected = 0.0
+
+    def step(self, probability: Optional[float]) -> None:
+        if probability is not None:
+            self.expected += probability
+
+    def finalize(self) -> float:
+        return self.expected
+
+
+def register_functions(connection: sqlite3.Connection, illnesses: Optional[Iterable[str]] = None) -> None:
+    """
+    Register illness immunity functions, and expected_immune(), with a
+    connection.
+
+    Functions aren't registered as deterministic, as results change at year
+    rollover, so should not be used in indexes or generated columns.
+
+    :param connection: sqlite3.Connection
+    :param illnesses: names of illnesses to register, default every illness in the registry.
+    :raises KeyError: On an illness not in the registry.
+    :return: None
+    """
+    for name in (illnesses if illnesses is not None else illness_registry):
+        module = illness_registry[name].module
+        for arguments in (1, 2, 3):  # doses and illness optional, as immunity().
+            connection.create_function(f'{name}_immunity', arguments, probability_function(module))
+            connection.create_function(f'{name}_templates', arguments, templates_function(module))
+    # typeshed types aggregate values as int only.
+    connection.create_aggregate('expected_immune', 1, ExpectedImmune)  # type: ignore[arg-type]
@@ -1,10 +1,23 @@
+import hashlib
 import os
 
 from pathlib import Path
 
-from flask import Flask
+import illnesses
 
+from flask import (Flask,
+                   Response,
+                   request,
+                   )
+
+from probable_immunity_web_app.cache import (LRUCache,
+                                             response_cache_from_config,
+                                             version_hash,
+                                             )
 from probable_immunity_web_app.config import ProductionConfig
+from probable_immunity_web_app.illness_config import Illnesses
+from probable_immunity_web_app.sessions import SQLiteSessionInterface
+from probable_immunity_web_app.submissions import SubmissionWriter
 
 about_text_string = (
     # Primarily for testing, hence binary string.
@@ -19,6 +32,7 @@ about_text_string = (
     b'<p>The project is also a learning testbed and demonstrator '
     b'for <a href="https://twitter.com/toonarmycaptain">toonarmycaptain</a>.</p>'
     b'</html>')
+about_text_etag = hashlib.sha256(about_text_string).hexdigest()
 
 
 def create_app(test_config=None):
@@ -42,11 +56,42 @@ def create_app(test_config=None):
     except OSError:
         pass
 
+    if app.config.get('SESSION_INTERFACE') == 'sqlite':
+        # Session data stored in DATABASE, the cookie carrying only its id.
+        app.session_interface = SQLiteSessionInterface(app.config['DATABASE'],
+                                                       app.config.get('SESSION_CACHE_SIZE', 1024),
+                                                       cache_ttl=app.config.get('SESSION_CACHE_TTL', 5.0))
+
+    # Build illness registry and data entry form class once, rather than per request.
+    app.extensions['illnesses'] = Illnesses(app.config.get('ILLNESS_LIST', []))
+    # Anonymized submissions written to DATABASE in the background, for reporting.
+    app.extensions['submission_writer'] = (
+        SubmissionWriter(app.config['DATABASE'],
+                         app.extensions['illnesses'],
+                         max_queue=app.config.get('SUBMISSIONS_MAX_QUEUE', 10_000),
+                         batch_size=app.config.get('SUBMISSIONS_BATCH_SIZE', 500),
+                         flush_interval=app.config.get('SUBMISSIONS_FLUSH_INTERVAL', 1.0),
+                         )
+        if app.config.get('RECORD_SUBMISSIONS') else None)
+    # Rendered illness results, see probable_immunity_app.render_illness_result().
+    app.extensions['result_fragment_cache'] = LRUCache(app.config.get('RESULT_FRAGMENT_CACHE_SIZE', 1024))
+    # Rendered results pages, keyed by inputs, see probable_immunity_app.immunity_results().
+    app.extensions['result_cache'] = response_cache_from_config(app.config)
+    # Version of illness models and templates results are rendered from, for cache keys and ETags.
+    app.extensions['content_version'] = version_hash(Path(illnesses.__file__).parent,
+                                                     Path(app.root_path, 'illnesses'),
+                                                     Path(app.root_path, 'templates'),
+                                                     )
+
     from . import probable_immunity_app
     app.register_blueprint(probable_immunity_app.immunity_app_bp)
 
     @app.route('/about_text/')
     def about_text():
-        return about_text_string
+        response = Response(about_text_string)
+        response.set_etag(about_text_etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = app.config.get('ABOUT_TEXT_MAX_AGE', 3600)
+        return response.make_conditional(request)
 
     return app
@@ -0,0 +1,148 @@
+"""
+Benchmark threaded serving throughput.
+
+Serves the app with serve.ThreadPoolWSGIServer at each thread count, and
+measures complete estimates per second, each being a data entry POST to
+/immunity/ followed by a GET of /immunity/results/, from as many concurrent
+clients as server threads:
+
+    python -m probable_immunity_web_app.benchmark --threads 1 2 4 8 16
+
+Throughput only scales with threads where requests can run in parallel,
+ie on a free-threaded CPython build (eg python3.13t) with multiple cores,
+or where requests wait on I/O. The build and GIL status are reported with
+the results.
+"""
+import argparse
+import http.client
+import logging
+import os
+import sys
+import sysconfig
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import (Dict,
+                    List,
+                    Optional,
+                    )
+from urllib.parse import urlencode
+
+from probable_immunity_web_app.app_factory import create_app
+from probable_immunity_web_app.config import ProductionConfig
+from probable_immunity_web_app.serve import make_server
+
+default_threads = [1, 2, 4, 8, 16]
+
+
+def gil_status() -> str:
+    """
+    Describe the interpreter build and whether the GIL is enabled.
+
+    :return: str
+    """
+    if not sysconfig.get_config_var('Py_GIL_DISABLED'):
+        return 'GIL build'
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', lambda: True)
+    return f'free-threaded build, GIL {"enabled" if is_gil_enabled() else "disabled"}'
+
+
+def estimate(host: str, port: int, birth_year: int) -> None:
+    """
+    Request an estimate as a browser would, submitting the data entry form,
+    then following the redirect to the results page with the session cookie.
+
+    :param host: str
+    :param port: int
+    :param birth_year: int
+    :raises RuntimeError: On an unexpected response.
+    :return: None
+    """
+    form_data = urlencode({'birth_year': birth_year,
+                           'measles-on_time_measles_vaccinations': 2,
+                           'mumps-on_time_mumps_vaccinations': 2,
+                           'rubella-rubella_vaccinations': 1,
+                           })
+    connection = http.client.HTTPConnection(host, port)
+    connection.request('POST', '/immunity/', form_data, {'Content-Type': 'application/x-www-form-urlencoded'})
+    response = connection.getresponse()
+    response.read()
+    connection.close()
+    cookie = response.getheader('Set-Cookie', '').split(';')[0]
+    if response.status != 302 or not cookie:
+        raise RuntimeError(f'Data entry returned {response.status}.')
+
+    connection = http.client.HTTPConnection(host, port)
+    connection.request('GET', '/immunity/results/', headers={'Cookie': cookie})
+    response = connection.getresponse()
+    response.read()
+    connection.close()
+    if response.status != 200:
+        raise RuntimeError(f'Results returned {response.status}.')
+
+
+def benchmark_threads(threads: int, estimates: int) -> float:
+    """
+    Serve the app on threads worker threads, and time estimates requested by
+    as many concurrent clients.
+
+    :param threads: int, server worker threads and concurrent clients.
+    :param estimates: int, number of estimates to request.
+    :return: float, estimates per second.
+    """
+    app = create_app({'SECRET_KEY': os.urandom(32),
+                      'WTF_CSRF_ENABLED': False,
+                      'ILLNESS_LIST': ProductionConfig.ILLNESS_LIST,
+                      })
+    server = make_server('127.0.0.1', 0, threads, app)
+    server_thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05})
+    server_thread.start()
+    try:
+        estimate(server.host, server.port, 1985)  # Warm up.
+        with ThreadPoolExecutor(max_workers=threads) as clients:
+            start = time.perf_counter()
+            # Vary birth years, as visitors would.
+            list(clients.map(lambda request: estimate(server.host, server.port, 1957 + request % 60),
+                             range(estimates)))
+            elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server_thread.join()
+    return estimates / elapsed
+
+
+def run_benchmark(thread_counts: List[int], estimates: int) -> Dict[int, float]:
+    """
+    :param thread_counts: List[int], server thread counts to benchmark.
+    :param estimates: int, number of estimates per thread count.
+    :return: Dict {threads: estimates per second}
+    """
+    # Request logging would dominate timings.
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    return {threads: benchmark_threads(threads, estimates) for threads in thread_counts}
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='python -m probable_immunity_web_app.benchmark',
+                                     description='Benchmark threaded serving throughput.')
+    parser.add_argument('--threads', type=int, nargs='+', default=default_threads,
+                        help=f'Server thread counts to benchmark, default {" ".join(map(str, default_threads))}.')
+    parser.add_argument('--estimates', type=int, default=500,
+                        help='Estimates requested per thread count, default 500.')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    print(f'Python {sys.version.split()[0]}, {gil_status()}, {os.cpu_count()} CPUs.')
+    results = run_benchmark(args.threads, args.estimates)
+    baseline = results[args.threads[0]]
+    print(f'{"threads":>7}  {"estimates/s":>11}  {"scaling":>7}')
+    for threads, throughput in results.items():
+        print(f'{threads:>7}  {throughput:>11.1f}  {throughput / baseline:>6.2f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,298 @@
+"""
+Caches for rendered output.
+
+Results pages are a function of a small space of inputs, eg an illness'
+probability and content templates, so rendered HTML is cached rather than
+re-running Jinja for each request.
+
+LRUCache is held in process. SQLiteCache stores entries in a local SQLite
+file, so they are shared by worker processes serving from the same
+instance folder. Both evict least recently used entries beyond maxsize,
+and optionally entries older than ttl seconds.
+"""
+import hashlib
+import threading
+import time
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import (Any,
+                    Callable,
+                    Dict,
+                    Hashable,
+                    Mapping,
+                    Optional,
+                    Union,
+                    )
+
+from probable_immunity_web_app.db import ThreadConnections
+
+
+def version_hash(*directories: Path) -> str:
+    """
+    Hash of the files in directories, eg illness models and templates, so
+    output rendered from them can be identified by the version it was
+    rendered with.
+
+    :param directories: Path, directories to hash, recursively.
+    :return: str, hex digest.
+    """
+    digest = hashlib.sha256()
+    for directory in directories:
+        for path in sorted(directory.rglob('*')):
+            if path.is_file() and '__pycache__' not in path.parts:
+                digest.update(path.relative_to(directory).as_posix().encode('utf-8'))
+                digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def freeze(value: Any) -> Hashable:
+    """
+    Convert a JSON like value, eg an immunity() result, into a hashable
+    cache key, dicts becoming sorted tuples of items, lists tuples.
+
+    :param value: dict, list or hashable value.
+    :return: hashable equivalent
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class LRUCache(object):
+    """
+    Thread safe least recently used cache, with hit and miss statistics.
+    ...
+
+    Attributes:
+    ----------
+    maxsize : int
+        Maximum number of entries, least recently used entries being
+        evicted beyond this. 0 disables caching.
+    ttl : float or None
+        Seconds entries are kept, None to keep entries until evicted.
+    hits : int
+        Number of get() calls finding a value.
+    misses : int
+        Number of get() calls not finding a value.
+    """
+
+    def __init__(self,
+                 maxsize: int = 1024,
+                 ttl: Optional[float] = None,
+                 time_function: Callable[[], float] = time.monotonic,
+                 ):
+        """
+        :param maxsize: int, maximum number of entries.
+        :param ttl: float, seconds entries are kept, default None, kept until evicted.
+        :param time_function: callable returning seconds, defaults to time.monotonic.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._time = time_function
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        :param key: hashable
+        :return: cached value, or None if not cached.
+        """
+        with self._lock:
+            try:
+                value, expires = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            if expires is not None and self._time() >= expires:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        :param key: hashable
+        :param value: value to cache, not None.
+        :return: None
+        """
+        if self.maxsize <= 0:
+            return
+        expires = self._time() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """
+        :param key: hashable, not an error if not cached.
+        :return: None
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        :return: Dict {'hits': int, 'misses': int, 'size': int, 'maxsize': int}
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self.maxsize}
+
+
+class SQLiteCache(object):
+    """
+    Least recently used cache of str values in a SQLite database file,
+    shared by each process using the same file, with hit and miss
+    statistics for this process.
+
+    Keys are stored as their repr(), so should be built from str, int,
+    float, bool, None and tuples of these, eg with freeze().
+    ...
+
+    Attributes:
+    ----------
+    path : str or Path
+        SQLite database file.
+    maxsize : int
+        Maximum number of entries, least recently used entries being
+        evicted beyond this. 0 disables caching.
+    ttl : float or None
+        Seconds entries are kept, None to keep entries until evicted.
+    hits : int
+        Number of get() calls finding a value.
+    misses : int
+        Number of get() calls not finding a value.
+    """
+
+    def __init__(self,
+                 path: Union[str, Path],
+                 maxsize: int = 1024,
+                 ttl: Optional[float] = None,
+                 table: str = 'response_cache',
+                 time_function: Callable[[], float] = time.time,
+                 ):
+        """
+        :param path: str or Path, SQLite database file, created if it does not exist.
+        :param maxsize: int, maximum number of entries.
+        :param ttl: float, seconds entries are kept, default None, kept until evicted.
+        :param table: str, name of cache table.
+        :param time_function: callable returning seconds since the epoch,
+            defaults to time.time, as entries are shared between processes.
+        """
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.table = table
+        self._time = time_function
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+        self._connection = ThreadConnections(path)
+        with self._connection() as connection:
+            connection.execute(f'CREATE TABLE IF NOT EXISTS {table} ('
+                               f'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL, last_used REAL NOT NULL)')
+            connection.execute(f'CREATE INDEX IF NOT EXISTS {table}_last_used ON {table} (last_used)')
+
+    def _count(self, hit: bool) -> None:
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: Hashable) -> Optional[str]:
+        """
+        :param key: hashable, see class docstring.
+        :return: cached value, or None if not cached.
+        """
+        now = self._time()
+        with self._connection() as connection:
+            row = connection.execute(f'SELECT value, expires FROM {self.table} WHERE key = ?',
+                                     (repr(key),)).fetchone()
+            if row is None or (row[1] is not None and now >= row[1]):
+                if row is not None:
+                    connection.execute(f'DELETE FROM {self.table} WHERE key = ?', (repr(key),))
+                self._count(hit=False)
+                return None
+            connection.execute(f'UPDATE {self.table} SET last_used = ? WHERE key = ?', (now, repr(key)))
+        self._count(hit=True)
+        return row[0]
+
+    def set(self, key: Hashable, value: str) -> None:
+        """
+        :param key: hashable, see class docstring.
+        :param value: str
+        :return: None
+        """
+        if self.maxsize <= 0:
+            return
+        now = self._time()
+        expires = now + self.ttl if self.ttl is not None else None
+        with self._connection() as connection:
+            connection.execute(f'INSERT OR REPLACE INTO {self.table} (key, value, expires, last_used) '
+                               f'VALUES (?, ?, ?, ?)',
+                               (repr(key), value, expires, now))
+            connection.execute(f'DELETE FROM {self.table} WHERE key IN ('
+                               f'SELECT key FROM {self.table} ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+                               (self.maxsize,))
+
+    def clear(self) -> None:
+        with self._connection() as connection:
+            connection.execute(f'DELETE FROM {self.table}')
+        with self._stats_lock:
+            self.hits = self.misses = 0
+
+    def __len__(self) -> int:
+        return self._connection().execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        :return: Dict {'hits': int, 'misses': int, 'size': int, 'maxsize': int}
+        """
+        size = len(self)
+        with self._stats_lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': size, 'maxsize': self.maxsize}
+
+
+def response_cache_from_config(config: Mapping[str, Any]) -> Optional[Any]:
+    """
+    Results page cache from app config:
+
+        RESULT_CACHE: 'memory' (default), 'sqlite', None to disable, or a
+            cache object with get(key), set(key, value) and stats().
+        RESULT_CACHE_SIZE: int, maximum entries, default 1024.
+        RESULT_CACHE_TTL: float, seconds entries are kept, default None.
+        RESULT_CACHE_DATABASE: SQLite file for 'sqlite', default DATABASE.
+
+    :param config: app config.
+    :raises ValueError: On an unknown RESULT_CACHE backend.
+    :return: LRUCache, SQLiteCache, configured cache object, or None.
+    """
+    backend = config.get('RESULT_CACHE', 'memory')
+    maxsize = config.get('RESULT_CACHE_SIZE', 1024)
+    ttl = config.get('RESULT_CACHE_TTL')
+    if backend in (None, False, ''):  # Not falsiness, as an empty cache object has len() 0.
+        return None
+    if backend == 'memory':
+        return LRUCache(maxsize, ttl)
+    if backend == 'sqlite':
+        return SQLiteCache(config.get('RESULT_CACHE_DATABASE', config['DATABASE']), maxsize, ttl)
+    if isinstance(backend, str):
+        raise ValueError(f'Unknown RESULT_CACHE backend {backend!r}, expected "memory" or "sqlite".')
+    return backend
@@ -19,6 +19,10 @@ class ProductionConfig(Config):
     DEBUG = False
     SECRET_KEY = os.urandom(32)
     # DATABASE = Path(Path(app.instance_path), 'probable_immunity_app.sqlite'),  # plan to use PostgreSQL
+    # Store session data in DATABASE, cookies carrying only a session id.
+    SESSION_INTERFACE = 'sqlite'
+    # Write anonymized submissions to DATABASE, for reporting.
+    RECORD_SUBMISSIONS = True
 
     ILLNESS_LIST = [
         Measles,
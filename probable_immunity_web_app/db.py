@@ -0,0 +1,54 @@
+"""
+SQLite connections to the app's DATABASE, eg instance/probable_immunity_app.sqlite.
+
+Connections use write-ahead logging, so readers don't block the writer or
+each other, and the database can be shared by threads and worker processes.
+"""
+import sqlite3
+import threading
+
+from pathlib import Path
+from typing import Union
+
+
+def connect(path: Union[str, Path], timeout: float = 10) -> sqlite3.Connection:
+    """
+    :param path: str or Path, SQLite database file, created if it does not exist.
+    :param timeout: float, seconds to wait for another connection's write lock.
+    :return: sqlite3.Connection, in WAL mode.
+    """
+    connection = sqlite3.connect(path, timeout=timeout)
+    connection.execute('PRAGMA journal_mode=WAL')
+    # Durable at checkpoints rather than each commit, safe in WAL mode.
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
+
+
+class ThreadConnections(object):
+    """
+    A connection to a SQLite database per thread, as sqlite3 connections may
+    not be shared between threads. Connections are opened on first use.
+    ...
+
+    Attributes:
+    ----------
+    path : str or Path
+        SQLite database file.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        """
+        :param path: str or Path, SQLite database file.
+        """
+        self.path = path
+        self._local = threading.local()
+
+    def __call__(self) -> sqlite3.Connection:
+        """
+        :return: sqlite3.Connection, for the calling thread.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = connect(self.path)
+            self._local.connection = connection
+        return connection
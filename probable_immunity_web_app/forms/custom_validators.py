@@ -1,4 +1,4 @@
-from typing import Optional, Type
+from typing import Callable, Optional, Type, Union
 
 from flask_wtf import FlaskForm
 from wtforms import ValidationError
@@ -13,26 +13,28 @@ class Year(object):
     ----------
     min_year : int
         Minimum year.
-    max_year : int
-        Maximum year.
+    max_year : int or callable returning int
+        Maximum year, a callable being called on each validation, eg for the
+        current year in a long running process.
     digits : int
         Length of value required. eg 27 = 2, 20293 = 5. Default: 4
-    message : str
+    message : str or callable returning str
         Error message on validation failure.
 
 
     """
 
     def __init__(self, min_year: Optional[int] = None,
-                 max_year: Optional[int] = None,
+                 max_year: Optional[Union[int, Callable[[], int]]] = None,
                  digits: int = 4,
-                 message=None,
+                 message: Optional[Union[str, Callable[[], str]]] = None,
                  ):
         """
         :param min_year: int, the minimum year
-        :param max_year: int, the maximum year.
+        :param max_year: int, the maximum year, or callable returning it.
         :param digits: int, length of value required, defaults to 4.
-        :param message: str, error message on validation failure.
+        :param message: str, error message on validation failure, or callable
+            returning it.
         """
         self.min = min_year
         self.max = max_year
@@ -41,7 +43,6 @@ class Year(object):
             message = f'Field must be a {digits} digit year with a value between {min_year} and  {max_year}.'
         self.message = message
 
-
     def __call__(self, form: Type[FlaskForm], field):
         """
         :param form: Flask-WTF WTForm object
@@ -51,8 +52,9 @@ class Year(object):
         """
         # Cast to int if value exists and is string, otherwise assign 0, which will fail num_digits !=0.
         value = field.data and int(field.data) or 0
+        max_year = self.max() if callable(self.max) else self.max
         if ((self.min is not None and value < self.min)
-                or (self.max is not None and value > self.max)
+                or (max_year is not None and value > max_year)
                 or (self.num_digits is not None and self.num_digits != len(str(value)))
                 or (not isinstance(value, int))):
-            raise ValidationError(self.message)
+            raise ValidationError(self.message() if callable(self.message) else self.message)
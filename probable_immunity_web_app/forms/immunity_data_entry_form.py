@@ -1,16 +1,27 @@
 """Main immunity data entry form. Container for illness sub-forms."""
 
-import datetime
-
 from flask_wtf import FlaskForm
 from wtforms import (SubmitField,
                      validators,
                      )
 from wtforms import IntegerField
 
+from illnesses.clock import clock
 from probable_immunity_web_app.forms import custom_validators
 
-current_year: int = datetime.date.today().year  # Returns 4 digit year.
+current_year: int = clock.year  # 4 digit year, updated by clock on rollover.
+
+
+@clock.on_rollover
+def update_current_year(year: int) -> None:
+    """
+    Update current_year on the clock rolling over to a new year.
+
+    :param year: int, the new year.
+    :return: None
+    """
+    global current_year
+    current_year = year
 
 
 class ImmunityDataEntryForm(FlaskForm):
@@ -19,8 +30,9 @@ class ImmunityDataEntryForm(FlaskForm):
         [
             custom_validators.Year(
                 min_year=1000,
-                max_year=current_year,
-                message=f'Birth year must be a 4 digit integer less than {current_year}.'),
+                # Read from clock on each validation, to roll over with the year.
+                max_year=lambda: clock.year,
+                message=lambda: f'Birth year must be a 4 digit integer less than {clock.year}.'),
             validators.InputRequired(message='Birth year required.'),
             ],
         )
@@ -5,6 +5,9 @@ Register illnesses with application, encapsulate forms/functions associated
 with each illness, and serve a nice API illnesses.illness.xyz.
 
 """
+from wtforms import FormField
+
+from probable_immunity_web_app.forms.immunity_data_entry_form import ImmunityDataEntryForm
 
 
 class Illnesses:
@@ -17,6 +20,13 @@ class Illnesses:
     Illness objects are passed as a list to constructor.
     This list is set in the loaded config file.
 
+    Built once per app by create_app, see app_illnesses().
+
+    Attributes
+    ----------
+    form_class : Type[ImmunityDataEntryForm]
+        ImmunityDataEntryForm subclass with a sub-form for each illness.
+
     """
 
     def __init__(self, illness_list):
@@ -28,9 +38,28 @@ class Illnesses:
             # Register illness
             self._illnesses_list.append(illness)
 
+        self._names = [illness.name for illness in self._illnesses_list]
+        # Generated per set of illnesses, rather than setting illness
+        # sub-forms on the shared ImmunityDataEntryForm class.
+        self.form_class = type('ImmunityDataEntryForm',
+                               (ImmunityDataEntryForm,),
+                               {illness.name: FormField(illness.form) for illness in self._illnesses_list},
+                               )
+
     def __iter__(self):
         return iter(self._illnesses_list)
 
     @property
     def names(self):
-        return [illness.name for illness in self._illnesses_list]
+        return self._names
+
+
+def app_illnesses(app) -> Illnesses:
+    """
+    The Illnesses registry of an app, built from its ILLNESS_LIST config by
+    create_app.
+
+    :param app: Flask app, eg current_app
+    :return: Illnesses
+    """
+    return app.extensions['illnesses']
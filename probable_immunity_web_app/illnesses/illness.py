@@ -1,4 +1,4 @@
-from typing import Callable, Type
+from typing import Callable, Optional, Sequence, Tuple, Type
 
 from flask_wtf import FlaskForm
 
@@ -16,6 +16,14 @@ class Illness:
     form : FlaskForm
         Flask-WTF WTForm object, renders form in HTML and validates data.
 
+    url_code : str or None
+        Letter identifying illness in stateless results URLs, eg 'm' in
+        /immunity/r/1985-m2-0, see probable_immunity_app.results_code().
+
+    url_fields : Tuple of Tuple (str, type)
+        Names and types (int or bool) of extracted data, in the order they
+        are encoded in stateless results URLs.
+
     Methods
     -------
     immunity
@@ -31,15 +39,21 @@ class Illness:
                  immunity: Callable,
                  wt_form: Type[FlaskForm],
                  form_data_extractor: Callable,
+                 url_code: Optional[str] = None,
+                 url_fields: Sequence[Tuple[str, type]] = (),
                  ):
         """
         :param name: str
         :param immunity: function
         :param wt_form: FlaskForm, Flask-WTF WTForm object
         :param form_data_extractor: function
+        :param url_code: str, single letter, None if not encoded in URLs.
+        :param url_fields: Sequence of Tuple (data key, int or bool)
         """
         self.name = name
         self.form = wt_form
+        self.url_code = url_code
+        self.url_fields = tuple(url_fields)
         self._immunity = immunity
         self._form_data_extractor = form_data_extractor
 
@@ -8,4 +8,6 @@ Measles = Illness(name='measles',
                   immunity=measles.immunity,
                   wt_form=illness_forms.Measles,
                   form_data_extractor=illness_forms.extract_measles_form_data,
+                  url_code='m',
+                  url_fields=(('on_time_measles_vaccinations', int), ('measles_illness', bool)),
                   )
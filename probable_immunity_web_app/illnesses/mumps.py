@@ -7,4 +7,6 @@ Mumps = Illness(name='mumps',
                 immunity=mumps.immunity,
                 wt_form=illness_forms.Mumps,
                 form_data_extractor=illness_forms.extract_mumps_form_data,
+                url_code='u',
+                url_fields=(('on_time_mumps_vaccinations', int), ('mumps_illness', bool)),
                 )
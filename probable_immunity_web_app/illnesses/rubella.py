@@ -7,4 +7,6 @@ Rubella = Illness(name='rubella',
                   immunity=rubella.immunity,
                   wt_form=illness_forms.Rubella,
                   form_data_extractor=illness_forms.extract_rubella_form_data,
+                  url_code='r',
+                  url_fields=(('rubella_vaccinations', int), ('rubella_illness', bool)),
                   )
@@ -1,36 +1,74 @@
+import hashlib
+import json
+import math
+import re
+import time
+
+from typing import (IO,
+                    Any,
+                    Dict,
+                    Iterator,
+                    List,
+                    Mapping,
+                    Optional,
+                    Tuple,
+                    )
+
+from markupsafe import Markup
+
 from flask import (Blueprint,
+                   Response,
+                   abort,
                    current_app,
+                   jsonify,
                    redirect,
                    request,
                    render_template,
                    session,
+                   stream_with_context,
                    url_for,
                    )
-from wtforms import FormField
 
-import probable_immunity_web_app.forms.immunity_data_entry_form as forms
-
-from probable_immunity_web_app.illness_config import Illnesses
+from illnesses.clock import (clock,
+                             start_of_year,
+                             )
+from illnesses.common_helpers import (max_table_vaccinations,
+                                      validate_birth_year,
+                                      )
+from probable_immunity_web_app.cache import freeze
+from probable_immunity_web_app.illness_config import (Illnesses,
+                                                      app_illnesses,
+                                                      )
 
 immunity_app_bp = Blueprint('immunity_app', __name__, url_prefix='/')
 
+# Default maximum persons per batch API request, see API_MAX_BATCH_SIZE config.
+max_batch_size = 10_000
+# Default maximum bytes per person line for the streaming API, see API_MAX_LINE_LENGTH config.
+max_line_length = 64 * 1024
+# Unsigned integer in a results URL, see results_code().
+results_code_segment = re.compile(r'[0-9]{1,6}')
+
 
 @immunity_app_bp.route('/immunity/', methods=('GET', 'POST'))
 def immunity():
-    illnesses = Illnesses(current_app.config['ILLNESS_LIST'])
-    # Initialise form from config:
-    for illness in illnesses:
-        setattr(forms.ImmunityDataEntryForm, illness.name, FormField(illness.form))
-    # Set form
-    form = forms.ImmunityDataEntryForm()
+    illnesses = app_illnesses(current_app)
+    # Set form, with illness sub-forms from config:
+    form = illnesses.form_class()
 
     if request.method == 'POST':
         if form.validate_on_submit():
+            inputs = {'birth_year': form.birth_year.data,
+                      **{illness.name: illness.extract_data(form) for illness in illnesses}}
+            submission_writer = current_app.extensions['submission_writer']
+            if submission_writer is not None:
+                submission_writer.submit(inputs)  # Written in the background.
+            if current_app.config.get('STATELESS_RESULTS'):
+                # Inputs in the results URL, rather than the session.
+                return redirect(url_for('immunity_app.stateless_immunity_results',
+                                        code=results_code(illnesses, inputs)))
             # Place validated data in session.
-            session['birth_year'] = form.birth_year.data
-            for illness in illnesses:
-                # Store data in session.
-                session[illness.name] = illness.extract_data(form)
+            session.update(inputs)
 
             if not form.errors:
                 return redirect(url_for('immunity_app.immunity_results'))
@@ -42,21 +80,400 @@ def immunity():
 
 @immunity_app_bp.route('/immunity/results/')
 def immunity_results():
-    illnesses = Illnesses(current_app.config['ILLNESS_LIST'])
+    illnesses = app_illnesses(current_app)
+    try:
+        inputs = results_inputs(illnesses, session)
+    except KeyError:
+        return redirect(url_for('immunity_app.immunity'), code=302)
+
+    response = results_response(illnesses, inputs)
+    # Results are per visitor, so only cached by their browser, revalidating with the ETag.
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
+
+
+@immunity_app_bp.route('/immunity/r/<code>')
+def stateless_immunity_results(code: str):
+    """
+    Results page for inputs encoded in the URL, see results_code(), so the
+    page is a function of the URL alone, and can be cached by shared caches.
+    """
+    illnesses = app_illnesses(current_app)
+    try:
+        inputs = parse_results_code(illnesses, code)
+    except ValueError:
+        abort(404)
+    canonical_code = results_code(illnesses, inputs)
+    if code != canonical_code:  # Eg leading zeros, one URL per result for caches.
+        return redirect(url_for('immunity_app.stateless_immunity_results', code=canonical_code), code=301)
+
+    response = results_response(illnesses, inputs)
+    response.cache_control.public = True
+    # Results change at the start of next year, eg mumps waning immunity.
+    response.cache_control.max_age = max(0, min(current_app.config.get('RESULTS_MAX_AGE', 86400),
+                                                int(start_of_year(clock.year + 1) - time.time())))
+    return response
+
+
+def results_code(illnesses: Illnesses, inputs: Mapping[str, Any]) -> str:
+    """
+    Encode results inputs as a compact, canonical URL path segment: birth
+    year, then for each illness its url_code and url_fields, eg measles,
+    mumps and rubella data for someone born in 1985:
+
+        1985-m2-0-u2-0-r1-0
+
+    Counts above max_table_vaccinations, eg doses, are encoded as
+    max_table_vaccinations, which every illness treats the same, so each
+    result has one URL.
+
+    :param illnesses: Illnesses, the app's configured illnesses.
+    :param inputs: Dict {'birth_year': birth_year, illness: {k, v}, }
+    :raises ValueError: If an illness has no url_code.
+    :raises KeyError: If birth_year or an illness' data is missing.
+    :return: str
+    """
+    segments = [str(int(inputs['birth_year']))]
+    for illness in illnesses:
+        if not illness.url_code or not illness.url_fields:
+            raise ValueError(f'{illness.name} is not encoded in results URLs.')
+        values = [str(min(int(inputs[illness.name][field]), max_table_vaccinations) if field_type is int
+                      else int(inputs[illness.name][field]))
+                  for field, field_type in illness.url_fields]
+        segments.append(f'{illness.url_code}{values[0]}')
+        segments.extend(values[1:])
+    return '-'.join(segments)
+
+
+def parse_results_code(illnesses: Illnesses, code: str) -> Dict[str, Any]:
+    """
+    Decode results inputs encoded by results_code().
+
+    :param illnesses: Illnesses, the app's configured illnesses.
+    :param code: str, eg '1985-m2-0-u2-0-r1-0'
+    :raises ValueError: If code is not a valid encoding for illnesses, or
+        its birth year is not valid, so junk URLs aren't cached as results.
+    :return: Dict {'birth_year': birth_year, illness: {k, v}, }
+    """
+    segments = code.split('-')
+    if not segments or not results_code_segment.fullmatch(segments[0]):
+        raise ValueError(f'Invalid birth year in {code!r}.')
+    inputs: Dict[str, Any] = {'birth_year': validate_birth_year(int(segments[0]))}
+    position = 1
+    for illness in illnesses:
+        if not illness.url_code or not illness.url_fields:
+            raise ValueError(f'{illness.name} is not encoded in results URLs.')
+        values = segments[position:position + len(illness.url_fields)]
+        position += len(illness.url_fields)
+        if len(values) < len(illness.url_fields) or not values[0].startswith(illness.url_code):
+            raise ValueError(f'Missing {illness.name} data in {code!r}.')
+        values[0] = values[0][len(illness.url_code):]
+        data = {}
+        for (field, field_type), value in zip(illness.url_fields, values):
+            if not results_code_segment.fullmatch(value) or (field_type is bool and int(value) not in (0, 1)):
+                raise ValueError(f'Invalid {field} in {code!r}.')
+            data[field] = field_type(int(value))
+        inputs[illness.name] = data
+    if position != len(segments):
+        raise ValueError(f'Unexpected data in {code!r}.')
+    return inputs
+
+
+def results_response(illnesses: Illnesses, inputs: Dict[str, Any]) -> Response:
+    """
+    Results page response for inputs, with a strong ETag, answering a
+    matching If-None-Match with 304 rather than rendering.
+
+    :param illnesses: Illnesses, the app's configured illnesses.
+    :param inputs: Dict {'birth_year': birth_year, illness: {k, v}, }
+    :return: Response
+    """
+    # Results depend on the current year, eg mumps waning immunity, and models and templates.
+    key = (current_app.extensions['content_version'], clock.year, freeze(inputs))
+    etag = hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        result_cache = current_app.extensions['result_cache']
+        page = result_cache.get(key) if result_cache is not None else None
+        if page is None:
+            page = render_immunity_results(illnesses, inputs)
+            if result_cache is not None:
+                result_cache.set(key, page)
+        response = Response(page)
+    response.set_etag(etag)
+    return response
+
+
+def results_inputs(illnesses: Illnesses, data: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    Extract inputs results depend on from session data, ie birth_year and
+    each illness' data.
+
+    :param illnesses: Illnesses, the app's configured illnesses.
+    :param data: session, or mapping of the same form.
+    :raises KeyError: If birth_year or an illness' data is missing.
+    :return: Dict {'birth_year': birth_year, illness: {k, v}, }
+    """
+    return {'birth_year': data['birth_year'], **{name: data[name] for name in illnesses.names}}
+
+
+def render_immunity_results(illnesses: Illnesses, inputs: Dict[str, Any]) -> str:
+    """
+    Render results page for inputs, see results_inputs().
+
+    :param illnesses: Illnesses, the app's configured illnesses.
+    :param inputs: Dict {'birth_year': birth_year, illness: {k, v}, }
+    :return: str, rendered HTML.
+    """
     result_data = {}
     for illness in illnesses:
         try:
-            result_data[illness.name] = {**illness.immunity(birth_year=session['birth_year'],
-                                                            **session[illness.name])
+            result_data[illness.name] = {**illness.immunity(birth_year=inputs['birth_year'],
+                                                            **inputs[illness.name])
                                          }
         except (ValueError, TypeError):  # -> raise this in immunity() pass on TypeError also.
             # Display error for individual illness if error occurred on validated data inside immunity()
             result_data[illness.name] = {f'probability_of_{illness.name}_immunity': 'Unknown',
                                          'content_templates': ['immunity_results_error_message']}
-        except KeyError:
-            return redirect(url_for('immunity_app.immunity'), code=302)
 
     return render_template('immunity_app/immunity_results.html',
                            illnesses=illnesses.names,
+                           illness_results=[render_illness_result(name, result_data[name]) for name in illnesses.names],
                            **result_data,  # Dict form {illness: {k, v}, } - (whatever key-value each illness needs}
                            )
+
+
+def render_illness_result(illness_name: str, result: dict) -> Markup:
+    """
+    Render an illness' result fragment, <illness>_immunity_result.html, from
+    the app's result fragment cache where the same result has been rendered
+    before.
+
+    The fragment depends only on the illness and its result, ie probability
+    and content templates, which take few distinct values.
+
+    :param illness_name: str
+    :param result: dict, illness' immunity() result, or error result.
+    :return: Markup, rendered HTML.
+    """
+    fragment_cache = current_app.extensions['result_fragment_cache']
+    key = (illness_name, freeze(result))
+    fragment = fragment_cache.get(key)
+    if fragment is None:
+        fragment = Markup(render_template(f'immunity_app/{illness_name}/{illness_name}_immunity_result.html',
+                                          illness=illness_name,
+                                          **{illness_name: result}))
+        fragment_cache.set(key, fragment)
+    return fragment
+
+
+def persons_immunity(illnesses: Illnesses, persons: List[Any]) -> List[Tuple[Dict[str, dict], Dict[str, str]]]:
+    """
+    Run each illness' immunity() for person records from the JSON API, in
+    one pass over the configured illnesses.
+
+    A person is a JSON object in the same shape as the session data, ie
+    birth_year, and for each illness a dict of immunity() arguments, eg:
+
+        {"birth_year": 1985,
+         "mumps": {"on_time_mumps_vaccinations": 2, "mumps_illness": false}}
+
+    Illnesses omitted use immunity() defaults. Illness data is limited to
+    the illness' url_fields, ie the data entry form's data, with JSON
+    booleans for bool fields and finite numbers for int fields, or null.
+
+    Errors are per person, and per illness, rather than failing every person.
+
+    :param illnesses: Illnesses, the app's configured illnesses.
+    :param persons: List of JSON values for each person.
+    :return: List of Tuple (Dict {illness: immunity() result},
+                            Dict {'birth_year', illness or 'person': error message})
+    """
+    rows: List[Tuple[Dict[str, dict], Dict[str, str]]] = [({}, {}) for _ in persons]
+    valid_persons = []
+    for person, (results, errors) in zip(persons, rows):
+        if not isinstance(person, dict):
+            errors['person'] = 'Person must be a JSON object.'
+            continue
+        unknown = set(person) - {'birth_year', *illnesses.names}
+        if unknown:
+            errors['person'] = f'Unknown illnesses: {", ".join(sorted(unknown))}.'
+            continue
+        birth_year: Any = person.get('birth_year')
+        try:
+            validate_birth_year(birth_year)
+        except ValueError as error:
+            errors['birth_year'] = str(error)
+            continue
+        valid_persons.append((person, results, errors))
+
+    for illness in illnesses:
+        # Only the data entry form's data is accepted, not other immunity() arguments, eg as_of_year.
+        fields = [field for field, _ in illness.url_fields]
+        field_types = dict(illness.url_fields)
+        for person, results, errors in valid_persons:
+            illness_data = person.get(illness.name, {})
+            if not isinstance(illness_data, dict):
+                errors[illness.name] = f'{illness.name} data must be a JSON object.'
+                continue
+            unknown = set(illness_data) - set(fields)
+            if unknown:
+                errors[illness.name] = (f'Unknown {illness.name} data: {", ".join(sorted(unknown))}. '
+                                        f'Expected: {", ".join(fields)}.')
+                continue
+            type_errors = [field_type_error(field, field_types[field], illness_data[field])
+                           for field in fields if field in illness_data]
+            if any(type_errors):
+                errors[illness.name] = ' '.join(error for error in type_errors if error)
+                continue
+            try:
+                results[illness.name] = illness.immunity(birth_year=person['birth_year'], **illness_data)
+            except (ValueError, TypeError) as error:
+                errors[illness.name] = str(error)
+            except OverflowError:  # JSON Infinity, accepted by Python's JSON parser.
+                errors[illness.name] = f'{illness.name} data must be finite numbers.'
+    return rows
+
+
+def field_type_error(field: str, field_type: type, value: Any) -> Optional[str]:
+    """
+    Check a JSON API illness data value against its url_fields type, as
+    truthy strings eg "no", or strings of numbers, would otherwise be
+    silently accepted by immunity().
+
+    :param field: str, eg 'mumps_illness'
+    :param field_type: bool or int, from the illness' url_fields.
+    :param value: JSON value.
+    :return: str error message, or None if value is null or of field_type.
+    """
+    if value is None:
+        return None
+    if field_type is bool:
+        return None if isinstance(value, bool) else f'{field} must be true or false.'
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        return f'{field} must be a number.'
+    return None
+
+
+def person_immunity(illnesses: Illnesses, person: Any) -> Tuple[Dict[str, dict], Dict[str, str]]:
+    """
+    Run each illness' immunity() for a person record from the JSON API, see
+    persons_immunity().
+
+    :param illnesses: Illnesses, the app's configured illnesses.
+    :param person: JSON value for the person.
+    :return: Tuple (Dict {illness: immunity() result},
+                    Dict {'birth_year', illness or 'person': error message})
+    """
+    return persons_immunity(illnesses, [person])[0]
+
+
+@immunity_app_bp.route('/api/v1/immunity', methods=('POST',))
+def api_immunity():
+    """
+    JSON API for a single person, see person_immunity(), returning each
+    configured illness' immunity() result without a session, redirect or
+    template render:
+
+        {"results": {"mumps": {"probability_of_mumps_immunity": 0.88...,
+                               "content_templates": ["has_immunisations", "waning_warning"]}}}
+
+    Responds 400 with {"errors": {field: message}} on improper data.
+    """
+    results, errors = person_immunity(app_illnesses(current_app), request.get_json(silent=True))
+    if errors:
+        return jsonify(errors=errors), 400
+    return jsonify(results=results)
+
+
+@immunity_app_bp.route('/api/v1/immunity/batch', methods=('POST',))
+def api_immunity_batch():
+    """
+    JSON API for many persons per request, eg a school roster, taking
+    {"persons": [person, ...]}, see persons_immunity(), and returning a row
+    for each person, in order:
+
+        {"results": [{"results": {"mumps": {...}, ...}},
+                     {"errors": {"birth_year": "Birth year must be..."}}]}
+
+    A person with improper data has an errors row, rather than failing the
+    batch. Responds 400 where the request is not a batch, 413 where it has
+    more than API_MAX_BATCH_SIZE persons.
+    """
+    batch = request.get_json(silent=True)
+    if not isinstance(batch, dict) or not isinstance(batch.get('persons'), list):
+        return jsonify(errors={'persons': 'Request must be a JSON object with a persons array.'}), 400
+    batch_size_limit = current_app.config.get('API_MAX_BATCH_SIZE', max_batch_size)
+    if len(batch['persons']) > batch_size_limit:
+        return jsonify(errors={'persons': f'Batches are limited to {batch_size_limit} persons.'}), 413
+
+    rows = persons_immunity(app_illnesses(current_app), batch['persons'])
+    return jsonify(results=[{'errors': errors} if errors else {'results': results} for results, errors in rows])
+
+
+def ndjson_lines(stream: IO[bytes], line_length_limit: int) -> Iterator[Optional[bytes]]:
+    """
+    Read lines from a stream as they arrive, without reading the whole
+    stream, or more than line_length_limit bytes of a line, into memory.
+
+    :param stream: binary file like, eg request.stream
+    :param line_length_limit: int, maximum bytes per line.
+    :return: Iterator of bytes lines, None for each line over the limit.
+    """
+    while True:
+        line = stream.readline(line_length_limit + 1)
+        if not line:
+            return
+        if len(line) > line_length_limit and not line.endswith(b'\n'):
+            # Discard the rest of the line.
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(line_length_limit)
+            yield None
+        else:
+            yield line
+
+
+@immunity_app_bp.route('/api/v1/immunity/stream', methods=('POST',))
+def api_immunity_stream():
+    """
+    Streaming JSON API for rosters too large for one JSON document. Takes
+    newline delimited JSON (NDJSON), a person per line, see
+    persons_immunity(), and streams back an NDJSON row per person as each is
+    scored, in the same form as the batch API rows:
+
+        {"results": {"mumps": {...}, ...}}
+        {"errors": {"birth_year": "Birth year must be..."}}
+
+    Blank lines are skipped, and a line that can't be scored has an errors
+    row, rather than ending the stream. Memory use is bounded by
+    API_MAX_LINE_LENGTH rather than the size of the upload, and results are
+    sent while the upload continues.
+    """
+    illnesses = app_illnesses(current_app)
+    line_length_limit = current_app.config.get('API_MAX_LINE_LENGTH', max_line_length)
+    stream = request.stream
+
+    def score_lines() -> Iterator[str]:
+        for line in ndjson_lines(stream, line_length_limit):
+            if line is None:
+                row: Dict[str, Any] = {'errors': {'person': f'Lines are limited to {line_length_limit} bytes.'}}
+            elif not line.strip():
+                continue
+            else:
+                try:
+                    person = json.loads(line)
+                except (ValueError, RecursionError):  # RecursionError on deeply nested arrays/objects.
+                    row = {'errors': {'person': 'Person must be a JSON object.'}}
+                else:
+                    try:
+                        results, errors = person_immunity(illnesses, person)
+                    except Exception:  # After the 200 is sent, so reported in the row rather than ending the stream.
+                        current_app.logger.exception('Scoring streamed person failed.')
+                        results, errors = {}, {'person': 'Person could not be scored.'}
+                    row = {'errors': errors} if errors else {'results': results}
+            yield json.dumps(row) + '\n'
+
+    return Response(stream_with_context(score_lines()), mimetype='application/x-ndjson')
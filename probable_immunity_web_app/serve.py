@@ -0,0 +1,118 @@
+"""
+Threaded serving mode.
+
+Serves the app with a bounded pool of worker threads, each request being
+handled on a pool thread:
+
+    python -m probable_immunity_web_app.serve --threads 8 --port 5000
+
+The app holds no mutable state shared between requests: the illness
+registry and form class are built once per app by create_app, illness
+decision tables are read only, and only rebuilt under the year clock's lock.
+It is equally safe under other threaded WSGI servers, eg
+gunicorn --threads 8 "probable_immunity_web_app.app_factory:create_app()".
+"""
+import argparse
+import sys
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import (Any,
+                    List,
+                    Optional,
+                    )
+
+from werkzeug.serving import (BaseWSGIServer,
+                              WSGIRequestHandler,
+                              )
+
+from probable_immunity_web_app.app_factory import create_app
+
+
+class PooledRequestHandler(WSGIRequestHandler):
+    # A connection per request, so idle keep-alive connections don't hold pool threads.
+    protocol_version = 'HTTP/1.0'
+
+
+class ThreadPoolWSGIServer(BaseWSGIServer):
+    """
+    Werkzeug WSGI server handling requests on a bounded pool of threads,
+    rather than a new thread per request.
+    ...
+
+    Attributes:
+    ----------
+    threads : int
+        Number of worker threads.
+    """
+    multithread = True
+
+    def __init__(self, host: str, port: int, app: Any, threads: int = 8, **kwargs: Any):
+        """
+        :param host: str, host to bind to.
+        :param port: int, port to bind to, 0 for any free port.
+        :param app: WSGI app
+        :param threads: int, number of worker threads.
+        :param kwargs: BaseWSGIServer keyword arguments.
+        """
+        kwargs.setdefault('handler', PooledRequestHandler)
+        super().__init__(host, port, app, **kwargs)
+        self.threads = threads
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='probable-immunity')
+
+    def process_request(self, request: Any, client_address: Any) -> None:
+        self._executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request: Any, client_address: Any) -> None:
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self) -> None:
+        super().server_close()
+        # Finish requests in progress.
+        self._executor.shutdown(wait=True)
+
+
+def make_server(host: str = '127.0.0.1',
+                port: int = 5000,
+                threads: int = 8,
+                app: Optional[Any] = None,
+                ) -> ThreadPoolWSGIServer:
+    """
+    Create a threaded server for the app, serving once serve_forever() is
+    called.
+
+    :param host: str
+    :param port: int, 0 for any free port, see server.port.
+    :param threads: int, number of worker threads.
+    :param app: Flask app, default create_app().
+    :return: ThreadPoolWSGIServer
+    """
+    return ThreadPoolWSGIServer(host, port, app if app is not None else create_app(), threads=threads)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='python -m probable_immunity_web_app.serve',
+                                     description='Serve the probable immunity app on a pool of threads.')
+    parser.add_argument('--host', default='127.0.0.1', help='Host to bind to, default 127.0.0.1.')
+    parser.add_argument('--port', type=int, default=5000, help='Port to bind to, default 5000.')
+    parser.add_argument('--threads', type=int, default=8, help='Number of worker threads, default 8.')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    if args.threads < 1:
+        print('--threads must be at least 1.', file=sys.stderr)
+        return 2
+    server = make_server(args.host, args.port, args.threads)
+    print(f'Serving on http://{args.host}:{server.port} with {args.threads} threads.', file=sys.stderr)
+    server.serve_forever()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""
+Server-side sessions, stored in the app's SQLite DATABASE.
+
+The session cookie carries only a random session id, rather than the signed
+session data, so cookie size and signing cost don't grow with the number of
+illnesses. Enable with:
+
+    app.session_interface = SQLiteSessionInterface(app.config['DATABASE'])
+
+or SESSION_INTERFACE = 'sqlite' in config, see create_app.
+
+Sessions are written under a new id each time they are modified, the
+previous id being deleted, so a stored session is never changed, and can be
+held in an in-process LRU front cache without going stale when worker
+processes share the database. Front cache entries are kept for cache_ttl
+seconds, so a replaced or deleted id is only opened by another process'
+front cache for at most that long.
+"""
+import re
+import secrets
+import sqlite3
+import threading
+import time
+
+from pathlib import Path
+from typing import (Any,
+                    Optional,
+                    Union,
+                    )
+
+from flask import (Flask,
+                   Request,
+                   Response,
+                   )
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import (SessionInterface,
+                            SessionMixin,
+                            )
+from werkzeug.datastructures import CallbackDict
+
+from probable_immunity_web_app.cache import LRUCache
+from probable_immunity_web_app.db import ThreadConnections
+
+# Session ids from secrets.token_urlsafe(32).
+session_id_pattern = re.compile(r'[A-Za-z0-9_-]{43}')
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """
+    Session data, tracking access and modification as SecureCookieSession.
+    ...
+
+    Attributes:
+    ----------
+    sid : str or None
+        Id the session was loaded with, None for a new session.
+    """
+    modified = False
+    accessed = False
+
+    def __init__(self, initial: Any = None, sid: Optional[str] = None):
+        def on_update(self: 'ServerSideSession') -> None:
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = sid is None
+
+    def __getitem__(self, key: str) -> Any:
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        self.accessed = True
+        return super().setdefault(key, default)
+
+
+class SQLiteSessionInterface(SessionInterface):
+    """
+    Flask session interface storing sessions in a SQLite database, with an
+    in-process LRU cache in front.
+
+    Sessions expire from the database after the app's
+    permanent_session_lifetime, expired sessions being purged every
+    purge_interval saves.
+    ...
+
+    Attributes:
+    ----------
+    path : str or Path
+        SQLite database file.
+    front_cache : LRUCache
+        Tuple (serialized session, expiry timestamp) by session id, kept
+        for cache_ttl seconds.
+    """
+    serializer = TaggedJSONSerializer()
+    session_class = ServerSideSession
+    purge_interval = 1000
+
+    def __init__(self,
+                 path: Union[str, Path],
+                 cache_size: int = 1024,
+                 table: str = 'sessions',
+                 cache_ttl: float = 5.0,
+                 ):
+        """
+        :param path: str or Path, SQLite database file, created on first use.
+        :param cache_size: int, maximum sessions held in process, 0 for none.
+        :param table: str, name of sessions table.
+        :param cache_ttl: float, seconds sessions are held in process, the
+            longest another process can open a replaced or deleted session id.
+        """
+        self.path = path
+        self.table = table
+        self.front_cache = LRUCache(cache_size, cache_ttl)
+        self._connections = ThreadConnections(path)
+        self._setup_lock = threading.Lock()
+        self._is_set_up = False
+        self._saves = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = self._connections()
+        if not self._is_set_up:
+            # Not in __init__, so apps not serving requests don't create the database.
+            with self._setup_lock, connection:
+                connection.execute(f'CREATE TABLE IF NOT EXISTS {self.table} ('
+                                   f'id TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)')
+                connection.execute(f'CREATE INDEX IF NOT EXISTS {self.table}_expires ON {self.table} (expires)')
+                self._is_set_up = True
+        return connection
+
+    def open_session(self, app: Flask, request: Request) -> ServerSideSession:
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid or not session_id_pattern.fullmatch(sid):
+            return self.session_class()
+        now = time.time()
+        entry = self.front_cache.get(sid)
+        if entry is None or entry[1] <= now:
+            entry = self._connection().execute(f'SELECT data, expires FROM {self.table} WHERE id = ? AND expires > ?',
+                                               (sid, now)).fetchone()
+            if entry is None:  # Expired, or unknown.
+                return self.session_class()
+            self.front_cache.set(sid, entry)
+        return self.session_class(self.serializer.loads(entry[0]), sid)
+
+    def save_session(self, app: Flask, session: SessionMixin, response: Response) -> None:  # type: ignore[override]
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        # Add a "Vary: Cookie" header if the session was accessed at all.
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        # If the session is modified to be empty, remove the cookie, and the stored session.
+        if not session:
+            if session.modified:
+                sid = getattr(session, 'sid', None)
+                if sid is not None:
+                    with self._connection() as connection:
+                        connection.execute(f'DELETE FROM {self.table} WHERE id = ?', (sid,))
+                    self.front_cache.delete(sid)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=secure, samesite=samesite, httponly=httponly)
+                response.vary.add('Cookie')
+            return
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        sid = getattr(session, 'sid', None)
+        expires = time.time() + app.permanent_session_lifetime.total_seconds()
+        with self._connection() as connection:
+            if session.modified or sid is None:
+                # Stored sessions aren't changed, so front caches of other processes don't go stale.
+                if sid is not None:  # Replaced, so the previous id no longer opens the session.
+                    connection.execute(f'DELETE FROM {self.table} WHERE id = ?', (sid,))
+                    self.front_cache.delete(sid)
+                sid = secrets.token_urlsafe(32)
+                data = self.serializer.dumps(dict(session))
+                connection.execute(f'INSERT INTO {self.table} (id, data, expires) VALUES (?, ?, ?)',
+                                   (sid, data, expires))
+            else:  # Refreshing a permanent session.
+                data = self.serializer.dumps(dict(session))
+                connection.execute(f'UPDATE {self.table} SET expires = ? WHERE id = ?', (expires, sid))
+            self.front_cache.set(sid, (data, expires))
+            self._saves += 1
+            if self._saves % self.purge_interval == 0:
+                connection.execute(f'DELETE FROM {self.table} WHERE expires <= ?', (time.time(),))
+
+        response.set_cookie(name, sid, expires=self.get_expiration_time(app, session),
+                            httponly=httponly, domain=domain, path=path, secure=secure, samesite=samesite)
+        response.vary.add('Cookie')
@@ -0,0 +1,395 @@
+"""
+Write-behind persistence of anonymized submissions, for reporting.
+
+Data entry submissions are queued in memory by the request, and written to
+the app's SQLite DATABASE by a background thread, in batches, so requests
+don't wait on INSERTs. Each submission is stored as a row per illness: birth
+year, doses, whether the person had the illness, and the resulting
+probability and content templates. No identifying or request data is kept.
+
+The queue is bounded: when the writer falls behind, submissions are dropped
+and counted, rather than blocking requests or growing memory, see
+SubmissionWriter.stats().
+
+Rollups of the submissions table, per illness, birth decade and doses, are
+updated in the same transaction as rows are written, so reports read the
+submission_rollups table rather than scanning submissions, see rollups().
+Doses are rolled up to at most max_table_vaccinations, which stands for that
+many or more, as in results URLs, so rollup rows don't grow with each
+distinct dose count submitted.
+"""
+import atexit
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+from pathlib import Path
+from typing import (Any,
+                    Dict,
+                    List,
+                    Optional,
+                    Tuple,
+                    Union,
+                    )
+
+from illnesses.common_helpers import max_table_vaccinations
+from probable_immunity_web_app.db import connect
+from probable_immunity_web_app.illness_config import Illnesses
+
+logger = logging.getLogger(__name__)
+
+# Queued by stop(), ending the writer thread once submissions before it are written.
+_stop = object()
+
+# Probability histogram buckets in rollups, [0, 0.1), [0.1, 0.2) ... [0.9, 1].
+histogram_buckets = 10
+bucket_columns = [f'bucket_{bucket}' for bucket in range(histogram_buckets)]
+# Rollup doses where an illness has no doses field, as doses is part of the primary key.
+unknown_doses = -1
+
+
+def probability_bucket(probability: float) -> int:
+    """
+    Histogram bucket of a probability, as bucket_sql.
+
+    :param probability: float, 0 to 1.
+    :return: int, 0 to histogram_buckets - 1.
+    """
+    return min(max(int(probability * histogram_buckets), 0), histogram_buckets - 1)
+
+
+bucket_sql = f'MIN(MAX(CAST(probability * {histogram_buckets} AS INTEGER), 0), {histogram_buckets - 1})'
+
+
+def submission_rows(illnesses: Illnesses, inputs: Dict[str, Any]) -> List[Tuple]:
+    """
+    Anonymized rows for a submission, one per illness, of:
+
+        (birth_year, illness, doses, had_illness, probability, content_templates)
+
+    doses and had_illness being the illness' int and bool url_fields, and
+    probability None where immunity() raised an error.
+
+    :param illnesses: Illnesses, the app's configured illnesses.
+    :param inputs: Dict {'birth_year': birth_year, illness: {k, v}, }
+    :return: List of Tuple
+    """
+    rows = []
+    for illness in illnesses:
+        data = inputs[illness.name]
+        doses = next((data.get(field) for field, field_type in illness.url_fields if field_type is int), None)
+        had_illness = next((data.get(field) for field, field_type in illness.url_fields if field_type is bool), None)
+        try:
+            result = illness.immunity(birth_year=inputs['birth_year'], **data)
+            probability = result[f'probability_of_{illness.name}_immunity']
+            content_templates = result['content_templates']
+        except (ValueError, TypeError):
+            probability, content_templates = None, ['immunity_results_error_message']
+        rows.append((inputs['birth_year'], illness.name, doses, had_illness, probability,
+                     json.dumps(list(content_templates))))
+    return rows
+
+
+class SubmissionWriter(object):
+    """
+    Bounded queue of submissions, written to SQLite by a background thread
+    in executemany() transactions of up to batch_size submissions, or those
+    queued within flush_interval seconds of the first, and on stop().
+
+    The writer thread is started by the first submit(), and stopped at
+    interpreter exit.
+    ...
+
+    Attributes:
+    ----------
+    path : str or Path
+        SQLite database file.
+    max_queue : int
+        Maximum submissions waiting to be written, further submissions
+        being dropped.
+    batch_size : int
+        Maximum submissions per transaction.
+    flush_interval : float
+        Maximum seconds a submission waits for its batch to fill.
+    """
+
+    def __init__(self,
+                 path: Union[str, Path],
+                 illnesses: Illnesses,
+                 max_queue: int = 10_000,
+                 batch_size: int = 500,
+                 flush_interval: float = 1.0,
+                 ):
+        """
+        :param path: str or Path, SQLite database file.
+        :param illnesses: Illnesses, the app's configured illnesses.
+        :param max_queue: int, maximum submissions waiting to be written.
+        :param batch_size: int, maximum submissions per transaction.
+        :param flush_interval: float, maximum seconds before writing a partial batch.
+        """
+        self.path = path
+        self.illnesses = illnesses
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue(max_queue)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self._stats = {'submitted': 0, 'written': 0, 'dropped': 0, 'batches': 0, 'errors': 0,
+                       'queue_high_water': 0}
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None and not self._stopped:
+                self._thread = threading.Thread(target=self._run, name='submission-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def submit(self, inputs: Dict[str, Any]) -> bool:
+        """
+        Queue a submission to be written, without blocking.
+
+        :param inputs: Dict {'birth_year': birth_year, illness: {k, v}, }
+        :return: bool, False if dropped, the queue being full or writer stopped.
+        """
+        if self._thread is None:
+            self._start()
+        with self._lock:
+            self._stats['submitted'] += 1
+            if self._stopped or (self._thread is not None and not self._thread.is_alive()):
+                self._stats['dropped'] += 1
+                return False
+            try:
+                self._queue.put_nowait(inputs)
+            except queue.Full:
+                self._stats['dropped'] += 1
+                if self._stats['dropped'] == 1 or self._stats['dropped'] % 1000 == 0:
+                    logger.warning('Submission queue full, %d submissions dropped.', self._stats['dropped'])
+                return False
+            self._stats['queue_high_water'] = max(self._stats['queue_high_water'], self._queue.qsize())
+        return True
+
+    def flush(self) -> None:
+        """
+        Block until submissions queued so far are written, or the writer
+        thread has died.
+
+        :return: None
+        """
+        thread = self._thread
+        if thread is None:
+            return
+        # Not Queue.join(), which would wait forever on a dead writer.
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks and thread.is_alive():
+                self._queue.all_tasks_done.wait(0.1)
+
+    def stop(self) -> None:
+        """
+        Write queued submissions, and stop the writer thread. Later
+        submissions are dropped.
+
+        :return: None
+        """
+        with self._lock:
+            self._stopped = True
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(_stop)  # Blocks until there's room, ie writes catch up.
+            thread.join()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        :return: Dict {'submitted', 'written', 'dropped', 'batches', 'errors',
+                       'queued', 'queue_high_water', 'max_queue': int}
+        """
+        with self._lock:
+            return {**self._stats, 'queued': self._queue.qsize(), 'max_queue': self.max_queue}
+
+    def _run(self) -> None:
+        try:
+            connection = connect(self.path)
+        except Exception:
+            logger.exception('Opening submissions database %s failed, submissions will be dropped.', self.path)
+            with self._lock:
+                self._stats['errors'] += 1
+                self._stopped = True
+            self._drop_queued()
+            return
+        try:
+            self._write_queued(connection)
+        finally:
+            connection.close()
+
+    def _drop_queued(self) -> None:
+        """
+        Drop submissions queued to a writer that can't write them, so
+        flush() doesn't wait on them.
+
+        :return: None
+        """
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not _stop:
+                with self._lock:
+                    self._stats['dropped'] += 1
+            self._queue.task_done()
+
+    def _write_queued(self, connection: sqlite3.Connection) -> None:
+        tables_created = False
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            batch = []
+            if item is _stop:
+                stopping = True
+            else:
+                batch.append(item)
+            deadline = time.monotonic() + self.flush_interval
+            while not stopping and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _stop:
+                    stopping = True
+                else:
+                    batch.append(item)
+            try:
+                if not tables_created:
+                    with connection:
+                        self.create_tables(connection)
+                    tables_created = True
+                if batch:
+                    self.write(connection, batch)
+            except Exception:
+                logger.exception('Writing %d submissions failed.', len(batch))
+                with self._lock:
+                    self._stats['errors'] += 1
+            else:
+                with self._lock:
+                    self._stats['written'] += len(batch)
+                    self._stats['batches'] += 1 if batch else 0
+            finally:
+                for _ in range(len(batch) + stopping):
+                    self._queue.task_done()
+
+    def create_tables(self, connection: sqlite3.Connection) -> None:
+        """
+        Create submissions and submission_rollups tables, if they don't exist.
+
+        :param connection: sqlite3.Connection
+        :return: None
+        """
+        connection.execute('CREATE TABLE IF NOT EXISTS submissions ('
+                           'id INTEGER PRIMARY KEY, '
+                           'birth_year INTEGER, '
+                           'illness TEXT NOT NULL, '
+                           'doses INTEGER, '
+                           'had_illness INTEGER, '
+                           'probability REAL, '
+                           'content_templates TEXT NOT NULL)')
+        created_rollups = connection.execute("SELECT name FROM sqlite_master "
+                                             "WHERE type = 'table' AND name = 'submission_rollups'").fetchone() is None
+        connection.execute('CREATE TABLE IF NOT EXISTS submission_rollups ('
+                           'illness TEXT NOT NULL, '
+                           'decade INTEGER NOT NULL, '
+                           'doses INTEGER NOT NULL, '
+                           'count INTEGER NOT NULL, '
+                           'probability_count INTEGER NOT NULL, '
+                           'probability_sum REAL NOT NULL, '
+                           + ''.join(f'{column} INTEGER NOT NULL, ' for column in bucket_columns) +
+                           'PRIMARY KEY (illness, decade, doses))')
+        if created_rollups:
+            rebuild_rollups(connection)  # Submissions written before rollups were kept.
+
+    def write(self, connection: sqlite3.Connection, batch: List[Dict[str, Any]]) -> None:
+        """
+        Write a batch of submissions, and update rollups, in one transaction.
+
+        :param connection: sqlite3.Connection
+        :param batch: List of submission inputs.
+        :return: None
+        """
+        rows = [row for inputs in batch for row in submission_rows(self.illnesses, inputs)]
+        with connection:
+            connection.executemany('INSERT INTO submissions '
+                                   '(birth_year, illness, doses, had_illness, probability, content_templates) '
+                                   'VALUES (?, ?, ?, ?, ?, ?)',
+                                   rows)
+            update_rollups(connection, rows)
+
+
+def update_rollups(connection: sqlite3.Connection, rows: List[Tuple]) -> None:
+    """
+    Add submission rows, see submission_rows(), to submission_rollups,
+    aggregating the rows in Python first, so each rollup row is updated
+    once per batch.
+
+    :param connection: sqlite3.Connection, in a transaction with the rows' INSERT.
+    :param rows: List of Tuple (birth_year, illness, doses, had_illness, probability, content_templates)
+    :return: None
+    """
+    rollup_rows: Dict[Tuple[str, int, int], List] = {}
+    for birth_year, illness, doses, _, probability, _ in rows:
+        key = (illness,
+               int(birth_year) // 10 * 10,
+               unknown_doses if doses is None else min(doses, max_table_vaccinations))
+        rollup = rollup_rows.setdefault(key, [0, 0, 0.0] + [0] * histogram_buckets)
+        rollup[0] += 1
+        if probability is not None:
+            rollup[1] += 1
+            rollup[2] += probability
+            rollup[3 + probability_bucket(probability)] += 1
+    columns = ['count', 'probability_count', 'probability_sum', *bucket_columns]
+    connection.executemany(f'INSERT INTO submission_rollups (illness, decade, doses, {", ".join(columns)}) '
+                           f'VALUES ({", ".join("?" * (3 + len(columns)))}) '
+                           f'ON CONFLICT (illness, decade, doses) DO UPDATE SET '
+                           + ', '.join(f'{column} = {column} + excluded.{column}' for column in columns),
+                           [(*key, *rollup) for key, rollup in rollup_rows.items()])
+
+
+def rebuild_rollups(connection: sqlite3.Connection) -> None:
+    """
+    Recompute submission_rollups from the submissions table.
+
+    :param connection: sqlite3.Connection
+    :return: None
+    """
+    connection.execute('DELETE FROM submission_rollups')
+    connection.execute(f'INSERT INTO submission_rollups '
+                       f'SELECT illness, birth_year / 10 * 10, '
+                       f'MIN(IFNULL(doses, {unknown_doses}), {max_table_vaccinations}), '
+                       f'COUNT(*), COUNT(probability), TOTAL(probability), '
+                       + ', '.join(f'COUNT(CASE WHEN {bucket_sql} = {bucket} THEN 1 END)'
+                                   for bucket in range(histogram_buckets)) +
+                       f' FROM submissions GROUP BY 1, 2, 3')
+
+
+def rollups(connection: sqlite3.Connection, illness: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Immunity distributions by illness, birth decade and doses, from
+    submission_rollups.
+
+    :param connection: sqlite3.Connection
+    :param illness: str, only this illness, default None, all illnesses.
+    :return: List of Dict {'illness': str, 'decade': int, 'doses': int, 'count': int,
+                           'mean_probability': float or None, 'histogram': List[int]}
+    """
+    query = (f'SELECT illness, decade, doses, count, probability_count, probability_sum, {", ".join(bucket_columns)} '
+             f'FROM submission_rollups {"WHERE illness = ? " if illness else ""}ORDER BY illness, decade, doses')
+    return [{'illness': row[0],
+             'decade': row[1],
+             'doses': row[2],
+             'count': row[3],
+             'mean_probability': row[5] / row[4] if row[4] else None,
+             'histogram': list(row[6:]),
+             }
+            for row in connection.execute(query, (illness,) if illness else ())]
@@ -28,9 +28,7 @@ def runner(app):
 @pytest.fixture
 def app_specific_illnesses():
     def _test_illnesses(illnesses):
-        # Enables testing with different configs, as setattrs persist.
-        from probable_immunity_web_app.forms import immunity_data_entry_form
-        from importlib import reload; reload(immunity_data_entry_form)
+        # Each app builds its own form class, so apps with different configs don't interact.
         app = create_app({
             'TESTING': True,
             'WTF_CSRF_ENABLED': False,
@@ -0,0 +1,112 @@
+"""Test year aware clock, and rebuilding year dependent tables on rollover."""
+import pytest
+
+import illnesses.common_helpers
+
+from illnesses import (measles,
+                       mumps,
+                       rubella,
+                       )
+from illnesses.clock import (YearClock,
+                             clock,
+                             start_of_year,
+                             year_of,
+                             )
+from illnesses.common_helpers import (current_year,
+                                      validate_birth_year,
+                                      )
+
+
+class FakeTime:
+    def __init__(self, timestamp):
+        self.timestamp = timestamp
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.timestamp
+
+
+@pytest.mark.parametrize('year', [1999, 2000, 2024, 2038])
+def test_start_of_year(year):
+    assert year_of(start_of_year(year)) == year
+    assert year_of(start_of_year(year) - 1) == year - 1
+
+
+def test_year_clock_rollover():
+    fake_time = FakeTime(start_of_year(2030) - 1)
+    year_clock = YearClock(fake_time)
+    rollovers = []
+    year_clock.on_rollover(rollovers.append)
+
+    assert year_clock.year == 2029
+    assert rollovers == []
+
+    fake_time.timestamp = start_of_year(2030)
+    assert year_clock.year == 2030
+    assert year_clock.year == 2030
+    assert rollovers == [2030]  # Called once.
+
+
+def test_year_clock_callbacks_read_new_year():
+    fake_time = FakeTime(start_of_year(2030) - 1)
+    year_clock = YearClock(fake_time)
+    read_years = []
+    year_clock.on_rollover(lambda year: read_years.append(year_clock.year))
+
+    fake_time.timestamp = start_of_year(2031) + 60
+    assert year_clock.year == 2031
+    assert read_years == [2031]
+
+
+def test_year_clock_callback_error_retried():
+    fake_time = FakeTime(start_of_year(2030) - 1)
+    year_clock = YearClock(fake_time)
+    rollovers = []
+
+    @year_clock.on_rollover
+    def failing_callback(year):
+        rollovers.append(year)
+        if len(rollovers) == 1:
+            raise RuntimeError
+
+    fake_time.timestamp = start_of_year(2030)
+    with pytest.raises(RuntimeError):
+        year_clock.year
+    assert year_clock.year == 2030
+    assert rollovers == [2030, 2030]
+
+
+@pytest.fixture
+def next_year(monkeypatch):
+    """Roll the shared clock over to next year, and back after the test."""
+    monkeypatch.setattr(clock, '_time', lambda: start_of_year(current_year + 1) + 1)
+    yield current_year + 1
+    monkeypatch.undo()
+    clock.refresh()
+
+
+def test_year_rollover_rebuilds_tables(next_year):
+    assert clock.year == next_year
+    assert illnesses.common_helpers.current_year == next_year
+    assert mumps.current_year == next_year
+    assert validate_birth_year(next_year) == next_year
+
+    # Tables cover the new year's births, and ages are a year older.
+    assert len(mumps.one_dose_immunity_by_age) == next_year - 1000 + 1
+    assert mumps.one_dose_immunity(1985) == mumps.waning_immunity(mumps.one_dose_init_immunity,
+                                                                  mumps.one_dose_waning_imm_exp_coeff,
+                                                                  next_year - 1985)
+    for illness in (measles, mumps, rubella):
+        assert illness.immunity(next_year, 2) == dict(zip(illness.immunity(next_year, 2),
+                                                          illness.evaluate_immunity(next_year, 2)))
+    assert (mumps.immunity(1985, 2)['probability_of_mumps_immunity']
+            == mumps.immunity_batch([1985], 2)['probability_of_mumps_immunity'][0]
+            < mumps.two_dose_immunity_by_age[current_year - 1985])
+
+
+def test_year_rollover_restored():
+    assert clock.year == current_year
+    assert len(mumps.decision_table) == len(measles.decision_table) == (current_year - 1000 + 1) * 8
+    with pytest.raises(ValueError):
+        validate_birth_year(current_year + 1)
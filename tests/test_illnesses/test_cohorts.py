@@ -0,0 +1,62 @@
+"""Test cohort level immunity from aggregated census cells."""
+from math import isclose
+
+import pytest
+
+from illnesses import (measles,
+                       mumps,
+                       rubella,
+                       )
+from illnesses.cohorts import cohort_immunity
+
+
+def test_cohort_immunity():
+    results = cohort_immunity(counts=[1200, 300, 10],
+                              birth_years=[1985, 1985, 1950],
+                              on_time_mumps_vaccinations=[2, 0, 0],
+                              mumps_illness=[False, True, False],
+                              illnesses=['mumps'])
+
+    expected_immune = (1200 * mumps.immunity(1985, 2)['probability_of_mumps_immunity']
+                       + 300 * mumps.immunity(1985, 0, True)['probability_of_mumps_immunity']
+                       + 10 * mumps.immunity(1950)['probability_of_mumps_immunity'])
+    assert list(results) == ['mumps']
+    assert results['mumps']['population'] == 1510
+    assert isclose(results['mumps']['expected_immune'], expected_immune)
+    assert isclose(results['mumps']['mean_probability_of_immunity'], expected_immune / 1510)
+
+
+def test_cohort_immunity_all_illnesses():
+    results = cohort_immunity(counts=[5, 5],
+                              birth_years=[2001, 2001],
+                              on_time_measles_vaccinations=[1, 1],
+                              rubella_vaccinations=[0, 1])
+
+    assert list(results) == ['measles', 'mumps', 'rubella']
+    assert isclose(results['measles']['expected_immune'],
+                   10 * measles.immunity(2001, 1)['probability_of_measles_immunity'])
+    assert isclose(results['mumps']['expected_immune'],
+                   10 * mumps.immunity(2001)['probability_of_mumps_immunity'])
+    assert isclose(results['rubella']['mean_probability_of_immunity'],
+                   (rubella.immunity(2001, 0)['probability_of_rubella_immunity']
+                    + rubella.immunity(2001, 1)['probability_of_rubella_immunity']) / 2)
+
+
+def test_cohort_immunity_no_population():
+    results = cohort_immunity(counts=[0], birth_years=[1985], illnesses=['measles'])
+    assert results['measles'] == {'population': 0, 'expected_immune': 0.0, 'mean_probability_of_immunity': None}
+
+
+@pytest.mark.parametrize('args, kwargs',
+                         [(([1, 2], [1985]), {}),  # Mismatched cells.
+                          (([-1], [1985]), {}),  # Negative count.
+                          (([1.5], [1985]), {}),  # Float count.
+                          (([1], [198]), {}),  # Invalid birth year.
+                          (([1], [1985]), {'on_time_mumps_vaccinations': [-1]}),  # Invalid shots.
+                          (([1], [1985]), {'illnesses': ['chickenpox']}),  # Unknown illness.
+                          (([1], [1985]), {'illnesses': ['measles'],
+                                           'on_time_mumps_vaccinations': [1]}),  # Column for other illness.
+                          ])
+def test_cohort_immunity_raising_value_error(args, kwargs):
+    with pytest.raises(ValueError):
+        cohort_immunity(*args, **kwargs)
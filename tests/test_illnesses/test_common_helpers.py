@@ -1,8 +1,21 @@
 """Test common helpers and validators."""
+import numpy as np
 import pytest
 
-from illnesses.common_helpers import (current_year,
+from illnesses import (measles,
+                       mumps,
+                       rubella,
+                       )
+from illnesses.common_helpers import (compile_decision_table,
+                                      current_year,
+                                      decision_index,
+                                      evaluate_unique,
+                                      illness_flags,
+                                      validate_as_of_year,
+                                      validate_as_of_years,
                                       validate_birth_year,
+                                      validate_birth_years,
+                                      validate_vaccinations,
                                       )
 
 
@@ -34,3 +47,145 @@ def test_validate_birth_year(test_birth_year, validated_birth_year):
 def test_validate_birth_year_raising_error(test_birth_year):
     with pytest.raises(ValueError):
         validate_birth_year(test_birth_year)
+
+
+@pytest.mark.parametrize('birth_year, as_of_year',
+                         [(current_year + 1, current_year + 1),  # Projected birth.
+                          (1985, 1985),
+                          (1985, 2035),
+                          pytest.param(1986, 1985, marks=pytest.mark.xfail),  # Born after as of year.
+                          ])
+def test_validate_birth_year_as_of_year(birth_year, as_of_year):
+    assert validate_birth_year(birth_year, as_of_year) == birth_year
+
+
+@pytest.mark.parametrize('as_of_year',
+                         [1000,
+                          current_year,
+                          current_year + 100,
+                          pytest.param(current_year + 101, marks=pytest.mark.xfail),  # Too far ahead.
+                          pytest.param(999, marks=pytest.mark.xfail),  # Too low/short.
+                          pytest.param(2030.0, marks=pytest.mark.xfail),  # Float.
+                          pytest.param('2030', marks=pytest.mark.xfail),  # String.
+                          pytest.param(True, marks=pytest.mark.xfail),  # Bool.
+                          ])
+def test_validate_as_of_year(as_of_year):
+    assert validate_as_of_year(as_of_year) == as_of_year
+
+
+def test_validate_as_of_years():
+    assert validate_as_of_years(None) is None
+    assert validate_as_of_years([1985, current_year + 100]).tolist() == [1985, current_year + 100]
+    for as_of_years in ([1985, current_year + 101], [999], [2030.0], ['2030']):
+        with pytest.raises(ValueError):
+            validate_as_of_years(as_of_years)
+
+
+def test_validate_birth_years_as_of_years():
+    birth_years = validate_birth_years(np.array([[1985], [2030]]), np.array([2030, 2035]))
+    assert birth_years.tolist() == [[1985, 1985], [2030, 2030]]
+    with pytest.raises(ValueError):
+        validate_birth_years([2031, 1985], np.array([2030, 2035]))
+
+
+def test_validate_birth_years():
+    assert validate_birth_years([1882, 1985, current_year]).tolist() == [1882, 1985, current_year]
+    assert validate_birth_years([]).tolist() == []
+
+
+@pytest.mark.parametrize(
+    'test_birth_years',
+    [['a', 1985],  # String birth_year.
+     [1957.0, 1985],  # Float birth year.
+     [-1989, 1985],  # Negative birth year
+     [198, 1985],  # Too low/short birth year.
+     [current_year + 1, 1985],  # Ensure future/too high value raises error.
+     ])
+def test_validate_birth_years_raising_error(test_birth_years):
+    with pytest.raises(ValueError):
+        validate_birth_years(test_birth_years)
+
+
+def test_validate_vaccinations():
+    applicable = np.array([True, True, False])
+    assert validate_vaccinations([2, 1.0, -3.5], applicable, 'error').tolist() == [2, 1, 0]
+    assert validate_vaccinations(None, applicable, 'error').tolist() == [0, 0, 0]
+
+
+def test_illness_flags():
+    assert illness_flags(None, (2,)).tolist() == [False, False]
+    assert illness_flags(True, (2,)).tolist() == [True, True]
+
+
+def test_evaluate_unique():
+    evaluated_rows = []
+
+    def batch_function(birth_years, vaccinations, illness):
+        evaluated_rows.append(len(birth_years))
+        assert vaccinations is None
+        return {'sum': birth_years + illness, 'birth_years': birth_years}
+
+    results = evaluate_unique(batch_function, [1985, 1950, 1985, 1985], None, [True, False, True, False])
+
+    assert evaluated_rows == [3]  # (1985, True) evaluated once.
+    assert results['sum'].tolist() == [1986, 1950, 1986, 1985]
+    assert results['birth_years'].dtype == np.array([1985]).dtype
+
+
+def test_evaluate_unique_sparse_keys(monkeypatch):
+    import illnesses.common_helpers
+    monkeypatch.setattr(illnesses.common_helpers, 'max_dense_keys', 0)
+
+    results = evaluate_unique(lambda values, labels: {'values': values, 'labels': labels},
+                              [1, 10 ** 9, 1, 5], ['a', 'b', 'a', 'c'])
+
+    assert results['values'].tolist() == [1, 10 ** 9, 1, 5]
+    assert results['labels'].tolist() == ['a', 'b', 'a', 'c']
+
+
+@pytest.mark.parametrize('birth_year, vaccinations, illness, index',
+                         [(1000, None, False, 0),
+                          (1000, 0, True, 1),
+                          (1000, '', False, 0),
+                          (1000, 1, False, 2),
+                          (1000, 3, False, 6),
+                          (1000, 12, True, 7),  # More than 2 shots clamped.
+                          (1001, 0, False, 8),
+                          (current_year, 0, False, (current_year - 1000) * 8),
+                          # Inputs needing validation.
+                          (current_year + 1, 0, False, None),
+                          (999, 0, False, None),
+                          (1985.0, 0, False, None),
+                          ('1985', 0, False, None),
+                          (np.int64(1985), 0, False, None),
+                          (1985, -1, False, None),
+                          (1985, 2.0, False, None),
+                          (1985, True, False, None),
+                          ])
+def test_decision_index(birth_year, vaccinations, illness, index):
+    assert decision_index(birth_year, vaccinations, illness) == index
+
+
+def test_compile_decision_table():
+    table = compile_decision_table(lambda birth_year, vaccinations, illness: (birth_year + vaccinations,
+                                                                              ['illness'] if illness else []))
+
+    assert len(table) == (current_year - 1000 + 1) * 8
+    assert table[decision_index(1985, 2, False)] == (1987, ())
+    assert table[decision_index(1985, 7, True)] == (1988, ('illness',))
+
+
+@pytest.mark.parametrize('illness', [measles, mumps, rubella])
+def test_decision_table_matches_evaluate_immunity(illness):
+    for birth_year in range(1000, current_year + 1):
+        for vaccinations in range(5):
+            for had_illness in (False, True):
+                probability, templates = illness.evaluate_immunity(birth_year, vaccinations, had_illness)
+                result = illness.immunity(birth_year, vaccinations, had_illness)
+                assert list(result.values()) == [probability, templates]
+
+
+@pytest.mark.parametrize('illness', [measles, mumps, rubella])
+def test_decision_table_templates_not_shared(illness):
+    illness.immunity(1985, 2)['content_templates'].append('mutated')
+    assert 'mutated' not in illness.immunity(1985, 2)['content_templates']
@@ -0,0 +1,95 @@
+"""Test exporting every valid illness input to SQLite and CSV lookup tables."""
+import csv
+import sqlite3
+
+import pytest
+
+from illnesses import (measles,
+                       mumps,
+                       rubella,
+                       )
+from illnesses.common_helpers import (current_year,
+                                      max_table_vaccinations,
+                                      min_birth_year,
+                                      )
+from illnesses.export import (export_csv,
+                              export_sqlite,
+                              fieldnames,
+                              lookup_rows,
+                              main,
+                              model_version,
+                              )
+from illnesses.registry import illness_registry
+
+rows_per_illness = (current_year - min_birth_year + 1) * (max_table_vaccinations + 1) * 2
+
+
+def test_model_version():
+    assert model_version() == model_version()
+    assert len(model_version()) == 64
+
+
+def test_lookup_rows():
+    rows = list(lookup_rows([illness_registry['mumps']], 'version'))
+    assert len(rows) == rows_per_illness
+    assert rows[0] == ('mumps', min_birth_year, 0, 0, *mumps.evaluate_immunity(min_birth_year, 0, False)[:1],
+                       '|'.join(mumps.evaluate_immunity(min_birth_year, 0, False)[1]), 'version', current_year)
+    assert rows[-1][1:4] == (current_year, max_table_vaccinations, 1)
+
+
+@pytest.mark.parametrize('module', [measles, mumps, rubella])
+@pytest.mark.parametrize('birth_year, doses, had_illness', [(1950, 0, 0), (1966, 1, 0), (1985, 2, 1),
+                                                             (2000, 3, 0), (current_year, 2, 0)])
+def test_export_sqlite(tmp_path, module, birth_year, doses, had_illness):
+    path = tmp_path / 'lookup.sqlite'
+    assert export_sqlite(path, illness_registry.values(), model_version()) == 3 * rows_per_illness
+    name = module.__name__.split('.')[-1]
+    expected = module.immunity(birth_year, doses, bool(had_illness))
+    with sqlite3.connect(path) as connection:
+        row = connection.execute('SELECT probability, content_templates, model_version, as_of_year '
+                                 'FROM immunity_lookup '
+                                 'WHERE illness = ? AND birth_year = ? AND doses = ? AND had_illness = ?',
+                                 (name, birth_year, doses, had_illness)).fetchone()
+        assert row == (expected[f'probability_of_{name}_immunity'], '|'.join(expected['content_templates']),
+                       model_version(), current_year)
+        assert dict(connection.execute('SELECT key, value FROM export_metadata'))['model_version'] == model_version()
+
+
+def test_export_sqlite_replaces_previous_export_and_joins(tmp_path):
+    path = tmp_path / 'lookup.sqlite'
+    export_sqlite(path, illness_registry.values(), 'old')
+    export_sqlite(path, [illness_registry['measles']], 'new')
+    with sqlite3.connect(path) as connection:
+        assert connection.execute('SELECT COUNT(*), MIN(model_version) FROM immunity_lookup').fetchone() == (
+            rows_per_illness, 'new')
+        # Joins use the primary key, rather than scanning.
+        connection.execute('CREATE TABLE people (birth_year INTEGER, doses INTEGER, had_measles INTEGER)')
+        plan = connection.execute('EXPLAIN QUERY PLAN SELECT probability FROM people JOIN immunity_lookup '
+                                  "ON illness = 'measles' AND immunity_lookup.birth_year = people.birth_year "
+                                  'AND immunity_lookup.doses = MIN(people.doses, 3) '
+                                  'AND had_illness = people.had_measles').fetchall()
+        assert any('USING PRIMARY KEY' in step[-1] for step in plan)
+
+
+def test_export_csv(tmp_path):
+    path = tmp_path / 'lookup.csv'
+    assert export_csv(path, [illness_registry['rubella']], 'version') == rows_per_illness
+    with open(path, newline='', encoding='utf-8') as csv_file:
+        rows = list(csv.DictReader(csv_file))
+    assert list(rows[0]) == fieldnames
+    row = next(row for row in rows if row['birth_year'] == '1985' and row['doses'] == '1')
+    expected = rubella.immunity(1985, 1, bool(int(row['had_illness'])))
+    assert float(row['probability']) == expected['probability_of_rubella_immunity']
+    assert row['content_templates'].split('|') == expected['content_templates']
+
+
+def test_main(tmp_path, capsys):
+    assert main(['--sqlite', str(tmp_path / 'lookup.sqlite'), '--csv', str(tmp_path / 'lookup.csv'),
+                 '--illness', 'mumps']) == 0
+    assert f'Wrote {rows_per_illness} rows' in capsys.readouterr().err
+    assert (tmp_path / 'lookup.csv').exists()
+
+
+def test_main_requires_output():
+    with pytest.raises(SystemExit):
+        main([])
@@ -0,0 +1,71 @@
+"""Test combined measles, mumps and rubella immunity evaluator."""
+import pytest
+
+from illnesses import (measles,
+                       mumps,
+                       rubella,
+                       )
+from illnesses.common_helpers import current_year
+from illnesses.mmr import immunity
+
+
+@pytest.mark.parametrize('birth_year', [1900, 1956, 1957, 1985, current_year])
+@pytest.mark.parametrize('vaccinations', [None, 0, 1, 2, 3, 2.0])
+@pytest.mark.parametrize('illness', [False, True])
+def test_immunity_matches_illness_immunity(birth_year, vaccinations, illness):
+    results = immunity(birth_year,
+                       on_time_measles_vaccinations=vaccinations,
+                       on_time_mumps_vaccinations=vaccinations,
+                       rubella_vaccinations=vaccinations,
+                       measles_illness=illness,
+                       mumps_illness=illness,
+                       rubella_illness=illness,
+                       )
+
+    assert results == {'measles': measles.immunity(birth_year, vaccinations, illness),
+                       'mumps': mumps.immunity(birth_year, vaccinations, illness),
+                       'rubella': rubella.immunity(birth_year, vaccinations, illness),
+                       }
+
+
+def test_immunity_defaults():
+    assert immunity(1985) == {'measles': measles.immunity(1985),
+                              'mumps': mumps.immunity(1985),
+                              'rubella': rubella.immunity(1985),
+                              }
+
+
+@pytest.mark.parametrize('birth_year, person',
+                         [('a', {}),  # String birth_year.
+                          (1957.6, {}),  # Float birth_year.
+                          (198, {}),  # Too low/short birth year.
+                          (current_year + 1, {}),  # Future birth year.
+                          (1985, {'on_time_mumps_vaccinations': -1}),  # Negative shots.
+                          (1985, {'rubella_vaccinations': 1.5}),  # Float shots.
+                          # Shots not used are not validated, as in illness immunity().
+                          pytest.param(1950, {'on_time_mumps_vaccinations': -1}, marks=pytest.mark.xfail),
+                          ])
+def test_immunity_raising_value_error(birth_year, person):
+    with pytest.raises(ValueError):
+        immunity(birth_year, **person)
+
+
+@pytest.mark.parametrize('birth_year, as_of_year', [(1950, 2030), (1985, 2030), (1985, 1990), (2028, 2035)])
+@pytest.mark.parametrize('vaccinations', [None, 1, 2, 3])
+def test_immunity_as_of_year(birth_year, vaccinations, as_of_year):
+    results = immunity(birth_year,
+                       on_time_measles_vaccinations=vaccinations,
+                       on_time_mumps_vaccinations=vaccinations,
+                       rubella_vaccinations=vaccinations,
+                       as_of_year=as_of_year)
+
+    assert results == {'measles': measles.immunity(birth_year, vaccinations, as_of_year=as_of_year),
+                       'mumps': mumps.immunity(birth_year, vaccinations, as_of_year=as_of_year),
+                       'rubella': rubella.immunity(birth_year, vaccinations, as_of_year=as_of_year),
+                       }
+
+
+@pytest.mark.parametrize('birth_year, as_of_year', [(1985, 999), (2031, 2030), (1985, '2030')])
+def test_immunity_as_of_year_raising_value_error(birth_year, as_of_year):
+    with pytest.raises(ValueError):
+        immunity(birth_year, as_of_year=as_of_year)
@@ -1,17 +1,27 @@
-from math import isclose
+from math import e, isclose
 
+import numpy as np
 import pytest
 
 import illnesses
 
-from illnesses.mumps import (current_year,
+from illnesses.common_helpers import compile_decision_table
+
+from illnesses.mumps import (content_templates_by_code,
+                             current_year,
                              conferred_immunity,
                              immunity,
+                             immunity_batch,
                              natural_immunity,
                              one_dose_immunity,
+                             one_dose_immunity_by_age,
                              one_dose_init_immunity,
+                             one_dose_waning_imm_exp_coeff,
                              two_dose_immunity,
+                             two_dose_immunity_by_age,
                              two_dose_init_immunity,
+                             two_dose_waning_imm_exp_coeff,
+                             waning_immunity,
                              )
 
 
@@ -30,6 +40,7 @@ from illnesses.mumps import (current_year,
         # Pre 1957
         (1956, 0.5),
         (1950, 0.5),
+        (1985.0, 0.5),  # Float birth year.
 
     ])
 def test_one_dose_immunity(birth_year, probability_of_immunity):
@@ -51,6 +62,7 @@ def test_one_dose_immunity(birth_year, probability_of_immunity):
                              # Pre 1957
                              (1956, 0.5),
                              (1950, 0.5),
+                             (1985.0, 0.5),  # Float birth year.
 
                          ])
 def test_two_dose_immunity(birth_year, probability_of_immunity):
@@ -58,6 +70,43 @@ def test_two_dose_immunity(birth_year, probability_of_immunity):
                    abs_tol=0.499)
 
 
+@pytest.mark.parametrize('birth_year', [1985.0, 1985.5, float(current_year)])
+def test_dose_immunity_float_birth_year(birth_year):
+    assert one_dose_immunity(birth_year) == waning_immunity(one_dose_init_immunity, one_dose_waning_imm_exp_coeff,
+                                                            current_year - birth_year)
+    assert two_dose_immunity(birth_year) == waning_immunity(two_dose_init_immunity, two_dose_waning_imm_exp_coeff,
+                                                            current_year - birth_year)
+
+
+@pytest.mark.parametrize('age, years_after_age_six',
+                         [(0, 0),
+                          (6, 0),
+                          (7, 1),
+                          (40, 34),
+                          (-3, 0),  # Born in the future.
+                          ])
+def test_waning_immunity(age, years_after_age_six):
+    assert isclose(waning_immunity(0.9, -0.03, age), 0.9 * e ** (-0.03 * years_after_age_six))
+
+
+@pytest.mark.parametrize('immunity_by_age, init_immunity, waning_imm_exp_coeff',
+                         [(one_dose_immunity_by_age, one_dose_init_immunity, one_dose_waning_imm_exp_coeff),
+                          (two_dose_immunity_by_age, two_dose_init_immunity, two_dose_waning_imm_exp_coeff),
+                          ])
+def test_immunity_by_age_tables(immunity_by_age, init_immunity, waning_imm_exp_coeff):
+    # Table covers every valid birth year.
+    assert len(immunity_by_age) == current_year - 1000 + 1
+    for age in (0, 6, 7, 50, len(immunity_by_age) - 1):
+        assert immunity_by_age[age] == waning_immunity(init_immunity, waning_imm_exp_coeff, age)
+
+
+def test_dose_immunity_outside_table():
+    assert one_dose_immunity(current_year + 3) == one_dose_init_immunity
+    assert two_dose_immunity(current_year + 3) == two_dose_init_immunity
+    assert one_dose_immunity(900) == waning_immunity(one_dose_init_immunity, one_dose_waning_imm_exp_coeff,
+                                                     current_year - 900)
+
+
 class TestImmunity:
     @pytest.mark.parametrize(
         'args, kwargs, returned_dict',
@@ -425,6 +474,9 @@ class TestImmunity:
 
         monkeypatch.setattr(illnesses.mumps, 'one_dose_immunity', mocked_one_dose_immunity)
         monkeypatch.setattr(illnesses.mumps, 'two_dose_immunity', mocked_two_dose_immunity)
+        # Recompile decision table from mocked implementations.
+        monkeypatch.setattr(illnesses.mumps, 'decision_table',
+                            compile_decision_table(illnesses.mumps.evaluate_immunity))
 
         assert immunity(*args, **kwargs) == returned_dict
 
@@ -527,3 +579,132 @@ class TestImmunity:
     def test_immunity_on_time_mumps_vaccinations_raising_value_error(self, args):
         with pytest.raises(ValueError):
             immunity(**args)
+
+
+@pytest.mark.parametrize('birth_year, shots, as_of_year',
+                         [(1985, 1, 2030),
+                          (1985, 2, 2035),
+                          (2020, 3, current_year + 100),
+                          (current_year + 5, 2, current_year + 10),  # Projected birth.
+                          (1985, 2, 1990),  # Historical.
+                          ])
+def test_immunity_as_of_year(birth_year, shots, as_of_year):
+    init_immunity, coeff = ((one_dose_init_immunity, one_dose_waning_imm_exp_coeff) if shots == 1
+                            else (two_dose_init_immunity, two_dose_waning_imm_exp_coeff))
+
+    result = immunity(birth_year, shots, as_of_year=as_of_year)
+
+    assert isclose(result['probability_of_mumps_immunity'],
+                   waning_immunity(init_immunity, coeff, as_of_year - birth_year))
+    assert result['content_templates'] == immunity(1985, shots)['content_templates']
+
+
+def test_immunity_as_of_current_year():
+    for shots in range(4):
+        assert immunity(1985, shots, as_of_year=current_year) == immunity(1985, shots)
+
+
+@pytest.mark.parametrize('birth_year, as_of_year',
+                         [(1985, current_year + 101),  # Too far ahead.
+                          (1985, 999),  # Too low/short.
+                          (1985, 2030.0),  # Float.
+                          (2031, 2030),  # Born after as of year.
+                          ])
+def test_immunity_as_of_year_raising_value_error(birth_year, as_of_year):
+    with pytest.raises(ValueError):
+        immunity(birth_year, 2, as_of_year=as_of_year)
+
+
+class TestImmunityBatch:
+    def test_immunity_batch_matches_immunity(self):
+        birth_years, vaccinations, illness = np.meshgrid(np.arange(1900, current_year + 1),
+                                                         np.arange(0, 5),
+                                                         [False, True])
+        birth_years, vaccinations, illness = birth_years.ravel(), vaccinations.ravel(), illness.ravel()
+
+        results = immunity_batch(birth_years, vaccinations, illness)
+
+        for row, (birth_year, shots, had_mumps) in enumerate(zip(birth_years.tolist(),
+                                                                vaccinations.tolist(),
+                                                                illness.tolist())):
+            expected = immunity(birth_year, shots, had_mumps)
+            assert isclose(results['probability_of_mumps_immunity'][row],
+                           expected['probability_of_mumps_immunity'])
+            assert (list(content_templates_by_code[results['content_template_codes'][row]])
+                    == expected['content_templates'])
+
+    @pytest.mark.parametrize('vaccinations, illness',
+                             [(np.random.default_rng(0).integers(0, 5, 1000), np.arange(1000) % 7 == 0),
+                              (np.random.default_rng(1).integers(0, 5, 1000).astype(float), None),
+                              (None, True),
+                              (2, False),
+                              ])
+    def test_immunity_batch_deduplicate(self, vaccinations, illness):
+        birth_years = np.random.default_rng(2).integers(1900, current_year + 1, 1000)
+
+        results = immunity_batch(birth_years, vaccinations, illness)
+        deduplicated_results = immunity_batch(birth_years, vaccinations, illness, deduplicate=True)
+
+        assert results.keys() == deduplicated_results.keys()
+        for name in results:
+            assert (results[name] == deduplicated_results[name]).all()
+            assert results[name].dtype == deduplicated_results[name].dtype
+
+    def test_immunity_batch_defaults(self):
+        results = immunity_batch([1950, 1985])
+        assert results['probability_of_mumps_immunity'].tolist() == [
+            immunity(1950)['probability_of_mumps_immunity'],
+            immunity(1985)['probability_of_mumps_immunity'],
+        ]
+
+    def test_immunity_batch_broadcasts_scalars(self):
+        results = immunity_batch([1985, 2001], 2, False)
+        assert (list(content_templates_by_code[results['content_template_codes'][1]])
+                == immunity(2001, 2, False)['content_templates'])
+
+    @pytest.mark.parametrize('args',
+                             [([1985, 'a'], ),  # String birth year.
+                              ([1985, 1957.0], ),  # Float birth year.
+                              ([1985, 198], ),  # Too low birth year.
+                              ([1985, current_year + 1], ),  # Future birth year.
+                              ([1985, 1990], [1, -1]),  # Negative shots.
+                              ([1985, 1990], [1, 1.5]),  # Float shots.
+                              ([1985, 1990], ['1', 'two']),  # String shots.
+                              ([1985, None], ),  # Missing birth year.
+                              ([1985, 1990], [2, None]),  # Missing shots.
+                              # Shots are not validated where not used.
+                              pytest.param(([1950, 1990], [-1, 1]), marks=pytest.mark.xfail),
+                              pytest.param(([1985, 1990], [-1, 1], [True, False]), marks=pytest.mark.xfail),
+                              pytest.param(([1985, 1990], [2.0, 1]), marks=pytest.mark.xfail),
+                              ])
+    def test_immunity_batch_raising_value_error(self, args):
+        with pytest.raises(ValueError):
+            immunity_batch(*args)
+        with pytest.raises(ValueError):
+            immunity_batch(*args, deduplicate=True)
+
+    def test_immunity_batch_as_of_years_grid(self):
+        birth_years = np.arange(1950, current_year + 1)
+        as_of_years = np.array([current_year, 2030, 2035, current_year + 100])
+
+        results = immunity_batch(birth_years[:, np.newaxis], 2, as_of_years=as_of_years)
+        deduplicated_results = immunity_batch(birth_years[:, np.newaxis], 2, as_of_years=as_of_years,
+                                              deduplicate=True)
+
+        probabilities = results['probability_of_mumps_immunity']
+        assert probabilities.shape == results['content_template_codes'].shape == (len(birth_years), 4)
+        assert (probabilities == deduplicated_results['probability_of_mumps_immunity']).all()
+        assert (probabilities[:, 0] == immunity_batch(birth_years, 2)['probability_of_mumps_immunity']).all()
+        for row, birth_year in enumerate(birth_years.tolist()):
+            for column, as_of_year in enumerate(as_of_years.tolist()):
+                assert isclose(probabilities[row, column],
+                               immunity(birth_year, 2, as_of_year=as_of_year)['probability_of_mumps_immunity'])
+
+    @pytest.mark.parametrize('birth_years, as_of_years',
+                             [([1985, 2031], 2030),  # Born after as of year.
+                              ([1985], [current_year + 101]),  # Too far ahead.
+                              ([1985], [2030.0]),  # Float.
+                              ])
+    def test_immunity_batch_as_of_years_raising_value_error(self, birth_years, as_of_years):
+        with pytest.raises(ValueError):
+            immunity_batch(birth_years, 2, as_of_years=as_of_years)
@@ -0,0 +1,160 @@
+"""Test binary person record format."""
+import numpy as np
+import pytest
+
+from illnesses.records import (convert_csv,
+                               csv_row_to_record,
+                               file_header,
+                               invalid_illness,
+                               invalid_record,
+                               invalid_vaccinations,
+                               main,
+                               parse_bool,
+                               parse_number,
+                               person_record_dtype,
+                               read_person_records,
+                               )
+
+csv_roster = ('id,birth_year,on_time_measles_vaccinations,measles_illness,'
+              'on_time_mumps_vaccinations,mumps_illness,rubella_vaccinations,rubella_illness\n'
+              '1,1985,2,False,2,False,1,False\n'
+              '2,1950,,,,,,\n'
+              '3,2001,1000,yes,0,0,1.0,1\n')
+
+
+@pytest.mark.parametrize('value, parsed',
+                         [('1985', 1985),
+                          (' 2 ', 2),
+                          ('2.0', 2.0),
+                          ('', None),
+                          ('two', 'two'),  # Left for immunity() to reject.
+                          (3, 3),
+                          (None, None),
+                          ])
+def test_parse_number(value, parsed):
+    assert parse_number(value) == parsed
+
+
+@pytest.mark.parametrize('value, parsed',
+                         [('True', True),
+                          ('yes', True),
+                          ('1', True),
+                          ('False', False),
+                          ('0', False),
+                          ('', False),
+                          (True, True),
+                          (None, False),
+                          pytest.param('maybe', False, marks=pytest.mark.xfail(raises=ValueError)),
+                          ])
+def test_parse_bool(value, parsed):
+    assert parse_bool(value) == parsed
+
+
+def test_person_record_dtype():
+    assert person_record_dtype.itemsize == 8
+    assert person_record_dtype.names == ('birth_year',
+                                         'on_time_measles_vaccinations',
+                                         'on_time_mumps_vaccinations',
+                                         'rubella_vaccinations',
+                                         'measles_illness',
+                                         'mumps_illness',
+                                         'rubella_illness',
+                                         )
+
+
+@pytest.mark.parametrize('row, record',
+                         [({'birth_year': '1985'}, (1985, 0, 0, 0, False, False, False)),
+                          ({'birth_year': '1985', 'on_time_measles_vaccinations': '2.0', 'mumps_illness': 'True',
+                            'rubella_vaccinations': '300'}, (1985, 2, 0, 253, False, True, False)),
+                          ])
+def test_csv_row_to_record(row, record):
+    assert csv_row_to_record(row) == record
+
+
+@pytest.mark.parametrize('row, record',
+                         [({'birth_year': '1985', 'on_time_mumps_vaccinations': '-1'},  # Negative shots.
+                           (1985, 0, invalid_vaccinations, 0, False, False, False)),
+                          ({'birth_year': '1985', 'on_time_mumps_vaccinations': '1.5'},  # Float shots.
+                           (1985, 0, invalid_vaccinations, 0, False, False, False)),
+                          ({'birth_year': '1950', 'on_time_measles_vaccinations': 'two'},  # String shots.
+                           (1950, invalid_vaccinations, 0, 0, False, False, False)),
+                          ({'birth_year': '1985', 'mumps_illness': 'maybe', 'on_time_mumps_vaccinations': '2'},
+                           (1985, 0, invalid_illness, 0, False, False, False)),  # Unrecognised illness.
+                          ])
+def test_csv_row_to_record_invalid_illness_data(row, record):
+    errors = []
+    assert csv_row_to_record(row, errors) == record
+    assert len(errors) == 1
+
+
+@pytest.mark.parametrize('row',
+                         [{'birth_year': ''},  # No birth year.
+                          {'birth_year': 'abc'},  # String birth year.
+                          {'birth_year': '1985.5'},  # Float birth year.
+                          {'birth_year': '-1985'},  # Negative birth year.
+                          ])
+def test_csv_row_to_record_raising_value_error(row):
+    with pytest.raises(ValueError):
+        csv_row_to_record(row)
+
+
+def test_convert_csv_read_person_records(tmp_path):
+    roster, record_file = tmp_path / 'roster.csv', tmp_path / 'roster.pirec'
+    roster.write_text(csv_roster)
+
+    assert convert_csv(roster, record_file, chunk_size=2) == 3
+    assert record_file.stat().st_size == len(file_header) + 3 * person_record_dtype.itemsize
+
+    records = read_person_records(record_file)
+    assert isinstance(records, np.memmap)
+    assert records['birth_year'].tolist() == [1985, 1950, 2001]
+    assert records['on_time_measles_vaccinations'].tolist() == [2, 0, 253]
+    assert records['measles_illness'].tolist() == [False, False, True]
+    assert records['rubella_vaccinations'].tolist() == [1, 0, 1]
+
+
+@pytest.mark.parametrize('bad_row, record',
+                         [('4,abc,,,,,,', invalid_record),
+                          ('4,1985,,maybe,,,,', (1985, invalid_illness, 0, 0, False, False, False)),
+                          ('4,1985,two,,2,,1,', (1985, invalid_vaccinations, 2, 1, False, False, False)),
+                          ])
+def test_convert_csv_bad_row_stored_invalid(tmp_path, bad_row, record):
+    roster, record_file = tmp_path / 'roster.csv', tmp_path / 'roster.pirec'
+    roster.write_text(csv_roster + bad_row + '\n' + '5,1990,1,,,,,\n')
+    invalid = []
+
+    assert convert_csv(roster, record_file, on_invalid=lambda line, error: invalid.append(line)) == 5
+
+    records = read_person_records(record_file)
+    assert records[3].tolist() == record
+    assert records['birth_year'].tolist() == [1985, 1950, 2001, record[0], 1990]  # Row order kept.
+    assert invalid == [5]
+
+
+def test_read_person_records_empty(tmp_path):
+    roster, record_file = tmp_path / 'roster.csv', tmp_path / 'roster.pirec'
+    roster.write_text(csv_roster.splitlines()[0] + '\n')
+
+    assert convert_csv(roster, record_file) == 0
+    assert len(read_person_records(record_file)) == 0
+
+
+def test_read_person_records_not_record_file(tmp_path):
+    roster = tmp_path / 'roster.csv'
+    roster.write_text(csv_roster)
+
+    with pytest.raises(ValueError):
+        read_person_records(roster)
+
+
+def test_main(tmp_path, capsys):
+    roster, record_file = tmp_path / 'roster.csv', tmp_path / 'roster.pirec'
+    roster.write_text(csv_roster)
+    assert main([str(roster), str(record_file)]) == 0
+    assert 'Wrote 3 records' in capsys.readouterr().err
+
+    roster.write_text(csv_roster + '4,abc,,,,,,\n')
+    assert main([str(roster), str(record_file)]) == 0
+    err = capsys.readouterr().err
+    assert 'Line 5' in err
+    assert 'Wrote 4 records (1 with invalid data)' in err
@@ -1,7 +1,13 @@
+from math import isclose
+
+import numpy as np
 import pytest
 
-from illnesses.rubella import (conferred_immunity,
+from illnesses.common_helpers import current_year
+from illnesses.rubella import (content_templates_by_code,
+                               conferred_immunity,
                                immunity,
+                               immunity_batch,
                                vaccinated_immunity,
                                unvaccinated_immunity,
                                )
@@ -322,3 +328,92 @@ class TestImmunity:
     def test_immunity_rubella_vaccinations_raising_value_error(self, args):
         with pytest.raises(ValueError):
             immunity(**args)
+
+
+class TestImmunityBatch:
+    def test_immunity_batch_matches_immunity(self):
+        birth_years, vaccinations, illness = np.meshgrid(np.arange(1900, current_year + 1),
+                                                         np.arange(0, 5),
+                                                         [False, True])
+        birth_years, vaccinations, illness = birth_years.ravel(), vaccinations.ravel(), illness.ravel()
+
+        results = immunity_batch(birth_years, vaccinations, illness)
+
+        for row, (birth_year, shots, had_rubella) in enumerate(zip(birth_years.tolist(),
+                                                                vaccinations.tolist(),
+                                                                illness.tolist())):
+            expected = immunity(birth_year, shots, had_rubella)
+            assert isclose(results['probability_of_rubella_immunity'][row],
+                           expected['probability_of_rubella_immunity'])
+            assert (list(content_templates_by_code[results['content_template_codes'][row]])
+                    == expected['content_templates'])
+
+    @pytest.mark.parametrize('vaccinations, illness',
+                             [(np.random.default_rng(0).integers(0, 5, 1000), np.arange(1000) % 7 == 0),
+                              (np.random.default_rng(1).integers(0, 5, 1000).astype(float), None),
+                              (None, True),
+                              (2, False),
+                              ])
+    def test_immunity_batch_deduplicate(self, vaccinations, illness):
+        birth_years = np.random.default_rng(2).integers(1900, current_year + 1, 1000)
+
+        results = immunity_batch(birth_years, vaccinations, illness)
+        deduplicated_results = immunity_batch(birth_years, vaccinations, illness, deduplicate=True)
+
+        assert results.keys() == deduplicated_results.keys()
+        for name in results:
+            assert (results[name] == deduplicated_results[name]).all()
+            assert results[name].dtype == deduplicated_results[name].dtype
+
+    def test_immunity_batch_defaults(self):
+        results = immunity_batch([1950, 1985])
+        assert results['probability_of_rubella_immunity'].tolist() == [
+            immunity(1950)['probability_of_rubella_immunity'],
+            immunity(1985)['probability_of_rubella_immunity'],
+        ]
+
+    def test_immunity_batch_broadcasts_scalars(self):
+        results = immunity_batch([1985, 2001], 2, False)
+        assert (list(content_templates_by_code[results['content_template_codes'][1]])
+                == immunity(2001, 2, False)['content_templates'])
+
+    @pytest.mark.parametrize('args',
+                             [([1985, 'a'], ),  # String birth year.
+                              ([1985, 1957.0], ),  # Float birth year.
+                              ([1985, 198], ),  # Too low birth year.
+                              ([1985, current_year + 1], ),  # Future birth year.
+                              ([1985, 1990], [1, -1]),  # Negative shots.
+                              ([1985, 1990], [1, 1.5]),  # Float shots.
+                              ([1985, 1990], ['1', 'two']),  # String shots.
+                              ([1985, None], ),  # Missing birth year.
+                              ([1985, 1990], [2, None]),  # Missing shots.
+                              # Shots are not validated where not used.
+                              pytest.param(([1950, 1990], [-1, 1]), marks=pytest.mark.xfail),
+                              pytest.param(([1985, 1990], [-1, 1], [True, False]), marks=pytest.mark.xfail),
+                              pytest.param(([1985, 1990], [2.0, 1]), marks=pytest.mark.xfail),
+                              ])
+    def test_immunity_batch_raising_value_error(self, args):
+        with pytest.raises(ValueError):
+            immunity_batch(*args)
+        with pytest.raises(ValueError):
+            immunity_batch(*args, deduplicate=True)
+
+    def test_immunity_batch_as_of_years_grid(self):
+        birth_years = np.arange(1950, current_year + 1)
+        as_of_years = np.array([current_year, current_year + 10])
+
+        results = immunity_batch(birth_years[:, np.newaxis], 2, as_of_years=as_of_years)
+
+        probabilities = results['probability_of_rubella_immunity']
+        assert probabilities.shape == (len(birth_years), 2)
+        # Immunity does not change with time.
+        assert (probabilities == immunity_batch(birth_years, 2)['probability_of_rubella_immunity'][:, np.newaxis]).all()
+
+
+@pytest.mark.parametrize('birth_year, as_of_year',
+                         [(1985, 2035),
+                          (current_year + 5, current_year + 10),  # Projected birth.
+                          pytest.param(2031, 2030, marks=pytest.mark.xfail),  # Born after as of year.
+                          ])
+def test_immunity_as_of_year(birth_year, as_of_year):
+    assert immunity(birth_year, 2, as_of_year=as_of_year) == immunity(1985, 2)
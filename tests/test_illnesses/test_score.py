@@ -0,0 +1,235 @@
+"""Test roster scorer command line entry point."""
+import io
+import json
+
+import pytest
+
+from illnesses import (measles,
+                       mumps,
+                       rubella,
+                       )
+from illnesses.records import convert_csv, read_person_records
+from illnesses.registry import illness_registry
+from illnesses.score import (infer_format,
+                             main,
+                             read_records,
+                             score_chunk,
+                             score_person_records,
+                             score_record,
+                             score_to_stream,
+                             write_records,
+                             )
+
+csv_roster = ('id,birth_year,on_time_measles_vaccinations,measles_illness,'
+              'on_time_mumps_vaccinations,mumps_illness,rubella_vaccinations,rubella_illness\n'
+              '1,1985,2,False,2,False,1,False\n'
+              '2,1950,,,,,,\n'
+              '3,abc,1,,1,,1,\n')
+
+
+def test_score_record():
+    scored = score_record({'id': 'a',
+                           'birth_year': '1985',
+                           'on_time_measles_vaccinations': '2',
+                           'on_time_mumps_vaccinations': '1',
+                           'rubella_illness': 'True'},
+                          illness_registry.values())
+
+    assert scored['id'] == 'a'
+    assert scored['probability_of_measles_immunity'] == measles.immunity(1985, 2)['probability_of_measles_immunity']
+    assert scored['measles_content_templates'] == measles.immunity(1985, 2)['content_templates']
+    assert scored['probability_of_mumps_immunity'] == mumps.immunity(1985, 1)['probability_of_mumps_immunity']
+    assert scored['rubella_content_templates'] == rubella.immunity(1985, None, True)['content_templates']
+
+
+def test_score_record_bad_data():
+    scored = score_record({'birth_year': '1985',
+                           'on_time_measles_vaccinations': '1.5',
+                           'on_time_mumps_vaccinations': '1'},
+                          [illness_registry['measles'], illness_registry['mumps']])
+
+    assert scored['probability_of_measles_immunity'] == 'Unknown'
+    assert scored['measles_content_templates'] == ['immunity_results_error_message']
+    assert scored['probability_of_mumps_immunity'] == mumps.immunity(1985, 1)['probability_of_mumps_immunity']
+    assert 'probability_of_rubella_immunity' not in scored
+
+
+def test_read_records_jsonl():
+    stream = io.StringIO('{"birth_year": 1985}\n\n{"birth_year": 1950}\n')
+    assert list(read_records(stream, 'jsonl')) == [{'birth_year': 1985}, {'birth_year': 1950}]
+
+
+def test_read_records_jsonl_invalid_lines():
+    stream = io.StringIO('{"birth_year": 1985}\n{"birth_year": \n[1, 2]\n' + '[' * 100_000 + '\n{"birth_year": 1950}\n')
+    invalid = []
+
+    records = list(read_records(stream, 'jsonl', on_invalid=lambda line, error: invalid.append(line)))
+
+    assert records == [{'birth_year': 1985}, {}, {}, {}, {'birth_year': 1950}]
+    assert invalid == [2, 3, 4]
+
+
+def test_score_record_infinite():
+    scored = score_record({'birth_year': 1985, 'on_time_measles_vaccinations': float('inf')},
+                          [illness_registry['measles']])
+    assert scored['probability_of_measles_immunity'] == 'Unknown'
+
+
+def test_write_records_csv():
+    stream = io.StringIO()
+    assert write_records([{'birth_year': 1985, 'measles_content_templates': ['a', 'b']}], stream, 'csv') == 1
+    assert stream.getvalue().splitlines() == ['birth_year,measles_content_templates', '1985,a|b']
+
+
+@pytest.mark.parametrize('path, default, inferred_format',
+                         [('roster.csv', 'csv', 'csv'),
+                          ('roster.jsonl', 'csv', 'jsonl'),
+                          ('roster.ndjson', 'csv', 'jsonl'),
+                          ('-', 'jsonl', 'jsonl'),
+                          ('roster.txt', 'csv', 'csv'),
+                          ('roster.pirec', 'csv', 'records'),
+                          ])
+def test_infer_format(path, default, inferred_format):
+    assert infer_format(path, default) == inferred_format
+
+
+def test_main_csv_to_jsonl(tmp_path):
+    roster, scored = tmp_path / 'roster.csv', tmp_path / 'scored.jsonl'
+    roster.write_text(csv_roster)
+
+    assert main([str(roster), '-o', str(scored), '--illness', 'mumps', '--workers', '2', '--chunk-size', '1']) == 0
+
+    records = [json.loads(line) for line in scored.read_text().splitlines()]
+    assert [record['id'] for record in records] == ['1', '2', '3']
+    assert records[1]['mumps_content_templates'] == ['pre_1957_message']
+    assert records[2]['probability_of_mumps_immunity'] == 'Unknown'
+    assert 'probability_of_measles_immunity' not in records[0]
+
+
+def test_main_jsonl_invalid_line(tmp_path, capsys):
+    roster, scored = tmp_path / 'roster.jsonl', tmp_path / 'scored.jsonl'
+    roster.write_text('{"id": 1, "birth_year": 1985}\n{"id": 2,\n{"id": 3, "birth_year": 1950}\n')
+
+    assert main([str(roster), '-o', str(scored), '--illness', 'rubella']) == 0
+
+    records = [json.loads(line) for line in scored.read_text().splitlines()]
+    assert [record.get('id') for record in records] == [1, None, 3]
+    assert records[1]['probability_of_rubella_immunity'] == 'Unknown'
+    assert 'Line 2' in capsys.readouterr().err
+
+
+def test_main_stdin_to_stdout(monkeypatch, capsys):
+    monkeypatch.setattr('sys.stdin', io.StringIO(csv_roster))
+
+    assert main([]) == 0
+
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 4  # Header and three records.
+    assert lines[0].endswith('probability_of_rubella_immunity,rubella_content_templates')
+
+
+def test_score_chunk():
+    formatted = score_chunk([{'birth_year': '1950'}, {'birth_year': '1985'}], ['rubella'], 'csv',
+                            ['birth_year', 'probability_of_rubella_immunity', 'rubella_content_templates'])
+    assert formatted.splitlines() == ['1950,0.93,pre_1957_message', '1985,0.1,no_immunisations']
+
+
+@pytest.mark.parametrize('output_format', ['csv', 'jsonl'])
+def test_score_to_stream_workers_preserves_order(output_format):
+    records = [{'id': str(row), 'birth_year': str(1940 + row), 'on_time_mumps_vaccinations': str(row % 4)}
+               for row in range(50)]
+    serial, parallel = io.StringIO(), io.StringIO()
+
+    score_to_stream(records, serial, output_format, list(illness_registry.values()))
+    score_to_stream(records, parallel, output_format, list(illness_registry.values()), workers=2, chunk_size=7)
+
+    assert parallel.getvalue() == serial.getvalue()
+
+
+def test_score_to_stream_workers_no_records():
+    output = io.StringIO()
+    score_to_stream([], output, 'csv', list(illness_registry.values()), workers=2)
+    assert output.getvalue() == ''
+
+
+@pytest.mark.parametrize('workers, chunk_size', [(0, 1000), (2, 0), (2, -1)])
+def test_score_to_stream_invalid_workers_or_chunk_size(workers, chunk_size):
+    with pytest.raises(ValueError):
+        score_to_stream([{'birth_year': '1985'}], io.StringIO(), 'csv', list(illness_registry.values()),
+                        workers=workers, chunk_size=chunk_size)
+
+
+@pytest.mark.parametrize('arguments', [['--workers', '0'], ['--workers', '-2'],
+                                       ['--workers', '2', '--chunk-size', '0'], ['--chunk-size', '-1']])
+def test_main_invalid_workers_or_chunk_size(arguments, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        main(arguments)
+    assert exit_info.value.code == 2
+    assert 'must be at least 1' in capsys.readouterr().err
+
+
+def test_score_person_records(tmp_path):
+    roster, record_file = tmp_path / 'roster.csv', tmp_path / 'roster.pirec'
+    roster.write_text(csv_roster.replace('3,abc,', '3,2001,'))
+    convert_csv(roster, record_file)
+    records = read_person_records(record_file)
+
+    scored = list(score_person_records(records, list(illness_registry.values()), chunk_size=2))
+
+    assert len(scored) == 3
+    assert [row['record'] for row in scored] == [0, 1, 2]
+    for row in scored:
+        assert row == score_record({'record': row['record'], **{field: row[field] for field in records.dtype.names}},
+                                   illness_registry.values())
+
+
+def test_score_person_records_invalid_data(tmp_path):
+    roster, record_file = tmp_path / 'roster.csv', tmp_path / 'roster.pirec'
+    invalid_rows = ('4,1950,-1,,-1,,-1,\n'  # Pre 1957, vaccinations not used.
+                    '5,1985,,maybe,2,,1,\n'
+                    '6,1985,two,,2,,1,\n'
+                    '7,1985,1.5,True,,,,\n'  # Previous illness, vaccinations not used.
+                    '8,abc,,,,,,\n')
+    roster.write_text(csv_roster.replace('3,abc,', '3,2001,') + invalid_rows)
+    convert_csv(roster, record_file)
+
+    scored = list(score_person_records(read_person_records(record_file), list(illness_registry.values())))
+
+    # Same results as scoring the CSV rows.
+    csv_rows = read_records(io.StringIO(roster.read_text()), 'csv')
+    csv_scored = [score_record(row, illness_registry.values()) for row in csv_rows]
+    result_fields = [field for illness in illness_registry
+                     for field in (f'probability_of_{illness}_immunity', f'{illness}_content_templates')]
+    assert ([[row[field] for field in result_fields] for row in scored]
+            == [[row[field] for field in result_fields] for row in csv_scored])
+    assert [row['record'] for row in scored] == list(range(8))
+    assert scored[3]['probability_of_measles_immunity'] == 0.9
+    assert scored[4]['probability_of_measles_immunity'] == 'Unknown'
+    assert scored[4]['on_time_measles_vaccinations'] is None
+    assert scored[4]['probability_of_mumps_immunity'] != 'Unknown'
+    assert scored[5]['probability_of_measles_immunity'] == 'Unknown'
+    assert scored[5]['probability_of_rubella_immunity'] != 'Unknown'
+    assert scored[7]['probability_of_rubella_immunity'] == 'Unknown'
+
+
+def test_score_person_records_rejected_record(tmp_path):
+    roster, record_file = tmp_path / 'roster.csv', tmp_path / 'roster.pirec'
+    roster.write_text(csv_roster.replace('3,abc,', '3,9999,'))  # Valid record, future birth year.
+    convert_csv(roster, record_file)
+
+    scored = list(score_person_records(read_person_records(record_file), [illness_registry['measles']]))
+
+    assert scored[0]['measles_content_templates'] == ['has_immunisations']
+    assert scored[2]['probability_of_measles_immunity'] == 'Unknown'
+
+
+def test_main_person_records(tmp_path, capsys):
+    roster, record_file = tmp_path / 'roster.csv', tmp_path / 'roster.pirec'
+    roster.write_text(csv_roster.replace('3,abc,', '3,2001,'))
+    convert_csv(roster, record_file)
+
+    assert main([str(record_file), '--illness', 'rubella']) == 0
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].endswith('probability_of_rubella_immunity,rubella_content_templates')
+    assert lines[2].endswith('0.93,pre_1957_message')
@@ -0,0 +1,85 @@
+"""Test illness immunity functions registered as SQLite user-defined functions."""
+import json
+import sqlite3
+
+import pytest
+
+from illnesses import (measles,
+                       mumps,
+                       rubella,
+                       )
+from illnesses.common_helpers import current_year
+from illnesses.sqlite_functions import register_functions
+
+
+@pytest.fixture
+def connection():
+    connection = sqlite3.connect(':memory:')
+    register_functions(connection)
+    yield connection
+    connection.close()
+
+
+@pytest.mark.parametrize('module', [measles, mumps, rubella])
+@pytest.mark.parametrize(
+    'birth_year, doses, illness',
+    [(1950, 0, False),
+     (1957, 1, False),
+     (1985, 2, False),
+     (1985, 2, True),
+     (1990, 5, False),  # More doses than the decision table holds.
+     (current_year, 0, False),
+     ])
+def test_immunity_functions(connection, module, birth_year, doses, illness):
+    name = module.__name__.split('.')[-1]
+    expected = module.immunity(birth_year, doses, illness)
+    probability, templates = connection.execute(f'SELECT {name}_immunity(?, ?, ?), {name}_templates(?, ?, ?)',
+                                                (birth_year, doses, illness) * 2).fetchone()
+    assert probability == expected[f'probability_of_{name}_immunity']
+    assert json.loads(templates) == expected['content_templates']
+
+
+def test_immunity_functions_optional_arguments(connection):
+    assert (connection.execute('SELECT mumps_immunity(1985), mumps_immunity(1985, NULL, NULL)').fetchone()
+            == (mumps.immunity(1985)['probability_of_mumps_immunity'],) * 2)
+
+
+@pytest.mark.parametrize(
+    'birth_year, doses',
+    [(current_year + 1, 2),
+     ('abc', 2),
+     (1985, -1),
+     (None, 2),
+     ])
+def test_immunity_functions_invalid_inputs_null(connection, birth_year, doses):
+    assert connection.execute('SELECT measles_immunity(?, ?, 0), measles_templates(?, ?, 0)',
+                              (birth_year, doses) * 2).fetchone() == (None, None)
+
+
+def test_expected_immune(connection):
+    people = [(1985, 2, 0), (1985, 1, 0), (1991, 2, 0), (1991, 2, 1), (3000, 2, 0)]
+    connection.execute('CREATE TABLE people (birth_year INTEGER, doses INTEGER, had_mumps INTEGER)')
+    connection.executemany('INSERT INTO people VALUES (?, ?, ?)', people)
+
+    summary = connection.execute('SELECT birth_year / 10 * 10 AS decade, COUNT(*), '
+                                 'expected_immune(mumps_immunity(birth_year, doses, had_mumps)) '
+                                 'FROM people GROUP BY decade ORDER BY decade').fetchall()
+
+    def expected_immune(decade):
+        return sum(mumps.immunity(birth_year, doses, bool(had_mumps))['probability_of_mumps_immunity']
+                   for birth_year, doses, had_mumps in people if birth_year // 10 * 10 == decade)
+
+    assert summary == [(1980, 2, pytest.approx(expected_immune(1980))),
+                       (1990, 2, pytest.approx(expected_immune(1990))),
+                       (3000, 1, 0.0),  # Invalid birth year scored NULL, not counted.
+                       ]
+
+
+def test_register_functions_subset():
+    connection = sqlite3.connect(':memory:')
+    register_functions(connection, ['rubella'])
+    assert connection.execute('SELECT rubella_immunity(1985, 1, 0)').fetchone()[0] is not None
+    with pytest.raises(sqlite3.OperationalError):
+        connection.execute('SELECT measles_immunity(1985, 1, 0)')
+    with pytest.raises(KeyError):
+        register_functions(connection, ['chickenpox'])
@@ -5,6 +5,9 @@ import flask
 import probable_immunity_web_app.app_factory as app_factory
 
 from probable_immunity_web_app.app_factory import about_text_string, create_app
+from probable_immunity_web_app.forms.immunity_data_entry_form import ImmunityDataEntryForm
+from probable_immunity_web_app.illness_config import app_illnesses
+from probable_immunity_web_app.illnesses import Measles, Mumps, Rubella
 
 
 def test_config():
@@ -36,3 +39,41 @@ def test_create_app_passing_os_error(monkeypatch):
     monkeypatch.setattr(app_factory.Path, 'mkdir', mocked_mkdir)
 
     assert create_app()
+
+
+def test_create_app_builds_illness_registry():
+    app = create_app()
+    illnesses = app_illnesses(app)
+    assert illnesses.names == ['measles', 'mumps', 'rubella']
+    assert issubclass(illnesses.form_class, ImmunityDataEntryForm)
+    assert create_app({'TESTING': True}).extensions['illnesses'].names == []
+
+
+def test_create_app_form_class_per_app():
+    measles_app = create_app({'TESTING': True, 'WTF_CSRF_ENABLED': False, 'ILLNESS_LIST': [Measles]})
+    mumps_app = create_app({'TESTING': True, 'WTF_CSRF_ENABLED': False, 'ILLNESS_LIST': [Mumps, Rubella]})
+
+    for app in (measles_app, mumps_app):
+        assert app.test_client().get('/immunity/').status_code == 200
+
+    measles_form_class = app_illnesses(measles_app).form_class
+    mumps_form_class = app_illnesses(mumps_app).form_class
+    assert hasattr(measles_form_class, 'measles') and not hasattr(measles_form_class, 'mumps')
+    assert hasattr(mumps_form_class, 'mumps') and hasattr(mumps_form_class, 'rubella')
+    assert not hasattr(mumps_form_class, 'measles')
+    # Shared base form not mutated by requests.
+    assert not any(hasattr(ImmunityDataEntryForm, name) for name in ('measles', 'mumps', 'rubella'))
+    # Built once per app.
+    assert app_illnesses(measles_app).form_class is measles_form_class
+
+
+def test_about_text_etag(client):
+    response = client.get('/about_text/')
+    assert response.cache_control.public and response.cache_control.max_age == 3600
+    not_modified = client.get('/about_text/', headers={'If-None-Match': response.headers['ETag']})
+    assert not_modified.status_code == 304
+    assert client.get('/about_text/', headers={'If-None-Match': '"other"'}).data == about_text_string
+
+
+def test_create_app_content_version():
+    assert create_app().extensions['content_version'] == create_app().extensions['content_version']
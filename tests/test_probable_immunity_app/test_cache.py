@@ -0,0 +1,142 @@
+import pytest
+
+from probable_immunity_web_app.cache import (LRUCache,
+                                             SQLiteCache,
+                                             freeze,
+                                             response_cache_from_config,
+                                             version_hash,
+                                             )
+
+
+@pytest.mark.parametrize(
+    'value, frozen',
+    [(1, 1),
+     ([1, 2], (1, 2)),
+     ({'b': [1], 'a': 0.5}, (('a', 0.5), ('b', (1,)))),
+     ({'measles': {'templates': ['a', 'b']}}, (('measles', (('templates', ('a', 'b')),)),)),
+     ])
+def test_freeze(value, frozen):
+    assert freeze(value) == frozen
+    hash(freeze(value))
+
+
+def test_lru_cache_hits_and_misses():
+    cache = LRUCache(2)
+    assert cache.get('a') is None
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'size': 1, 'maxsize': 2}
+
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.stats() == {'hits': 0, 'misses': 0, 'size': 0, 'maxsize': 2}
+
+
+def test_lru_cache_delete():
+    cache = LRUCache(2)
+    cache.set('a', 1)
+    cache.delete('a')
+    cache.delete('b')  # Not cached.
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')  # b now least recently used.
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert len(cache) == 2
+
+
+def test_lru_cache_disabled():
+    cache = LRUCache(0)
+    cache.set('a', 1)
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+class FakeTime:
+    def __init__(self, timestamp):
+        self.timestamp = timestamp
+
+    def __call__(self):
+        return self.timestamp
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_cache(request, tmp_path):
+    def _make_cache(maxsize, ttl=None, time_function=None):
+        time_function = time_function or FakeTime(1000.0)
+        if request.param == 'memory':
+            return LRUCache(maxsize, ttl, time_function)
+        return SQLiteCache(tmp_path / 'cache.sqlite', maxsize, ttl, time_function=time_function)
+    return _make_cache
+
+
+def test_cache_backends_evict_least_recently_used(make_cache):
+    fake_time = FakeTime(1000.0)
+    cache = make_cache(2, time_function=fake_time)
+    cache.set(('a', 1), 'A')
+    fake_time.timestamp += 1
+    cache.set(('b', 2), 'B')
+    fake_time.timestamp += 1
+    assert cache.get(('a', 1)) == 'A'  # b now least recently used.
+    fake_time.timestamp += 1
+    cache.set(('c', 3), 'C')
+    assert cache.get(('b', 2)) is None
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'size': 2, 'maxsize': 2}
+
+
+def test_cache_backends_expire_after_ttl(make_cache):
+    fake_time = FakeTime(1000.0)
+    cache = make_cache(2, ttl=60, time_function=fake_time)
+    cache.set('a', 'A')
+    fake_time.timestamp += 59
+    assert cache.get('a') == 'A'
+    fake_time.timestamp += 1
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_sqlite_cache_shared_between_instances(tmp_path):
+    SQLiteCache(tmp_path / 'cache.sqlite').set(('results', 1985), '<html>')
+    cache = SQLiteCache(tmp_path / 'cache.sqlite')
+    assert cache.get(('results', 1985)) == '<html>'
+    cache.clear()
+    assert cache.get(('results', 1985)) is None
+
+
+@pytest.mark.parametrize(
+    'config, cache_type',
+    [({}, LRUCache),
+     ({'RESULT_CACHE': 'memory', 'RESULT_CACHE_TTL': 60}, LRUCache),
+     ({'RESULT_CACHE': 'sqlite'}, SQLiteCache),
+     ({'RESULT_CACHE': None}, type(None)),
+     ])
+def test_response_cache_from_config(tmp_path, config, cache_type):
+    cache = response_cache_from_config({'DATABASE': tmp_path / 'app.sqlite', **config})
+    assert isinstance(cache, cache_type)
+
+
+def test_response_cache_from_config_custom_backend():
+    backend = LRUCache(10)
+    assert response_cache_from_config({'RESULT_CACHE': backend}) is backend
+
+
+def test_response_cache_from_config_unknown_backend():
+    with pytest.raises(ValueError):
+        response_cache_from_config({'RESULT_CACHE': 'memcached'})
+
+
+def test_version_hash(tmp_path):
+    (tmp_path / 'templates').mkdir()
+    (tmp_path / 'templates' / 'page.html').write_text('<p>1</p>')
+    version = version_hash(tmp_path)
+    assert version == version_hash(tmp_path)
+
+    (tmp_path / 'templates' / 'page.html').write_text('<p>2</p>')
+    assert version_hash(tmp_path) != version
@@ -4,6 +4,11 @@ import pytest
 from werkzeug.datastructures import ImmutableMultiDict
 
 from illnesses import measles
+from illnesses.clock import (clock,
+                             start_of_year,
+                             )
+from probable_immunity_web_app import probable_immunity_app
+from probable_immunity_web_app.app_factory import create_app
 from probable_immunity_web_app.illnesses import Measles
 from probable_immunity_web_app.forms.immunity_data_entry_form import current_year
 
@@ -112,6 +117,25 @@ def test_immunity_validate_common_data_input(client, app_specific_illnesses,
             assert error in response.data
 
 
+def test_immunity_birth_year_after_year_rollover(app_specific_illnesses, monkeypatch):
+    """Birth year validation rolls over with the year, without reloading the app."""
+    request_data = {'birth_year': current_year + 1,
+                    'measles': {'on_time_measles_vaccinations': 2}}
+
+    app = app_specific_illnesses(illnesses=[Measles])
+    monkeypatch.setattr(clock, '_time', lambda: start_of_year(current_year + 1))
+    try:
+        with app.test_client() as test_client:
+            response = test_client.post('immunity/', data=ImmutableMultiDict(flatten_dict(request_data)))
+            assert response.status_code == 302
+
+            response = test_client.get('immunity/results/')
+            assert str(measles.shots_under_6_immunity[2]).encode('utf-8') in response.data
+    finally:
+        monkeypatch.undo()
+        clock.refresh()
+
+
 @pytest.mark.parametrize(
     'request_data',
     [  # Strings
@@ -430,3 +454,142 @@ def test_immunity_results_without_valid_session_redirects_to_data_entry(client,
 
         response = test_client.get('immunity/results/', follow_redirects=True)
         assert response.status_code == 200
+
+
+def test_immunity_results_fragment_cache(client, app):
+    app.extensions['result_cache'] = None  # Render each request.
+    fragment_cache = app.extensions['result_fragment_cache']
+    session_data = {'birth_year': 1985,
+                    'measles': {'on_time_measles_vaccinations': 2},
+                    'mumps': {'on_time_mumps_vaccinations': 2, 'mumps_illness': False},
+                    }
+    with client.session_transaction() as test_client_session:
+        test_client_session.update(session_data)
+
+    first_response = client.get('/immunity/results/')
+    assert fragment_cache.stats()['misses'] == 2  # Measles and mumps fragments rendered.
+    assert fragment_cache.stats()['hits'] == 0
+
+    second_response = client.get('/immunity/results/')
+    assert fragment_cache.stats()['hits'] == 2
+    assert second_response.data == first_response.data
+    assert b'<b>Measles</b>' in second_response.data and b'<b>Mumps</b>' in second_response.data
+
+    # Different result, different fragment.
+    with client.session_transaction() as test_client_session:
+        test_client_session['birth_year'] = 1986
+    assert client.get('/immunity/results/').data != first_response.data
+    assert fragment_cache.stats()['size'] == 3  # Measles result unchanged.
+
+
+def test_immunity_results_fragment_cache_disabled(app_specific_illnesses):
+    app = app_specific_illnesses([Measles])
+    app.extensions['result_cache'] = None
+    app.extensions['result_fragment_cache'].maxsize = 0
+    client = app.test_client()
+    with client.session_transaction() as test_client_session:
+        test_client_session.update({'birth_year': 1985, 'measles': {'on_time_measles_vaccinations': 2}})
+    assert client.get('/immunity/results/').data == client.get('/immunity/results/').data
+    assert app.extensions['result_fragment_cache'].stats()['size'] == 0
+
+
+@pytest.mark.parametrize('result_cache', ['memory', 'sqlite'])
+def test_immunity_results_response_cache(tmp_path, monkeypatch, result_cache):
+    app = create_app({'TESTING': True,
+                      'ILLNESS_LIST': [Measles],
+                      'DATABASE': tmp_path / 'probable_immunity_app.sqlite',
+                      'RESULT_CACHE': result_cache,
+                      })
+    client = app.test_client()
+    with client.session_transaction() as test_client_session:
+        test_client_session.update({'birth_year': 1985, 'measles': {'on_time_measles_vaccinations': 2}})
+    first_response = client.get('/immunity/results/')
+
+    def unexpected_render(*args, **kwargs):
+        raise AssertionError('Cached results page re-rendered.')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(probable_immunity_app, 'render_immunity_results', unexpected_render)
+        assert client.get('/immunity/results/').data == first_response.data
+    assert app.extensions['result_cache'].stats() == {'hits': 1, 'misses': 1, 'size': 1, 'maxsize': 1024}
+
+    # Different inputs aren't served cached page.
+    with client.session_transaction() as test_client_session:
+        test_client_session['measles'] = {'on_time_measles_vaccinations': 0}
+    assert client.get('/immunity/results/').data != first_response.data
+    assert app.extensions['result_cache'].stats()['size'] == 2
+
+
+def test_immunity_results_response_cache_shared_by_sqlite_file(tmp_path):
+    config = {'TESTING': True,
+              'ILLNESS_LIST': [Measles],
+              'RESULT_CACHE': 'sqlite',
+              'RESULT_CACHE_DATABASE': str(tmp_path / 'cache.sqlite'),
+              }
+    clients = [create_app(config).test_client() for _ in range(2)]  # Eg two worker processes.
+    for client in clients:
+        with client.session_transaction() as test_client_session:
+            test_client_session.update({'birth_year': 1990, 'measles': {'on_time_measles_vaccinations': 1}})
+    responses = [client.get('/immunity/results/') for client in clients]
+    assert responses[0].data == responses[1].data
+    assert [client.application.extensions['result_cache'].hits for client in clients] == [0, 1]
+
+
+def test_immunity_results_response_cache_keyed_by_year(app_specific_illnesses, monkeypatch):
+    app = app_specific_illnesses([Measles])
+    client = app.test_client()
+    with client.session_transaction() as test_client_session:
+        test_client_session.update({'birth_year': 1985, 'measles': {'on_time_measles_vaccinations': 2}})
+    client.get('/immunity/results/')
+
+    monkeypatch.setattr(clock, '_time', lambda: start_of_year(current_year + 1) + 1)
+    client.get('/immunity/results/')
+    monkeypatch.undo()
+    clock.refresh()
+    assert app.extensions['result_cache'].stats()['misses'] == 2
+
+
+def test_immunity_results_response_cache_disabled(app_specific_illnesses):
+    app = create_app({'TESTING': True, 'ILLNESS_LIST': [Measles], 'RESULT_CACHE': None})
+    assert app.extensions['result_cache'] is None
+    client = app.test_client()
+    with client.session_transaction() as test_client_session:
+        test_client_session.update({'birth_year': 1985, 'measles': {'on_time_measles_vaccinations': 2}})
+    assert client.get('/immunity/results/').status_code == 200
+
+
+def test_immunity_results_etag(app_specific_illnesses, monkeypatch):
+    app = app_specific_illnesses([Measles])
+    client = app.test_client()
+    with client.session_transaction() as test_client_session:
+        test_client_session.update({'birth_year': 1985, 'measles': {'on_time_measles_vaccinations': 2}})
+    response = client.get('/immunity/results/')
+    etag = response.headers['ETag']
+    assert not etag.startswith('W/')  # Strong ETag.
+    assert response.cache_control.private and response.cache_control.no_cache
+    assert 'Cookie' in response.vary
+
+    def unexpected_render(*args, **kwargs):
+        raise AssertionError('Results rendered for unmodified page.')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(probable_immunity_app, 'render_immunity_results', unexpected_render)
+        app.extensions['result_cache'] = None
+        not_modified = client.get('/immunity/results/', headers={'If-None-Match': etag})
+    assert not_modified.status_code == 304
+    assert not_modified.data == b''
+    assert not_modified.headers['ETag'] == etag
+
+    # Same inputs, same ETag.
+    assert client.get('/immunity/results/').headers['ETag'] == etag
+    # Different inputs, or models and templates, modified.
+    with client.session_transaction() as test_client_session:
+        test_client_session['birth_year'] = 1986
+    modified = client.get('/immunity/results/', headers={'If-None-Match': etag})
+    assert modified.status_code == 200
+    assert modified.headers['ETag'] != etag
+
+    with client.session_transaction() as test_client_session:
+        test_client_session['birth_year'] = 1985
+    app.extensions['content_version'] = 'next-version'
+    assert client.get('/immunity/results/', headers={'If-None-Match': etag}).status_code == 200
@@ -0,0 +1,297 @@
+"""Test immunity app JSON API."""
+import io
+import json
+import socket
+import threading
+
+import flask
+import pytest
+
+from illnesses import (measles,
+                       mumps,
+                       rubella,
+                       )
+from illnesses.common_helpers import current_year
+from probable_immunity_web_app.illnesses import (Measles,
+                                                 Mumps,
+                                                 Rubella,
+                                                 )
+from probable_immunity_web_app import probable_immunity_app
+from probable_immunity_web_app.probable_immunity_app import ndjson_lines
+from probable_immunity_web_app.serve import make_server
+
+
+@pytest.fixture
+def api_client(app_specific_illnesses):
+    return app_specific_illnesses([Measles, Mumps, Rubella]).test_client()
+
+
+@pytest.mark.parametrize('person',
+                         [{'birth_year': 1985,
+                           'measles': {'on_time_measles_vaccinations': 2},
+                           'mumps': {'on_time_mumps_vaccinations': 1, 'mumps_illness': False},
+                           'rubella': {'rubella_vaccinations': 1, 'rubella_illness': True}},
+                          {'birth_year': 1950},  # Illness defaults.
+                          {'birth_year': current_year, 'mumps': {'on_time_mumps_vaccinations': 3}},
+                          ])
+def test_api_immunity(api_client, person):
+    response = api_client.post('/api/v1/immunity', json=person)
+
+    assert response.status_code == 200
+    assert response.json == {'results': {
+        'measles': measles.immunity(person['birth_year'], **person.get('measles', {})),
+        'mumps': mumps.immunity(person['birth_year'], **person.get('mumps', {})),
+        'rubella': rubella.immunity(person['birth_year'], **person.get('rubella', {})),
+    }}
+
+
+def test_api_immunity_configured_illnesses_only(app_specific_illnesses):
+    response = app_specific_illnesses([Mumps]).test_client().post('/api/v1/immunity', json={'birth_year': 1985})
+    assert list(response.json['results']) == ['mumps']
+
+
+def test_api_immunity_does_not_use_session(api_client):
+    with api_client:
+        api_client.post('/api/v1/immunity', json={'birth_year': 1985})
+        assert 'birth_year' not in flask.session
+        assert 'Set-Cookie' not in api_client.post('/api/v1/immunity', json={'birth_year': 1985}).headers
+
+
+@pytest.mark.parametrize('person, errors',
+                         [([1985], {'person': 'Person must be a JSON object.'}),
+                          ({}, {'birth_year': f'Birth year must be a 4 digit integer less than {current_year}.'}),
+                          ({'birth_year': '1985'},
+                           {'birth_year': f'Birth year must be a 4 digit integer less than {current_year}.'}),
+                          ({'birth_year': current_year + 1},
+                           {'birth_year': f'Birth year must be a 4 digit integer less than {current_year}.'}),
+                          ({'birth_year': 1985, 'chickenpox': {}}, {'person': 'Unknown illnesses: chickenpox.'}),
+                          ({'birth_year': 1985, 'mumps': 2}, {'mumps': 'mumps data must be a JSON object.'}),
+                          ({'birth_year': 1985, 'mumps': {'on_time_mumps_vaccinations': -1},
+                            'measles': {'on_time_measles_vaccinations': 1.5}},
+                           {'measles': 'Measles vaccinations must be a positive integer.',
+                            'mumps': 'Mumps vaccinations must be a positive integer.'}),
+                          ])
+def test_api_immunity_errors(api_client, person, errors):
+    response = api_client.post('/api/v1/immunity', json=person)
+
+    assert response.status_code == 400
+    assert response.json == {'errors': errors}
+
+
+@pytest.mark.parametrize('mumps_data, unknown',
+                         [({'doses': 2}, 'doses'),
+                          ({'as_of_year': 2060}, 'as_of_year'),  # Not part of the API.
+                          ({'on_time_mumps_vaccinations': 2, 'bogus': 1, 'as_of_year': 2060}, 'as_of_year, bogus'),
+                          ])
+def test_api_immunity_unexpected_argument(api_client, mumps_data, unknown):
+    response = api_client.post('/api/v1/immunity', json={'birth_year': 1985, 'mumps': mumps_data})
+
+    assert response.status_code == 400
+    assert response.json == {'errors': {'mumps': f'Unknown mumps data: {unknown}. '
+                                                 f'Expected: on_time_mumps_vaccinations, mumps_illness.'}}
+
+
+@pytest.mark.parametrize('doses', ['Infinity', '-Infinity', 'NaN'])
+def test_api_immunity_non_finite_number(api_client, doses):
+    response = api_client.post('/api/v1/immunity', content_type='application/json',
+                               data=f'{{"birth_year": 1985, "measles": {{"on_time_measles_vaccinations": {doses}}}}}')
+
+    assert response.status_code == 400
+    assert response.json == {'errors': {'measles': 'on_time_measles_vaccinations must be a number.'}}
+
+
+@pytest.mark.parametrize('mumps_data, error',
+                         [({'mumps_illness': 'no'}, 'mumps_illness must be true or false.'),
+                          ({'mumps_illness': 0}, 'mumps_illness must be true or false.'),
+                          ({'on_time_mumps_vaccinations': '2'}, 'on_time_mumps_vaccinations must be a number.'),
+                          ({'on_time_mumps_vaccinations': True}, 'on_time_mumps_vaccinations must be a number.'),
+                          ({'on_time_mumps_vaccinations': [2], 'mumps_illness': 'yes'},
+                           'on_time_mumps_vaccinations must be a number. mumps_illness must be true or false.'),
+                          ])
+def test_api_immunity_field_types(api_client, mumps_data, error):
+    response = api_client.post('/api/v1/immunity', json={'birth_year': 1985, 'mumps': mumps_data})
+
+    assert response.status_code == 400
+    assert response.json == {'errors': {'mumps': error}}
+
+
+def test_api_immunity_null_fields(api_client):
+    person = {'birth_year': 1985, 'mumps': {'on_time_mumps_vaccinations': None, 'mumps_illness': None}}
+    response = api_client.post('/api/v1/immunity', json=person)
+
+    assert response.status_code == 200
+    assert response.json['results']['mumps'] == mumps.immunity(1985)
+
+
+def test_api_immunity_not_json(api_client):
+    response = api_client.post('/api/v1/immunity', data='birth_year=1985')
+
+    assert response.status_code == 400
+    assert response.json == {'errors': {'person': 'Person must be a JSON object.'}}
+
+
+def test_api_immunity_get_not_allowed(api_client):
+    assert api_client.get('/api/v1/immunity').status_code == 405
+
+
+def test_api_immunity_batch(api_client):
+    persons = [{'birth_year': 1985, 'mumps': {'on_time_mumps_vaccinations': 2}},
+               {'birth_year': 198},  # Invalid birth year.
+               {'birth_year': 2001, 'measles': {'on_time_measles_vaccinations': -1}},  # Invalid shots.
+               'person',  # Not an object.
+               {'birth_year': 1950, 'rubella': {'rubella_illness': True}},
+               ]
+
+    response = api_client.post('/api/v1/immunity/batch', json={'persons': persons})
+
+    assert response.status_code == 200
+    assert response.json['results'] == [
+        {'results': api_client.post('/api/v1/immunity', json=persons[0]).json['results']},
+        {'errors': {'birth_year': f'Birth year must be a 4 digit integer less than {current_year}.'}},
+        {'errors': {'measles': 'Measles vaccinations must be a positive integer.'}},
+        {'errors': {'person': 'Person must be a JSON object.'}},
+        {'results': {'measles': measles.immunity(1950),
+                     'mumps': mumps.immunity(1950),
+                     'rubella': rubella.immunity(1950, rubella_illness=True)}},
+    ]
+
+
+def test_api_immunity_batch_non_finite_number(api_client):
+    person = json.dumps({'birth_year': 1985, 'mumps': {'on_time_mumps_vaccinations': 2}})
+    bad_person = '{"birth_year": 1985, "measles": {"on_time_measles_vaccinations": -Infinity}}'
+    data = '{"persons": [' + ', '.join([bad_person, *[person] * 2500, bad_person]) + ']}'
+
+    response = api_client.post('/api/v1/immunity/batch', data=data, content_type='application/json')
+
+    assert response.status_code == 200
+    rows = response.json['results']
+    assert len(rows) == 2502
+    assert rows[0] == rows[-1] == {'errors': {'measles': 'on_time_measles_vaccinations must be a number.'}}
+    assert all('results' in row for row in rows[1:-1])
+
+
+def test_api_immunity_batch_empty(api_client):
+    response = api_client.post('/api/v1/immunity/batch', json={'persons': []})
+    assert response.status_code == 200
+    assert response.json == {'results': []}
+
+
+@pytest.mark.parametrize('batch', [[{'birth_year': 1985}], {'people': []}, {'persons': {'birth_year': 1985}}])
+def test_api_immunity_batch_not_a_batch(api_client, batch):
+    response = api_client.post('/api/v1/immunity/batch', json=batch)
+    assert response.status_code == 400
+    assert list(response.json['errors']) == ['persons']
+
+
+def test_api_immunity_batch_too_large(app_specific_illnesses):
+    app = app_specific_illnesses([Mumps])
+    app.config['API_MAX_BATCH_SIZE'] = 2
+
+    response = app.test_client().post('/api/v1/immunity/batch', json={'persons': [{'birth_year': 1985}] * 3})
+
+    assert response.status_code == 413
+    assert response.json == {'errors': {'persons': 'Batches are limited to 2 persons.'}}
+
+
+@pytest.mark.parametrize('data, lines',
+                         [(b'', []),
+                          (b'{"a": 1}\n{"b": 2}', [b'{"a": 1}\n', b'{"b": 2}']),
+                          (b'12345678\n123456789\n12', [b'12345678\n', None, b'12']),  # Line over limit.
+                          (b'123456789012345678901234567\n\n', [None, b'\n']),  # Line many times limit.
+                          ])
+def test_ndjson_lines(data, lines):
+    assert list(ndjson_lines(io.BytesIO(data), 8)) == lines
+
+
+def test_api_immunity_stream(api_client):
+    persons = [{'birth_year': 1985, 'mumps': {'on_time_mumps_vaccinations': 2}},
+               {'birth_year': 198},
+               {'birth_year': 1950, 'rubella': {'rubella_illness': True}},
+               ]
+    data = '\n'.join([json.dumps(persons[0]), json.dumps(persons[1]), '', 'not json', json.dumps(persons[2])])
+
+    response = api_client.post('/api/v1/immunity/stream', data=data, content_type='application/x-ndjson')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    batch_rows = api_client.post('/api/v1/immunity/batch', json={'persons': persons}).json['results']
+    assert [json.loads(line) for line in response.data.splitlines()] == [
+        batch_rows[0],
+        batch_rows[1],
+        {'errors': {'person': 'Person must be a JSON object.'}},  # Blank line skipped.
+        batch_rows[2],
+    ]
+
+
+def test_api_immunity_stream_deeply_nested_line(api_client):
+    data = '[' * 5000 + '\n{"birth_year": 1985}\n'
+
+    response = api_client.post('/api/v1/immunity/stream', data=data, content_type='application/x-ndjson')
+
+    rows = [json.loads(line) for line in response.data.splitlines()]
+    assert rows[0] == {'errors': {'person': 'Person must be a JSON object.'}}
+    assert 'results' in rows[1]  # Stream continues.
+
+
+def test_api_immunity_stream_non_finite_number(api_client):
+    data = '{"birth_year": 1985, "rubella": {"rubella_vaccinations": Infinity}}\n{"birth_year": 1985}\n'
+
+    response = api_client.post('/api/v1/immunity/stream', data=data, content_type='application/x-ndjson')
+
+    rows = [json.loads(line) for line in response.data.splitlines()]
+    assert rows[0] == {'errors': {'rubella': 'rubella_vaccinations must be a number.'}}
+    assert 'results' in rows[1]  # Stream continues.
+
+
+def test_api_immunity_stream_scoring_error(api_client, monkeypatch):
+    person_immunity = probable_immunity_app.person_immunity
+
+    def failing_person_immunity(illnesses, person):
+        if person.get('birth_year') == 1950:
+            raise OverflowError('Unexpected error.')
+        return person_immunity(illnesses, person)
+
+    monkeypatch.setattr(probable_immunity_app, 'person_immunity', failing_person_immunity)
+    data = '{"birth_year": 1950}\n{"birth_year": 1985}\n'
+
+    response = api_client.post('/api/v1/immunity/stream', data=data, content_type='application/x-ndjson')
+
+    rows = [json.loads(line) for line in response.data.splitlines()]
+    assert rows[0] == {'errors': {'person': 'Person could not be scored.'}}
+    assert 'results' in rows[1]  # Stream continues.
+
+
+def test_api_immunity_stream_line_too_long(app_specific_illnesses):
+    app = app_specific_illnesses([Mumps])
+    app.config['API_MAX_LINE_LENGTH'] = 32
+
+    response = app.test_client().post('/api/v1/immunity/stream',
+                                      data=json.dumps({'birth_year': 1985, 'mumps': {'mumps_illness': True}})
+                                      + '\n{"birth_year": 1985}\n')
+
+    assert [json.loads(line) for line in response.data.splitlines()] == [
+        {'errors': {'person': 'Lines are limited to 32 bytes.'}},
+        {'results': {'mumps': mumps.immunity(1985)}},
+    ]
+
+
+def test_api_immunity_stream_results_before_upload_finishes(app_specific_illnesses):
+    server = make_server('127.0.0.1', 0, 2, app_specific_illnesses([Mumps]))
+    server_thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05})
+    server_thread.start()
+    try:
+        with socket.create_connection((server.host, server.port), timeout=5) as connection:
+            connection.sendall(b'POST /api/v1/immunity/stream HTTP/1.1\r\nHost: localhost\r\n'
+                               b'Content-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\n\r\n')
+            line = b'{"birth_year": 1985}\n'
+            connection.sendall(b'%x\r\n%s\r\n' % (len(line), line))
+
+            received = b''
+            while b'\n{' not in received:  # Body of first row, after headers.
+                received += connection.recv(4096)
+
+            connection.sendall(b'0\r\n\r\n')  # End upload.
+        assert b'probability_of_mumps_immunity' in received
+    finally:
+        server.shutdown()
+        server_thread.join()
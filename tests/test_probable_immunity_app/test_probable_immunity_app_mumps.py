@@ -19,6 +19,8 @@ from werkzeug.datastructures import ImmutableMultiDict
 
 import illnesses
 
+from illnesses.common_helpers import compile_decision_table
+
 from illnesses import mumps
 from probable_immunity_web_app.illnesses import Mumps
 
@@ -496,6 +498,8 @@ def test_mumps_immunity_results(client, app_specific_illnesses, monkeypatch,
 
     monkeypatch.setattr(illnesses.mumps, 'one_dose_immunity', mocked_one_dose_immunity)
     monkeypatch.setattr(illnesses.mumps, 'two_dose_immunity', mocked_two_dose_immunity)
+    # Recompile decision table from mocked implementations.
+    monkeypatch.setattr(illnesses.mumps, 'decision_table', compile_decision_table(illnesses.mumps.evaluate_immunity))
 
     app = app_specific_illnesses(illnesses=[Mumps])
     with app.test_client() as test_client:
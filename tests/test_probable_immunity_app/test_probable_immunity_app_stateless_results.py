@@ -0,0 +1,152 @@
+import pytest
+
+from werkzeug.datastructures import ImmutableMultiDict
+
+from probable_immunity_web_app.app_factory import create_app
+from probable_immunity_web_app.illness_config import Illnesses
+from probable_immunity_web_app.illnesses import (Measles,
+                                                 Mumps,
+                                                 Rubella,
+                                                 )
+from probable_immunity_web_app.illnesses.illness import Illness
+from probable_immunity_web_app.probable_immunity_app import (parse_results_code,
+                                                             results_code,
+                                                             )
+
+from tests.request_generator_helpers import flatten_dict
+
+all_illnesses = Illnesses([Measles, Mumps, Rubella])
+
+
+@pytest.fixture
+def stateless_app():
+    return create_app({'TESTING': True,
+                       'WTF_CSRF_ENABLED': False,
+                       'ILLNESS_LIST': [Measles, Mumps, Rubella],
+                       'STATELESS_RESULTS': True,
+                       })
+
+
+@pytest.mark.parametrize(
+    'inputs, code',
+    [({'birth_year': 1985,
+       'measles': {'on_time_measles_vaccinations': 2, 'measles_illness': False},
+       'mumps': {'on_time_mumps_vaccinations': 2, 'mumps_illness': False},
+       'rubella': {'rubella_vaccinations': 1, 'rubella_illness': False}},
+      '1985-m2-0-u2-0-r1-0'),
+     ({'birth_year': 1950,
+       'measles': {'on_time_measles_vaccinations': 0, 'measles_illness': True},
+       'mumps': {'on_time_mumps_vaccinations': 1, 'mumps_illness': True},
+       'rubella': {'rubella_vaccinations': 0, 'rubella_illness': True}},
+      '1950-m0-1-u1-1-r0-1'),
+     ])
+def test_results_code(inputs, code):
+    assert results_code(all_illnesses, inputs) == code
+    assert parse_results_code(all_illnesses, code) == inputs
+
+
+@pytest.mark.parametrize(
+    'code',
+    ['',
+     'abc',
+     '1985',  # Missing illnesses.
+     '1985-m2-0-u2-0',
+     '1985-m2-0-u2-0-r1-0-x',
+     '1985-u2-0-m2-0-r1-0',  # Illnesses out of order.
+     '1985-m2-2-u2-0-r1-0',  # Illness not a bool.
+     '1985-m-0-u2-0-r1-0',
+     '1985-m2-0-u2-0-r1-+0',
+     '1985-m１-0-u2-0-r1-0',  # Non-ASCII digit.
+     '1234567-m2-0-u2-0-r1-0',
+     '0-m2-0-u2-0-r1-0',  # Invalid birth years.
+     '198-m2-0-u2-0-r1-0',
+     '3000-m2-0-u2-0-r1-0',
+     ])
+def test_parse_results_code_invalid(code):
+    with pytest.raises(ValueError):
+        parse_results_code(all_illnesses, code)
+
+
+def test_stateless_results_matches_session_results(stateless_app):
+    client = stateless_app.test_client()
+    with client.session_transaction() as test_client_session:
+        test_client_session.update(parse_results_code(all_illnesses, '1985-m2-0-u2-0-r1-0'))
+    session_response = client.get('/immunity/results/')
+
+    response = stateless_app.test_client().get('/immunity/r/1985-m2-0-u2-0-r1-0')
+    assert response.status_code == 200
+    assert response.data == session_response.data
+    assert response.cache_control.public
+    assert 0 < response.cache_control.max_age <= 86400
+    assert 'Set-Cookie' not in response.headers
+    assert client.get('/immunity/r/1985-m2-0-u2-0-r1-0',
+                      headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_results_code_clamps_doses():
+    inputs = {'birth_year': 1985,
+              'measles': {'on_time_measles_vaccinations': 1234567, 'measles_illness': False},
+              'mumps': {'on_time_mumps_vaccinations': 4, 'mumps_illness': False},
+              'rubella': {'rubella_vaccinations': 3, 'rubella_illness': True}}
+    assert results_code(all_illnesses, inputs) == '1985-m3-0-u3-0-r3-1'
+    # Clamped counts have the same results.
+    for illness in all_illnesses:
+        assert (illness.immunity(birth_year=1985, **inputs[illness.name])
+                == illness.immunity(birth_year=1985,
+                                    **parse_results_code(all_illnesses, '1985-m3-0-u3-0-r3-1')[illness.name]))
+
+
+def test_immunity_stateless_results_redirect_many_doses(stateless_app):
+    client = stateless_app.test_client()
+    request_data = {'birth_year': 1985,
+                    'measles': {'on_time_measles_vaccinations': 1234567},
+                    'mumps': {'on_time_mumps_vaccinations': 2},
+                    'rubella': {'rubella_vaccinations': 1},
+                    }
+    response = client.post('/immunity/', data=ImmutableMultiDict(flatten_dict(request_data)))
+    assert response.headers['Location'].endswith('/immunity/r/1985-m3-0-u2-0-r1-0')
+    response = client.get(response.headers['Location'])
+    assert response.status_code == 200
+    assert b'Unknown' not in response.data
+    # Counts above the clamp redirect to the canonical URL.
+    assert stateless_app.test_client().get('/immunity/r/1985-m5-0-u2-0-r1-0').status_code == 301
+
+
+def test_stateless_results_invalid_code_not_found(stateless_app):
+    assert stateless_app.test_client().get('/immunity/r/1985-m2').status_code == 404
+
+
+def test_stateless_results_redirects_to_canonical_url(stateless_app):
+    response = stateless_app.test_client().get('/immunity/r/01985-m02-0-u2-0-r1-00')
+    assert response.status_code == 301
+    assert response.headers['Location'].endswith('/immunity/r/1985-m2-0-u2-0-r1-0')
+
+
+@pytest.mark.parametrize('code', ['0-m2-0-u2-0-r1-0', '3000-m2-0-u2-0-r1-0'])
+def test_stateless_results_invalid_birth_year_not_found(stateless_app, code):
+    response = stateless_app.test_client().get(f'/immunity/r/{code}')
+    assert response.status_code == 404
+    assert not response.cache_control.public
+
+
+def test_immunity_stateless_results_redirect(stateless_app):
+    client = stateless_app.test_client()
+    request_data = {'birth_year': 1985,
+                    'measles': {'on_time_measles_vaccinations': 2, 'measles_illness': False},
+                    'mumps': {'on_time_mumps_vaccinations': 2, 'mumps_illness': True},
+                    'rubella': {'rubella_vaccinations': 1},
+                    }
+    response = client.post('/immunity/', data=ImmutableMultiDict(flatten_dict(request_data)))
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/immunity/r/1985-m2-0-u2-1-r1-0')
+    assert 'Set-Cookie' not in response.headers
+
+
+def test_stateless_results_illness_without_url_code():
+    measles_without_url_code = Illness(name='measles',
+                                       immunity=Measles.immunity,
+                                       wt_form=Measles.form,
+                                       form_data_extractor=Measles.extract_data,
+                                       )
+    app = create_app({'TESTING': True, 'ILLNESS_LIST': [measles_without_url_code]})
+    assert app.test_client().get('/immunity/r/1985-m2-0').status_code == 404
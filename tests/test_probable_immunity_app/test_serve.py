@@ -0,0 +1,78 @@
+"""Test threaded serving mode and benchmark."""
+import http.client
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from werkzeug.datastructures import ImmutableMultiDict
+
+from probable_immunity_web_app.benchmark import (estimate,
+                                                 run_benchmark,
+                                                 )
+from probable_immunity_web_app.illnesses import (Measles,
+                                                 Mumps,
+                                                 Rubella,
+                                                 )
+from probable_immunity_web_app.serve import (make_server,
+                                             parse_args,
+                                             )
+
+from tests.request_generator_helpers import flatten_dict
+
+
+@pytest.fixture
+def server(app_specific_illnesses):
+    server = make_server('127.0.0.1', 0, 4, app_specific_illnesses([Measles, Mumps, Rubella]))
+    server_thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05})
+    server_thread.start()
+    yield server
+    server.shutdown()
+    server_thread.join()
+
+
+def test_threaded_server_concurrent_estimates(server):
+    with ThreadPoolExecutor(max_workers=8) as clients:
+        # Raises on unexpected response.
+        list(clients.map(lambda birth_year: estimate(server.host, server.port, birth_year), range(1950, 2000)))
+
+
+def test_threaded_server_about_text(server):
+    connection = http.client.HTTPConnection(server.host, server.port)
+    connection.request('GET', '/about_text/')
+    response = connection.getresponse()
+    assert response.status == 200
+    assert response.read().startswith(b'<html>')
+    assert response.version == 10  # Connection per request.
+
+
+def test_concurrent_apps_with_different_illnesses(app_specific_illnesses):
+    """Requests on apps with different illness configs, interleaved across threads, see only their illnesses."""
+    measles_app = app_specific_illnesses([Measles])
+    mumps_app = app_specific_illnesses([Mumps])
+
+    def request_estimate(app_illness):
+        app, illness, other_illness = app_illness
+        with app.test_client() as test_client:
+            response = test_client.post('immunity/', data=ImmutableMultiDict(flatten_dict(
+                {'birth_year': 1985, illness: {f'on_time_{illness}_vaccinations': 2}})))
+            assert response.status_code == 302
+            response = test_client.get('immunity/results/')
+            return (f'<b>{illness.capitalize()}</b>'.encode('utf-8') in response.data
+                    and f'<b>{other_illness.capitalize()}</b>'.encode('utf-8') not in response.data)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert all(executor.map(request_estimate, [(measles_app, 'measles', 'mumps'),
+                                                   (mumps_app, 'mumps', 'measles')] * 50))
+
+
+def test_run_benchmark():
+    results = run_benchmark([1, 2], 4)
+    assert list(results) == [1, 2]
+    assert all(throughput > 0 for throughput in results.values())
+
+
+def test_parse_args():
+    args = parse_args(['--threads', '16', '--port', '8080'])
+    assert (args.threads, args.port, args.host) == (16, 8080, '127.0.0.1')
@@ -0,0 +1,159 @@
+import datetime
+import sqlite3
+import time
+
+import pytest
+
+from werkzeug.datastructures import ImmutableMultiDict
+
+from probable_immunity_web_app.app_factory import create_app
+from probable_immunity_web_app.illnesses import (Measles,
+                                                 Mumps,
+                                                 )
+from probable_immunity_web_app.sessions import SQLiteSessionInterface
+
+from tests.request_generator_helpers import flatten_dict
+
+request_data = {'birth_year': 1985,
+                'measles': {'on_time_measles_vaccinations': 2, 'measles_illness': False},
+                'mumps': {'on_time_mumps_vaccinations': 2, 'mumps_illness': True},
+                }
+
+
+@pytest.fixture
+def sqlite_session_app(tmp_path):
+    return create_app({'TESTING': True,
+                       'WTF_CSRF_ENABLED': False,
+                       'ILLNESS_LIST': [Measles, Mumps],
+                       'DATABASE': tmp_path / 'probable_immunity_app.sqlite',
+                       'SESSION_INTERFACE': 'sqlite',
+                       })
+
+
+def session_cookie(client):
+    return client.get_cookie('session')
+
+
+def stored_session_ids(app):
+    connection = sqlite3.connect(app.config['DATABASE'])
+    try:
+        return [row[0] for row in connection.execute('SELECT id FROM sessions')]
+    finally:
+        connection.close()
+
+
+def test_create_app_session_interface(sqlite_session_app):
+    assert isinstance(sqlite_session_app.session_interface, SQLiteSessionInterface)
+    assert not isinstance(create_app({'TESTING': True}).session_interface, SQLiteSessionInterface)
+
+
+def test_sqlite_session_data_entry_and_results(sqlite_session_app):
+    client = sqlite_session_app.test_client()
+    response = client.post('/immunity/', data=ImmutableMultiDict(flatten_dict(request_data)))
+    assert response.status_code == 302
+
+    # Cookie holds only the session id.
+    cookie = session_cookie(client)
+    assert len(cookie.value) == 43
+    assert '1985' not in cookie.value
+
+    with client.session_transaction() as test_client_session:
+        assert test_client_session['birth_year'] == 1985
+        assert test_client_session['mumps'] == {'on_time_mumps_vaccinations': 2, 'mumps_illness': True}
+    assert client.get('/immunity/results/').status_code == 200
+
+
+def test_sqlite_session_shared_by_processes(sqlite_session_app):
+    client = sqlite_session_app.test_client()
+    client.post('/immunity/', data=ImmutableMultiDict(flatten_dict(request_data)))
+    first_sid = session_cookie(client).value
+
+    # Another worker process, with its own front cache, sharing the database.
+    other_app = create_app(sqlite_session_app.config)
+    other_client = other_app.test_client()
+    other_client.set_cookie('session', first_sid)
+    with other_client.session_transaction() as test_client_session:
+        assert test_client_session['birth_year'] == 1985
+        test_client_session['birth_year'] = 1990
+    second_sid = session_cookie(other_client).value
+    assert second_sid != first_sid  # Modified sessions are stored under a new id.
+
+    client.set_cookie('session', second_sid)
+    with client.session_transaction() as test_client_session:
+        assert test_client_session['birth_year'] == 1990
+
+
+def test_sqlite_session_modified_replaces_stored_session(sqlite_session_app):
+    client = sqlite_session_app.test_client()
+    client.post('/immunity/', data=ImmutableMultiDict(flatten_dict(request_data)))
+    first_sid = session_cookie(client).value
+    assert stored_session_ids(sqlite_session_app) == [first_sid]
+
+    with client.session_transaction() as test_client_session:
+        test_client_session['birth_year'] = 1990
+    second_sid = session_cookie(client).value
+    assert stored_session_ids(sqlite_session_app) == [second_sid]
+
+    # Previous id no longer opens the session, from the front cache or the database.
+    client.set_cookie('session', first_sid)
+    assert client.get('/immunity/results/').status_code == 302
+    other_client = create_app(sqlite_session_app.config).test_client()
+    other_client.set_cookie('session', first_sid)
+    assert other_client.get('/immunity/results/').status_code == 302
+
+
+def test_sqlite_session_front_cache_ttl(sqlite_session_app):
+    assert sqlite_session_app.session_interface.front_cache.ttl == 5.0
+    client = sqlite_session_app.test_client()
+    client.post('/immunity/', data=ImmutableMultiDict(flatten_dict(request_data)))
+    first_sid = session_cookie(client).value
+
+    # Another worker process, its front cache holding the session.
+    other_app = create_app({**sqlite_session_app.config, 'SESSION_CACHE_TTL': 0.05})
+    other_client = other_app.test_client()
+    other_client.set_cookie('session', first_sid)
+    assert other_client.get('/immunity/results/').status_code == 200
+
+    with client.session_transaction() as test_client_session:
+        test_client_session['birth_year'] = 1990
+    time.sleep(0.1)
+    assert other_client.get('/immunity/results/').status_code == 302  # Replaced id no longer opens after ttl.
+
+
+def test_sqlite_session_front_cache(sqlite_session_app):
+    session_interface = sqlite_session_app.session_interface
+    client = sqlite_session_app.test_client()
+    client.post('/immunity/', data=ImmutableMultiDict(flatten_dict(request_data)))
+    client.get('/immunity/results/')
+    client.get('/immunity/results/')
+    assert session_interface.front_cache.stats()['hits'] == 2
+
+    session_interface.front_cache.clear()
+    assert client.get('/immunity/results/').status_code == 200  # Read from database.
+    assert session_interface.front_cache.stats() == {'hits': 0, 'misses': 1, 'size': 1, 'maxsize': 1024}
+
+
+@pytest.mark.parametrize('cookie_value', ['', 'not-a-session-id', 'a' * 43])
+def test_sqlite_session_unknown_id(sqlite_session_app, cookie_value):
+    client = sqlite_session_app.test_client()
+    client.set_cookie('session', cookie_value)
+    response = client.get('/immunity/results/')
+    assert response.status_code == 302  # No data, redirected to data entry.
+
+
+def test_sqlite_session_expires(sqlite_session_app):
+    sqlite_session_app.permanent_session_lifetime = datetime.timedelta(seconds=-1)
+    client = sqlite_session_app.test_client()
+    client.post('/immunity/', data=ImmutableMultiDict(flatten_dict(request_data)))
+    sid = session_cookie(client).value
+    client.set_cookie('session', sid)
+    assert client.get('/immunity/results/').status_code == 302
+
+
+def test_sqlite_session_emptied_deletes_cookie(sqlite_session_app):
+    client = sqlite_session_app.test_client()
+    client.post('/immunity/', data=ImmutableMultiDict(flatten_dict(request_data)))
+    with client.session_transaction() as test_client_session:
+        test_client_session.clear()
+    assert session_cookie(client) is None
+    assert stored_session_ids(sqlite_session_app) == []
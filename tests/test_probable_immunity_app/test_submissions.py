@@ -0,0 +1,229 @@
+import json
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from werkzeug.datastructures import ImmutableMultiDict
+
+from illnesses import (measles,
+                       mumps,
+                       )
+from illnesses.common_helpers import max_table_vaccinations
+from probable_immunity_web_app.app_factory import create_app
+from probable_immunity_web_app.illness_config import Illnesses
+from probable_immunity_web_app.illnesses import (Measles,
+                                                 Mumps,
+                                                 )
+from probable_immunity_web_app.submissions import (SubmissionWriter,
+                                                   probability_bucket,
+                                                   rebuild_rollups,
+                                                   rollups,
+                                                   submission_rows,
+                                                   )
+
+from tests.request_generator_helpers import flatten_dict
+
+illnesses = Illnesses([Measles, Mumps])
+
+
+def submission(birth_year=1985, doses=2):
+    return {'birth_year': birth_year,
+            'measles': {'on_time_measles_vaccinations': doses, 'measles_illness': False},
+            'mumps': {'on_time_mumps_vaccinations': doses, 'mumps_illness': True},
+            }
+
+
+def submission_count(path):
+    with sqlite3.connect(path) as connection:
+        return connection.execute('SELECT COUNT(*) FROM submissions').fetchone()[0]
+
+
+@pytest.fixture
+def writer(tmp_path):
+    writer = SubmissionWriter(tmp_path / 'submissions.sqlite', illnesses, max_queue=100, batch_size=10,
+                              flush_interval=0.05)
+    yield writer
+    writer.stop()
+
+
+def test_submission_rows():
+    measles_result = measles.immunity(1985, 2, False)
+    mumps_result = mumps.immunity(1985, 2, True)
+    assert submission_rows(illnesses, submission()) == [
+        (1985, 'measles', 2, False, measles_result['probability_of_measles_immunity'],
+         json.dumps(measles_result['content_templates'])),
+        (1985, 'mumps', 2, True, mumps_result['probability_of_mumps_immunity'],
+         json.dumps(mumps_result['content_templates'])),
+    ]
+
+
+def test_submission_rows_error_result():
+    rows = submission_rows(illnesses, submission(birth_year=3000))
+    assert [row[4] for row in rows] == [None, None]
+    assert rows[0][5] == json.dumps(['immunity_results_error_message'])
+
+
+def test_submission_writer_batches(writer):
+    for birth_year in range(1960, 1985):
+        assert writer.submit(submission(birth_year))
+    writer.flush()
+    assert submission_count(writer.path) == 25 * 2
+    stats = writer.stats()
+    assert stats['submitted'] == stats['written'] == 25
+    assert stats['batches'] >= 3  # Of at most 10 submissions.
+    assert stats['dropped'] == stats['errors'] == stats['queued'] == 0
+
+
+def test_submission_writer_flushes_after_interval(writer):
+    writer.submit(submission())
+    deadline = time.monotonic() + 5
+    while writer.stats()['written'] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert submission_count(writer.path) == 2  # Partial batch written.
+
+
+def test_submission_writer_stop_writes_queued(tmp_path):
+    writer = SubmissionWriter(tmp_path / 'submissions.sqlite', illnesses, flush_interval=60)
+    for birth_year in range(1960, 1965):
+        writer.submit(submission(birth_year))
+    writer.stop()
+    assert submission_count(writer.path) == 5 * 2
+    assert not writer.submit(submission())
+    assert writer.stats()['dropped'] == 1
+
+
+def test_submission_writer_drops_when_queue_full(writer, monkeypatch):
+    write_started = threading.Event()
+    release_writer = threading.Event()
+    write = SubmissionWriter.write
+
+    def blocked_write(self, connection, batch):
+        write_started.set()
+        release_writer.wait()
+        write(self, connection, batch)
+
+    monkeypatch.setattr(SubmissionWriter, 'write', blocked_write)
+    writer.batch_size = 1
+    writer.submit(submission())
+    assert write_started.wait(5)
+    # Writer blocked, so queue fills.
+    assert all(writer.submit(submission()) for _ in range(writer.max_queue))
+    assert not writer.submit(submission())
+    stats = writer.stats()
+    assert stats['dropped'] == 1
+    assert stats['queued'] == stats['queue_high_water'] == writer.max_queue
+
+    release_writer.set()
+    writer.flush()
+    assert writer.stats()['written'] == writer.max_queue + 1
+
+
+def test_submission_writer_write_error_logged(writer, monkeypatch, caplog):
+    def failing_write(self, connection, batch):
+        raise sqlite3.OperationalError('disk I/O error')
+
+    monkeypatch.setattr(SubmissionWriter, 'write', failing_write)
+    writer.submit(submission())
+    writer.flush()
+    assert writer.stats()['errors'] == 1
+    assert 'Writing 1 submissions failed.' in caplog.text
+
+
+def test_submission_writer_connect_error(tmp_path, caplog):
+    writer = SubmissionWriter(tmp_path / 'missing' / 'submissions.sqlite', illnesses, flush_interval=0.05)
+    writer.submit(submission())
+    writer.flush()  # Returns, rather than waiting on the failed writer.
+    writer._thread.join(5)
+    assert not writer.submit(submission())
+    stats = writer.stats()
+    assert stats['errors'] == 1
+    assert stats['dropped'] == 2
+    assert stats['queued'] == 0
+    assert 'Opening submissions database' in caplog.text
+    writer.stop()
+
+
+def test_submission_writer_dead_thread(writer, monkeypatch):
+    monkeypatch.setattr(SubmissionWriter, '_run', lambda self: None)  # Writer thread exits at once.
+    writer.submit(submission())
+    writer._thread.join(5)
+    writer.flush()  # Returns, though the submission is never written.
+    assert not writer.submit(submission())
+    assert writer.stats()['written'] == 0
+
+
+def test_immunity_records_submissions(tmp_path):
+    app = create_app({'TESTING': True,
+                      'WTF_CSRF_ENABLED': False,
+                      'ILLNESS_LIST': [Measles, Mumps],
+                      'DATABASE': tmp_path / 'probable_immunity_app.sqlite',
+                      'RECORD_SUBMISSIONS': True,
+                      })
+    writer = app.extensions['submission_writer']
+    response = app.test_client().post('/immunity/', data=ImmutableMultiDict(flatten_dict(submission())))
+    assert response.status_code == 302
+    writer.stop()
+    assert submission_count(app.config['DATABASE']) == 2
+    assert create_app({'TESTING': True}).extensions['submission_writer'] is None
+
+
+@pytest.mark.parametrize('probability, bucket', [(0, 0), (0.05, 0), (0.1, 1), (0.95, 9), (1, 9), (-0.1, 0), (1.5, 9)])
+def test_probability_bucket(probability, bucket):
+    assert probability_bucket(probability) == bucket
+
+
+def test_submission_writer_updates_rollups(writer):
+    for birth_year, doses in [(1984, 2), (1985, 2), (1985, 2), (1991, 1), (3000, 2)]:
+        writer.submit(submission(birth_year, doses))
+    writer.flush()
+
+    with sqlite3.connect(writer.path) as connection:
+        written_rollups = rollups(connection)
+        measles_rollups = rollups(connection, 'measles')
+        rebuild_rollups(connection)
+        assert rollups(connection) == pytest.approx(written_rollups)
+
+    assert [(rollup['decade'], rollup['doses'], rollup['count']) for rollup in measles_rollups] == [
+        (1980, 2, 3), (1990, 1, 1), (3000, 2, 1)]
+    expected_probability = measles.immunity(1985, 2)['probability_of_measles_immunity']
+    assert measles_rollups[0]['mean_probability'] == pytest.approx(expected_probability)
+    assert measles_rollups[0]['histogram'][probability_bucket(expected_probability)] == 3
+    assert sum(measles_rollups[0]['histogram']) == 3
+    # Error results counted, without a probability.
+    assert measles_rollups[2]['mean_probability'] is None
+    assert sum(measles_rollups[2]['histogram']) == 0
+    assert {rollup['illness'] for rollup in written_rollups} == {'measles', 'mumps'}
+
+
+def test_submission_writer_rollups_clamp_doses(writer):
+    for doses in [3, 4, 1000, 123456]:
+        writer.submit(submission(1985, doses))
+    writer.flush()
+
+    with sqlite3.connect(writer.path) as connection:
+        written_rollups = rollups(connection, 'measles')
+        rebuild_rollups(connection)
+        assert rollups(connection, 'measles') == pytest.approx(written_rollups)
+
+    # One rollup row for max_table_vaccinations or more doses.
+    assert [(rollup['doses'], rollup['count']) for rollup in written_rollups] == [(max_table_vaccinations, 4)]
+
+
+def test_submission_writer_rolls_up_existing_submissions(tmp_path):
+    path = tmp_path / 'submissions.sqlite'
+    with sqlite3.connect(path) as connection:
+        # Submissions written before rollups were kept.
+        connection.execute('CREATE TABLE submissions (id INTEGER PRIMARY KEY, birth_year INTEGER, '
+                           'illness TEXT NOT NULL, doses INTEGER, had_illness INTEGER, probability REAL, '
+                           'content_templates TEXT NOT NULL)')
+        connection.executemany('INSERT INTO submissions '
+                               '(birth_year, illness, doses, had_illness, probability, content_templates) '
+                               'VALUES (?, ?, ?, ?, ?, ?)',
+                               submission_rows(illnesses, submission(1985)))
+    writer = SubmissionWriter(path, illnesses, flush_interval=0.01)
+    writer.submit(submission(1986))
+    writer.stop()
+    with sqlite3.connect(path) as connection:
+        assert [rollup['count'] for rollup in rollups(connection)] == [2, 2]